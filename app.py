@@ -1,7 +1,15 @@
 import streamlit as st
 import os
 from prompts import policy_levers, max_num_queries
-from utils import generate_document_contents, generate_stakeholders
+from dotenv import load_dotenv
+from logconfig import configure_logging
+
+# Loaded before the job modules read their settings from the environment
+load_dotenv()
+configure_logging()
+
+from workers import get_job_queue, submit_document_job, submit_stakeholders_job, submit_report_job, DONE, FAILED
+from tracing import start_metrics_server
 import subprocess
 
 # Set page configuration
@@ -13,6 +21,9 @@ st.set_page_config(
 # Title
 st.title("Diagnostic Report Generator")
 
+# Prometheus metrics at :METRICS_PORT/metrics, if configured (started once per process)
+start_metrics_server()
+
 # Navigation logic
 if "page" not in st.session_state:
     st.session_state.page = "home"
@@ -24,6 +35,36 @@ if "toc" not in st.session_state:
     st.session_state.toc = ""
 if "modify_toc" not in st.session_state:
     st.session_state.modify_toc = True
+if "stakeholders_job" not in st.session_state:
+    st.session_state.stakeholders_job = None
+if "toc_job" not in st.session_state:
+    st.session_state.toc_job = None
+if "report_job" not in st.session_state:
+    st.session_state.report_job = None
+if "report" not in st.session_state:
+    st.session_state.report = ""
+
+
+# Poll a background job without blocking the script thread; store its result in session state once it finishes.
+# Text jobs stream, so the text received so far is rendered on every poll
+@st.fragment(run_every=1)
+def poll_job(job_key, result_key, message):
+    status = get_job_queue().status(st.session_state[job_key])
+    if status is None or status["state"] not in (DONE, FAILED):
+        st.info(f"{message} ({status['running_seconds'] if status else 0:.0f}s)")
+        if status and status["partial"]:
+            st.markdown(status["partial"])
+        return
+
+    if status["state"] == FAILED:
+        st.session_state[job_key] = None
+        st.error(f"{message} failed: {status['error']}")
+        return
+    st.session_state[result_key] = get_job_queue().result(st.session_state[job_key])
+    st.session_state[job_key] = None
+    if result_key == "toc":
+        st.session_state.modify_toc = True
+    st.rerun()
 
 # Main navigation buttons
 st.subheader("Choose a Functionality:")
@@ -84,9 +125,10 @@ elif st.session_state.page == "diagnostic":
 
     elif stakeholder_option == "Generate using AI":
         if st.button("Get Stakeholders"):
-            with st.spinner("Generating the Stakeholders"):
-                st.session_state.generated_stakeholders = generate_stakeholders(city=city, country=country)
-            st.rerun()
+            st.session_state.stakeholders_job = submit_stakeholders_job(city=city, country=country)
+
+    if st.session_state.stakeholders_job:
+        poll_job("stakeholders_job", "generated_stakeholders", "Generating the Stakeholders")
 
     # Display AI-generated stakeholders
     if st.session_state.generated_stakeholders:
@@ -101,18 +143,17 @@ elif st.session_state.page == "diagnostic":
 
     # Generate Table of Contents
     if st.button("📑 Generate Table of Contents"):
-        with st.spinner("Generating the Table of Contents for the Smart City Diagnostic Report"):
-            st.session_state.toc = generate_document_contents(city=city, 
-                                                              country=country, 
-                                                              policy_levers=policy_levers, 
-                                                              stakeholders=(", ".join(st.session_state.stakeholders_list) 
-                                                                           if stakeholder_option == "Provide stakeholders" 
-                                                                           else st.session_state.generated_stakeholders), 
-                                                              report_structure=report_structure,
-                                                              max_num_queries=max_num_queries)
-            
-        st.session_state.modify_toc = True
-        st.rerun()
+        st.session_state.toc_job = submit_document_job(city=city, 
+                                                       country=country, 
+                                                       policy_levers=policy_levers, 
+                                                       stakeholders=(", ".join(st.session_state.stakeholders_list) 
+                                                                    if stakeholder_option == "Provide stakeholders" 
+                                                                    else st.session_state.generated_stakeholders), 
+                                                       report_structure=report_structure,
+                                                       max_num_queries=max_num_queries)
+
+    if st.session_state.toc_job:
+        poll_job("toc_job", "toc", "Generating the Table of Contents for the Smart City Diagnostic Report")
     
     # Display Table of Contents
     if st.session_state.toc:
@@ -129,17 +170,16 @@ elif st.session_state.page == "diagnostic":
             # Button to regenerate Table of Contents
             if st.button("🔄 Update Table of Contents"):
                 if extra_inputs:
-                    with st.spinner("Generating the Table of Contents for the Smart City Diagnostic Report"):
-                        st.session_state.toc = generate_document_contents(city=city, 
-                                                                          country=country, 
-                                                                          policy_levers=policy_levers, 
-                                                                          stakeholders=(", ".join(st.session_state.stakeholders_list) 
-                                                                           if stakeholder_option == "Provide stakeholders" 
-                                                                           else st.session_state.generated_stakeholders), 
-                                                                          report_structure=extra_inputs,
-                                                                          max_num_queries=max_num_queries)
-                    st.session_state.modify_toc = True
-                    st.rerun()  # Refresh the UI to show the updated ToC
+                    # The updated ToC replaces the current one once the job finishes
+                    st.session_state.toc_job = submit_document_job(city=city, 
+                                                                   country=country, 
+                                                                   policy_levers=policy_levers, 
+                                                                   stakeholders=(", ".join(st.session_state.stakeholders_list) 
+                                                                    if stakeholder_option == "Provide stakeholders" 
+                                                                    else st.session_state.generated_stakeholders), 
+                                                                   report_structure=extra_inputs,
+                                                                   max_num_queries=max_num_queries)
+                    st.rerun()  # Refresh the UI to poll the update job
 
 
         elif modify == "No, proceed to report generation":
@@ -147,4 +187,14 @@ elif st.session_state.page == "diagnostic":
 
             # Final report generation button
             if st.button("🚀 Run Report Generation"):
+                st.session_state.report = ""
+                st.session_state.report_job = submit_report_job(toc=st.session_state.toc, city=city, country=country)
                 st.success("The report is being generated based on the provided inputs!")
+
+            if st.session_state.report_job:
+                poll_job("report_job", "report", "Searching and writing the report sections")
+
+            if st.session_state.report:
+                st.subheader("📄 Diagnostic Report")
+                st.markdown(st.session_state.report)
+                st.download_button("⬇️ Download Report", st.session_state.report, file_name=f"{city}_diagnostic_report.md", mime="text/markdown")
@@ -0,0 +1,77 @@
+"""
+Benchmark grouped multi-indicator Perplexity queries against single-indicator queries.
+
+Runs ``search_func`` for one city in single-indicator mode and in grouped mode
+and reports wall time, number of API requests, estimated tokens (a proxy for
+cost) and how closely the grouped extraction agrees with the single-indicator
+baseline. The search cache and the result store are disabled so both modes
+hit the API; stored results are keyed without the group size, so the grouped
+run would otherwise reuse the single-indicator results.
+
+Usage:
+    python benchmarks/grouped_search.py --city "Dubai" --category "Connectivity" --group-size 5
+"""
+
+import os
+import sys
+import time
+import argparse
+
+from pathlib import Path
+
+os.environ["SEARCH_CACHE_DISABLED"] = "true"
+os.environ["RESULT_STORE_DISABLED"] = "true"
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from ratelimit import get_rate_limiter, estimate_tokens
+from search import search_func, fetch_indicators_from_web
+
+
+def run_mode(city, indicators, maturity_levels, group_size):
+    perplexity = get_rate_limiter("perplexity")
+    openai = get_rate_limiter("openai")
+    perplexity_before, openai_before = perplexity.requests, openai.requests
+
+    start = time.perf_counter()
+    outputs, citations, indicator_values, maturity_scores = search_func(city, indicators, maturity_levels, group_size=group_size)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "wall_time_s": round(elapsed, 2),
+        "perplexity_requests": perplexity.requests - perplexity_before,
+        "openai_requests": openai.requests - openai_before,
+        "estimated_output_tokens": sum(estimate_tokens(output) for output in outputs),
+        "indicator_values": indicator_values,
+        "maturity_scores": maturity_scores,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--city", required=True)
+    parser.add_argument("--category", required=True, help="Category passed to fetch_indicators_from_web")
+    parser.add_argument("--group-size", type=int, default=5)
+    parser.add_argument("--max-indicators", type=int, default=20)
+    args = parser.parse_args()
+
+    indicators, maturity_levels = fetch_indicators_from_web(category=args.category)
+    indicators, maturity_levels = indicators[:args.max_indicators], maturity_levels[:args.max_indicators]
+
+    single = run_mode(args.city, indicators, maturity_levels, group_size=1)
+    grouped = run_mode(args.city, indicators, maturity_levels, group_size=args.group_size)
+
+    score_agreement = sum(a == b for a, b in zip(single["maturity_scores"], grouped["maturity_scores"])) / len(indicators)
+    value_agreement = sum(a == b for a, b in zip(single["indicator_values"], grouped["indicator_values"])) / len(indicators)
+    coverage = lambda scores: sum(score > 0 for score in scores) / len(scores)
+
+    print(f"{len(indicators)} indicators for {args.city}, group size {args.group_size}\n")
+    print(f"{'metric':<28}{'single':>12}{'grouped':>12}")
+    for metric in ("wall_time_s", "perplexity_requests", "openai_requests", "estimated_output_tokens"):
+        print(f"{metric:<28}{single[metric]:>12}{grouped[metric]:>12}")
+    print(f"{'indicators with data':<28}{coverage(single['maturity_scores']):>12.0%}{coverage(grouped['maturity_scores']):>12.0%}")
+    print(f"\nMaturity score agreement with single mode: {score_agreement:.0%}")
+    print(f"Indicator value agreement with single mode: {value_agreement:.0%}")
+
+
+if __name__ == "__main__":
+    main()
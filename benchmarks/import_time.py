@@ -0,0 +1,82 @@
+"""
+Measure cold-start import cost of the app modules against a time budget.
+
+Each target module is imported in a fresh interpreter with ``-X importtime``.
+The script reports the total import time of every target and the most
+expensive modules it pulled in, and exits with status 1 if any target takes
+longer than the budget.
+
+Usage:
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --targets utils search --budget-ms 1500 --top 15
+"""
+
+import os
+import re
+import sys
+import argparse
+import subprocess
+
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_TARGETS = ["utils", "clients", "catalogue", "search"]
+DEFAULT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", 2000))
+
+# "import time:       412 |       1207 |   package.module"
+IMPORT_TIME_PATTERN = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def measure(target):
+    """Import ``target`` in a fresh interpreter and return (total_ms, [(module, self_ms, cumulative_ms)])"""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"Importing {target} failed:\n{completed.stderr[-2000:]}")
+
+    modules, total_us = [], 0
+    for line in completed.stderr.splitlines():
+        match = IMPORT_TIME_PATTERN.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, module = int(match[1]), int(match[2]), match[3], match[4]
+        modules.append((module, self_us / 1000, cumulative_us / 1000))
+        # Top-level imports are indented by a single space; their cumulative times add up to the total
+        if len(indent) == 1:
+            total_us += cumulative_us
+    return total_us / 1000, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--targets", nargs="+", default=DEFAULT_TARGETS)
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--top", type=int, default=10, help="Number of most expensive modules to list per target")
+    args = parser.parse_args()
+
+    over_budget = []
+    for target in args.targets:
+        total_ms, modules = measure(target)
+        status = "OK" if total_ms <= args.budget_ms else "OVER BUDGET"
+        print(f"\n{target}: {total_ms:.0f} ms (budget {args.budget_ms:.0f} ms) {status}")
+
+        # Only list top-level packages so nested submodules do not repeat their parent's cost
+        packages = {}
+        for module, _, cumulative_ms in modules:
+            package = module.split(".")[0]
+            packages[package] = max(packages.get(package, 0), cumulative_ms)
+        for package, cumulative_ms in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+            print(f"  {cumulative_ms:8.1f} ms  {package}")
+
+        if total_ms > args.budget_ms:
+            over_budget.append(target)
+
+    if over_budget:
+        print(f"\nImport time budget exceeded by: {', '.join(over_budget)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Measure the per-call overhead of ``utils.log_function_call`` under concurrent callers.
+
+A function taking a multi-KB prompt and returning a multi-KB answer after
+a short sleep standing in for the API call (the shape of the LLM helpers)
+is called from many threads at once in three setups, each in a fresh
+interpreter because logging is configured per process:
+
+    none    the undecorated function, the baseline
+    legacy  the previous decorator: full payloads written synchronously by a
+            RotatingFileHandler on the calling thread
+    queue   the current decorator and logging pipeline (logconfig.py)
+
+Reports the mean and p50/p95/p99 overhead per call over the baseline, the
+bytes written, and for the queue pipeline the time the writer thread needs
+to drain after the callers finish.
+
+Usage:
+    python benchmarks/logging_overhead.py
+    python benchmarks/logging_overhead.py --threads 20 --calls 500 --payload-kb 8 --io-ms 2
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+
+from functools import wraps
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from search_scaling import percentile
+
+MODES = ("none", "legacy", "queue")
+
+
+def legacy_log_function_call(func):
+    """``log_function_call`` as it was before the queue pipeline"""
+    import logging
+    logger = logging.getLogger("legacy")
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        logger.info(f"Calling function: {func.__name__}, args: {args}, kwargs: {kwargs}")
+        try:
+            result = func(*args, **kwargs)
+            logger.info(f"Function {func.__name__} returned: {result}")
+            return result
+        except Exception as e:
+            logger.error(f"Exception in {func.__name__}: {e}", exc_info=True)
+            raise
+    return wrapper
+
+
+def run_child(args):
+    """Call the function from ``args.threads`` threads and print the per-call durations as JSON"""
+    import logging
+
+    if args.mode == "legacy":
+        from logging.handlers import RotatingFileHandler
+        logging.basicConfig(
+            level=logging.INFO,
+            format="%(asctime)s - %(levelname)s - %(name)s - %(funcName)s - %(message)s",
+            handlers=[RotatingFileHandler(os.environ["LOG_FILE"], maxBytes=5*1024*1024, backupCount=10)]
+        )
+        decorate = legacy_log_function_call
+    elif args.mode == "queue":
+        from utils import log_function_call
+        decorate = log_function_call
+    else:
+        decorate = lambda func: func
+
+    answer = "The indicator value for the city is 42. " * (args.payload_kb * 1024 // 40)
+
+    @decorate
+    def generate(prompt, city):
+        time.sleep(args.io_ms / 1000)
+        return answer
+
+    prompt = "Find the indicator value for the city. " * (args.payload_kb * 1024 // 40)
+    durations = [[] for _ in range(args.threads)]
+    barrier = threading.Barrier(args.threads)
+
+    def _worker(position):
+        barrier.wait()
+        for _ in range(args.calls):
+            start = time.perf_counter()
+            generate(prompt, city="Dubai")
+            durations[position].append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=_worker, args=(position,)) for position in range(args.threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_time = time.perf_counter() - start
+
+    drain_time = 0.0
+    if args.mode == "queue":
+        import logconfig
+        start = time.perf_counter()
+        logconfig._listener.stop()
+        drain_time = time.perf_counter() - start
+
+    print(json.dumps({"durations": [value for values in durations for value in values], "wall_time_s": wall_time, "drain_time_s": drain_time}))
+
+
+def run_mode(args, mode):
+    with tempfile.TemporaryDirectory() as workdir:
+        log_file = os.path.join(workdir, "app.log")
+        env = dict(os.environ, LOG_FILE=log_file, TRACING_DISABLED="true")
+        command = [sys.executable, str(Path(__file__).resolve()), "--child", "--mode", mode,
+                   "--threads", str(args.threads), "--calls", str(args.calls), "--payload-kb", str(args.payload_kb), "--io-ms", str(args.io_ms)]
+        completed = subprocess.run(command, cwd=workdir, env=env, capture_output=True, text=True)
+        if completed.returncode != 0:
+            raise RuntimeError(f"{mode} run failed:\n{completed.stderr[-3000:]}")
+        written = sum(path.stat().st_size for path in Path(workdir).glob("app.log*"))
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result["bytes_written"] = written
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=20)
+    parser.add_argument("--calls", type=int, default=200, help="Calls per thread")
+    parser.add_argument("--payload-kb", type=int, default=4, help="Size of the prompt argument and of the return value")
+    parser.add_argument("--io-ms", type=float, default=5, help="Simulated API latency of each call, in milliseconds")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return run_child(args)
+
+    results = {mode: run_mode(args, mode) for mode in MODES}
+    baseline = sum(results["none"]["durations"]) / len(results["none"]["durations"])
+
+    print(f"{args.threads} threads x {args.calls} calls, {args.payload_kb} KB payloads, {args.io_ms:g} ms simulated latency\n")
+    print(f"{'mode':<8}{'mean us':>10}{'p50 us':>10}{'p95 us':>10}{'p99 us':>10}{'wall s':>9}{'drain s':>9}{'MB written':>12}")
+    for mode, result in results.items():
+        overheads = [(duration - baseline) * 1e6 for duration in result["durations"]]
+        print(
+            f"{mode:<8}{sum(overheads) / len(overheads):>10.1f}{percentile(overheads, 50):>10.1f}{percentile(overheads, 95):>10.1f}{percentile(overheads, 99):>10.1f}"
+            f"{result['wall_time_s']:>9.2f}{result['drain_time_s']:>9.2f}{result['bytes_written'] / 1e6:>12.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
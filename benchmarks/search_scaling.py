@@ -0,0 +1,219 @@
+"""
+Offline end-to-end benchmark of the indicator search paths against the local API stand-in.
+
+Starts ``stub_server.py`` in-process and runs every combination of cities ×
+indicators × concurrency in a fresh interpreter (so caches and semaphores
+start cold), with the search cache and result store disabled.
+For each run it reports wall time, API calls per second, and p50/p95/p99 of
+every stage:
+
+    search      one Perplexity request, including retries and rate limiting
+    extraction  one OpenAI extraction call
+    result      time from the start of the run until each indicator result
+
+Paths:
+    search_func  ``stream_search_func`` city by city (one city at a time)
+    cities       ``stream_search_cities``, all cities in one task graph
+    job          ``jobs.run_indicator_job``, the multi-city path of pages/indicators.py
+
+Usage:
+    python benchmarks/search_scaling.py
+    python benchmarks/search_scaling.py --path cities --cities 1 5 --indicators 10 40 --concurrency 8 32
+    python benchmarks/search_scaling.py --perplexity-latency lognormal:2,0.5 --rate-limit-rate 0.05 --json results.json
+    python benchmarks/search_scaling.py --mode replay --fixtures benchmarks/fixtures
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import itertools
+import subprocess
+
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from stub_server import start_server, add_arguments, config_from_args
+
+STAGES = ("search", "extraction", "result")
+
+
+def percentile(samples, q):
+    """Nearest-rank percentile of ``samples``"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, round(q / 100 * len(ordered) + 0.5) - 1))]
+
+
+def synthetic_workload(num_cities, num_indicators):
+    cities = [f"Benchmark City {number}" for number in range(1, num_cities + 1)]
+    indicators = [f"Benchmark indicator {number} (share of households, %)" for number in range(1, num_indicators + 1)]
+    maturity_levels = ["Level 1: < 20%\nLevel 2: 20-40%\nLevel 3: 40-60%\nLevel 4: 60-80%\nLevel 5: > 80%"] * num_indicators
+    return cities, indicators, maturity_levels
+
+
+##########################
+##### Child Run ##########
+##########################
+
+def _timed(samples, stage, fn):
+    """Wrap a sync or async function so that each call's duration is appended to ``samples[stage]``"""
+    import asyncio
+    import functools
+
+    if asyncio.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                samples[stage].append(time.perf_counter() - start)
+    else:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                samples[stage].append(time.perf_counter() - start)
+    return wrapper
+
+
+def run_child(args):
+    """Run one configuration and print its measurements as JSON"""
+    import search
+    import jobs
+
+    samples = {stage: [] for stage in STAGES}
+    handler = search.PerplexitySearchHandler
+    handler._fetch = _timed(samples, "search", handler._fetch)
+    handler._afetch = _timed(samples, "search", handler._afetch)
+    search._invoke_llm = _timed(samples, "extraction", search._invoke_llm)
+    search._ainvoke_llm = _timed(samples, "extraction", search._ainvoke_llm)
+
+    # Build the clients up front: their first use imports the SDKs and would block the event loop
+    # mid-run (cold start is measured by import_time.py)
+    search.get_search_handler()
+    search.get_structured_llm(search.MaturityScore)
+    search.get_structured_llm(search.MaturityScoreBatch)
+
+    cities, indicators, maturity_levels = synthetic_workload(args.num_cities, args.num_indicators)
+    options = dict(batch_extraction=args.batch_extraction, group_size=args.group_size)
+    start = time.perf_counter()
+    on_result = lambda *_: samples["result"].append(time.perf_counter() - start)
+
+    if args.path == "search_func":
+        for city in cities:
+            for result in search.stream_search_func(city, indicators, maturity_levels, **options):
+                on_result(result)
+    elif args.path == "cities":
+        for city, result in search.stream_search_cities({city: (indicators, maturity_levels) for city in cities}, **options):
+            on_result(city, result)
+    else:
+        store = jobs.JobStore(os.path.join(os.getcwd(), "jobs.db"))
+        jobs.run_indicator_job(cities, indicators, maturity_levels, store=store, on_result=on_result, **options)
+
+    print(json.dumps({"wall_time_s": time.perf_counter() - start, "samples": samples}))
+
+
+##########################
+##### Benchmark ##########
+##########################
+
+def run_configuration(args, port, num_cities, num_indicators, concurrency):
+    """Run one configuration in a fresh interpreter and return its measurements"""
+    env = dict(os.environ)
+    env.update({
+        "PERPLEXITY_API_URL": f"http://127.0.0.1:{port}/chat/completions",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{port}/v1",
+        "SEARCH_MAX_CONCURRENCY": str(concurrency),
+        "SEARCH_CACHE_DISABLED": "true",
+        "RESULT_STORE_DISABLED": "true",
+    })
+    # Credentials are only checked for presence unless recording; rate limits are raised so the stub is the bottleneck
+    for name, default in (("PERPLEXITY_API", "stub"), ("OPENAI_API_KEY", "stub"), ("MODEL", "sonar"), ("PERPLEXITY_RPM", "100000"), ("OPENAI_RPM", "100000")):
+        env.setdefault(name, default)
+
+    command = [
+        sys.executable, str(Path(__file__).resolve()), "--child", "--path", args.path,
+        "--num-cities", str(num_cities), "--num-indicators", str(num_indicators),
+    ]
+    if args.batch_extraction:
+        command.append("--batch-extraction")
+    if args.group_size:
+        command += ["--group-size", str(args.group_size)]
+
+    with tempfile.TemporaryDirectory() as workdir:
+        completed = subprocess.run(command, cwd=workdir, env=env, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"Benchmark run failed:\n{completed.stderr[-3000:]}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--path", choices=["search_func", "cities", "job"], default="cities")
+    parser.add_argument("--cities", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--indicators", type=int, nargs="+", default=[10, 40])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[4, 16])
+    parser.add_argument("--batch-extraction", action="store_true")
+    parser.add_argument("--group-size", type=int, default=None)
+    parser.add_argument("--json", default=None, help="Also write every run's measurements to this file")
+    add_arguments(parser)
+
+    # Arguments of a single configuration, run in a fresh interpreter
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--num-cities", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--num-indicators", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return run_child(args)
+
+    config = config_from_args(args)
+    server = start_server(config)
+    print(f"{args.path} against the {args.mode} server on port {server.server_port}\n")
+
+    header = f"{'cities':>6}{'indic.':>7}{'conc.':>6}{'wall s':>9}{'calls/s':>9}"
+    for stage in STAGES:
+        header += f"{stage + ' p50/p95/p99 s':>28}"
+    print(header)
+
+    runs = []
+    for num_cities, num_indicators, concurrency in itertools.product(args.cities, args.indicators, args.concurrency):
+        with config.lock:
+            config.counts.clear()
+        measurement = run_configuration(args, server.server_port, num_cities, num_indicators, concurrency)
+        with config.lock:
+            counts = dict(config.counts)
+
+        wall_time = measurement["wall_time_s"]
+        calls = sum(counts.values())
+        row = f"{num_cities:>6}{num_indicators:>7}{concurrency:>6}{wall_time:>9.2f}{calls / wall_time if wall_time else 0:>9.1f}"
+        stages = {}
+        for stage in STAGES:
+            samples = measurement["samples"][stage]
+            stages[stage] = {f"p{q}": percentile(samples, q) for q in (50, 95, 99)}
+            stages[stage]["count"] = len(samples)
+            row += f"{'/'.join(f'{stages[stage][key]:.2f}' for key in ('p50', 'p95', 'p99')):>28}"
+        print(row)
+
+        runs.append({
+            "path": args.path, "cities": num_cities, "indicators": num_indicators, "concurrency": concurrency,
+            "wall_time_s": wall_time, "calls": counts, "calls_per_second": calls / wall_time if wall_time else 0.0, "stages": stages,
+        })
+
+    server.shutdown()
+    if args.json:
+        Path(args.json).write_text(json.dumps(runs, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,393 @@
+"""
+Local stand-in for the Perplexity and OpenAI chat completion APIs.
+
+Serves Perplexity's ``/chat/completions`` and OpenAI's ``/v1/chat/completions``
+on one port so that ``search_func``, the multi-city job path and the report
+engine can run, and be benchmarked, without spending API money. Point the app
+at it with:
+
+    PERPLEXITY_API_URL=http://127.0.0.1:8765/chat/completions
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1
+
+Modes:
+    stub    Synthetic answers shaped like the real ones: grouped Perplexity
+            answers get one "## Indicator <n>:" section per indicator and
+            structured OpenAI calls get JSON matching the requested schema
+            (``response_format`` or tool definitions), streamed when asked.
+    record  Forward every request to the real API and save the response as a
+            fixture, keyed by provider and request body.
+    replay  Answer from the recorded fixtures, falling back to stub answers
+            (or 404 with --strict) for requests that were never recorded.
+
+Latency is drawn per request from a distribution per provider, e.g.
+``fixed:0.2``, ``uniform:0.5,2``, ``lognormal:1.2,0.5`` (median, sigma) or,
+in replay mode, ``recorded``. A share of requests can fail with 500s or be
+rate limited with 429s and a Retry-After header.
+
+Usage:
+    python benchmarks/stub_server.py --port 8765 --perplexity-latency lognormal:2,0.4 --rate-limit-rate 0.02
+    python benchmarks/stub_server.py --mode record --fixtures benchmarks/fixtures
+    python benchmarks/stub_server.py --mode replay --fixtures benchmarks/fixtures --perplexity-latency recorded
+"""
+
+import re
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+import urllib.error
+import urllib.request
+
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+UPSTREAMS = {
+    "perplexity": "https://api.perplexity.ai/chat/completions",
+    "openai": "https://api.openai.com/v1/chat/completions",
+}
+
+# "1. Indicator name" lines of a grouped indicator prompt
+GROUPED_INDICATOR_PATTERN = re.compile(r"^\s*(\d+)\.\s+(.+?)\s*$", re.MULTILINE)
+# "### Indicator: <name>" headers of a batched extraction prompt
+BATCH_INDICATOR_PATTERN = re.compile(r"^#{1,4}\s*Indicator:\s*(.+?)\s*$", re.MULTILINE)
+
+
+##########################
+##### Configuration ######
+##########################
+
+def parse_latency(spec):
+    """Return a function drawing one latency in seconds from ``spec`` (None for 'recorded')"""
+    kind, _, arguments = spec.partition(":")
+    values = [float(value) for value in arguments.split(",") if value]
+    if kind == "recorded":
+        return None
+    if kind == "fixed":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1])
+    if kind == "lognormal":
+        median, sigma = values
+        return lambda: random.lognormvariate(0, sigma) * median
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+class StubConfig:
+    def __init__(
+            self,
+            mode="stub",
+            fixtures=None,
+            strict=False,
+            perplexity_latency="lognormal:1.5,0.4",
+            openai_latency="lognormal:0.8,0.4",
+            error_rate=0.0,
+            rate_limit_rate=0.0,
+            retry_after=1.0,
+            stream_chunks=8,
+            seed=None
+    ):
+        self.mode = mode
+        self.fixtures = Path(fixtures) if fixtures else None
+        self.strict = strict
+        self.latency = {"perplexity": parse_latency(perplexity_latency), "openai": parse_latency(openai_latency)}
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.stream_chunks = stream_chunks
+        self.random = random.Random(seed)
+
+        self.counts = {}
+        self.lock = threading.Lock()
+
+
+    def count(self, provider, outcome):
+        with self.lock:
+            key = f"{provider}_{outcome}"
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+
+##########################
+##### Stub Answers #######
+##########################
+
+def _text(messages):
+    return "\n".join(str(message.get("content", "")) for message in messages)
+
+
+def _value(seed):
+    return round(random.Random(seed).uniform(1, 100), 1)
+
+
+def perplexity_answer(body):
+    """Synthetic Perplexity answer: one section per indicator of a grouped prompt, else a single answer"""
+    user_prompt = _text([message for message in body.get("messages", []) if message.get("role") == "user"])
+    grouped = user_prompt.split("Indicators:", 1)[1].split("City:", 1)[0] if "Indicators:" in user_prompt else ""
+    indicators = GROUPED_INDICATOR_PATTERN.findall(grouped)
+
+    if indicators:
+        sections = [
+            f"## Indicator {number}: {name}\n- Data Found: {_value(name)}\n- Maturity Level: {int(_value(name)) % 5 + 1}\n- Reported by the city statistics office [{int(number)}]."
+            for number, name in indicators
+        ]
+        content = "\n\n".join(sections)
+        citations = [f"https://example.org/source-{number}" for number, _ in indicators]
+    else:
+        seed = user_prompt
+        # Distinct per request, so identical extraction calls are not coalesced by accident
+        content = f"Data Found: {_value(seed)}\nMaturity Level: {int(_value(seed)) % 5 + 1}\nAccording to the city statistics office [1] and a recent survey [2] (ref. {hashlib.sha256(seed.encode('utf-8')).hexdigest()[:8]})."
+        citations = ["https://example.org/source-1", "https://example.org/source-2"]
+
+    return {
+        "id": "stub",
+        "model": body.get("model"),
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+        "citations": citations,
+        "usage": {"prompt_tokens": len(user_prompt) // 4, "completion_tokens": len(content) // 4, "total_tokens": (len(user_prompt) + len(content)) // 4},
+    }
+
+
+def _resolve(schema, definitions):
+    while "$ref" in schema:
+        schema = definitions[schema["$ref"].split("/")[-1]]
+    for combinator in ("anyOf", "oneOf", "allOf"):
+        if combinator in schema:
+            options = [option for option in schema[combinator] if option.get("type") != "null"]
+            schema = _resolve(options[0], definitions)
+    return schema
+
+
+def instance_for(schema, definitions, context, name=""):
+    """Minimal instance of a JSON schema, filled with plausible values"""
+    schema = _resolve(schema, definitions)
+    kind = schema.get("type")
+    if "enum" in schema:
+        return schema["enum"][0]
+    if kind == "object" or "properties" in schema:
+        return {key: instance_for(value, definitions, context, key) for key, value in schema.get("properties", {}).items()}
+    if kind == "array":
+        items = _resolve(schema.get("items", {}), definitions)
+        if "indicator" in items.get("properties", {}) and context["indicators"]:
+            # One entry per indicator of a batched extraction, matched by name
+            return [dict(instance_for(items, definitions, context), indicator=indicator) for indicator in context["indicators"]]
+        return [instance_for(items, definitions, context, name) for _ in range(3)]
+    if kind == "integer":
+        if "score" in name or "level" in name:
+            return context["random"].randint(0, 5)
+        return context["random"].randint(schema.get("minimum", 1), schema.get("maximum", 100))
+    if kind == "number":
+        return round(context["random"].uniform(0, 100), 1)
+    if kind == "boolean":
+        return True
+    return f"Stub {name.replace('_', ' ')} {context['random'].randint(1, 999)}".strip()
+
+
+def openai_answer(body, rng):
+    """Synthetic OpenAI chat completion, structured when the request asks for a schema"""
+    context = {"indicators": BATCH_INDICATOR_PATTERN.findall(_text(body.get("messages", []))), "random": rng}
+    message = {"role": "assistant", "content": None}
+
+    response_format = body.get("response_format") or {}
+    tools = body.get("tools") or []
+    if response_format.get("type") == "json_schema":
+        schema = response_format["json_schema"]["schema"]
+        message["content"] = json.dumps(instance_for(schema, schema.get("$defs", {}), context))
+    elif tools:
+        function = tools[0]["function"]
+        schema = function.get("parameters", {})
+        message["tool_calls"] = [{
+            "id": "call_stub", "type": "function",
+            "function": {"name": function["name"], "arguments": json.dumps(instance_for(schema, schema.get("$defs", {}), context))},
+        }]
+    else:
+        message["content"] = "Stub answer. " * 40
+
+    prompt_tokens = len(_text(body.get("messages", []))) // 4
+    completion_tokens = len(message["content"] or json.dumps(message.get("tool_calls"))) // 4
+    return {
+        "id": "chatcmpl-stub",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model"),
+        "choices": [{"index": 0, "finish_reason": "tool_calls" if tools else "stop", "message": message, "logprobs": None}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens},
+    }
+
+
+def stream_events(completion, chunks):
+    """Server-sent events of a chat completion split into ``chunks`` content deltas"""
+    content = completion["choices"][0]["message"]["content"] or ""
+    size = max(1, len(content) // max(1, chunks))
+    base = {key: completion[key] for key in ("id", "created", "model")}
+    for start in range(0, len(content), size):
+        delta = {"content": content[start:start + size]}
+        yield dict(base, object="chat.completion.chunk", choices=[{"index": 0, "delta": delta, "finish_reason": None}])
+    yield dict(base, object="chat.completion.chunk", choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}])
+
+
+##########################
+##### Fixtures ###########
+##########################
+
+def fixture_path(fixtures, provider, body):
+    # Streaming and non-streaming requests are answered differently, so "stream" stays part of the key
+    digest = hashlib.sha256(json.dumps(body, sort_keys=True).encode("utf-8")).hexdigest()[:32]
+    return fixtures / provider / f"{digest}.json"
+
+
+def record(config, provider, raw_body, body, headers):
+    """Forward the request to the real API and save its response as a fixture"""
+    request = urllib.request.Request(UPSTREAMS[provider], data=raw_body, method="POST", headers={
+        "Authorization": headers.get("Authorization", ""),
+        "Content-Type": "application/json",
+    })
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=600) as response:
+            status, content_type, payload = response.status, response.headers.get("Content-Type"), response.read()
+    except urllib.error.HTTPError as e:
+        status, content_type, payload = e.code, e.headers.get("Content-Type"), e.read()
+    latency = time.perf_counter() - start
+
+    if status == 200:
+        path = fixture_path(config.fixtures, provider, body)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps({"latency": latency, "content_type": content_type, "body": payload.decode("utf-8")}))
+    return status, content_type, payload
+
+
+##########################
+##### Server #############
+##########################
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; without this, delayed ACKs add ~40 ms per keep-alive response
+    disable_nagle_algorithm = True
+    config: StubConfig = None
+
+
+    def log_message(self, format, *args):
+        pass
+
+
+    def _send(self, status, payload, content_type="application/json", headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+    def _send_json(self, status, data, headers=None):
+        self._send(status, json.dumps(data).encode("utf-8"), headers=headers)
+
+
+    def do_POST(self):
+        config = self.config
+        if self.path.rstrip("/").endswith("/v1/chat/completions"):
+            provider = "openai"
+        elif self.path.rstrip("/").endswith("/chat/completions"):
+            provider = "perplexity"
+        else:
+            return self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+        raw_body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = json.loads(raw_body or b"{}")
+
+        if config.mode == "record":
+            status, content_type, payload = record(config, provider, raw_body, body, self.headers)
+            config.count(provider, "recorded" if status == 200 else "upstream_errors")
+            return self._send(status, payload, content_type or "application/json")
+
+        fixture = None
+        if config.mode == "replay":
+            path = fixture_path(config.fixtures, provider, body)
+            if path.exists():
+                fixture = json.loads(path.read_text())
+            elif config.strict:
+                config.count(provider, "missing_fixtures")
+                return self._send_json(404, {"error": {"message": "No recorded fixture for this request"}})
+
+        draw = config.latency[provider]
+        with config.lock:
+            outcome = config.random.random()
+            latency = draw() if draw is not None else (fixture["latency"] if fixture else 0.0)
+        time.sleep(latency)
+
+        if outcome < config.rate_limit_rate:
+            config.count(provider, "rate_limited")
+            return self._send_json(429, {"error": {"message": "Rate limit exceeded (stub)", "type": "rate_limit_exceeded"}}, headers={"Retry-After": str(config.retry_after)})
+        if outcome < config.rate_limit_rate + config.error_rate:
+            config.count(provider, "errors")
+            return self._send_json(500, {"error": {"message": "Internal error (stub)", "type": "server_error"}})
+
+        config.count(provider, "replayed" if fixture else "stubbed")
+        if fixture:
+            return self._send(200, fixture["body"].encode("utf-8"), fixture["content_type"] or "application/json")
+
+        with config.lock:
+            completion = perplexity_answer(body) if provider == "perplexity" else openai_answer(body, config.random)
+        if body.get("stream"):
+            events = "".join(f"data: {json.dumps(event)}\n\n" for event in stream_events(completion, config.stream_chunks)) + "data: [DONE]\n\n"
+            return self._send(200, events.encode("utf-8"), "text/event-stream")
+        return self._send_json(200, completion)
+
+
+def start_server(config: StubConfig, host="127.0.0.1", port=0):
+    """Serve ``config`` on a daemon thread; returns the server, whose ``server_port`` is the bound port"""
+    handler = type("ConfiguredStubHandler", (StubHandler,), {"config": config})
+    # The default listen backlog of 5 drops bursts of new connections, which then wait out a 1 s SYN retry
+    server_class = type("StubServer", (ThreadingHTTPServer,), {"request_queue_size": 256})
+    server = server_class((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="stub-server", daemon=True).start()
+    return server
+
+
+def add_arguments(parser):
+    parser.add_argument("--mode", choices=["stub", "record", "replay"], default="stub")
+    parser.add_argument("--fixtures", default="benchmarks/fixtures", help="Fixture directory of record and replay mode")
+    parser.add_argument("--strict", action="store_true", help="In replay mode, answer 404 instead of stubbing unrecorded requests")
+    parser.add_argument("--perplexity-latency", default="lognormal:1.5,0.4")
+    parser.add_argument("--openai-latency", default="lognormal:0.8,0.4")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with a 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of requests answered with a 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After header of 429 responses, in seconds")
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def config_from_args(args) -> StubConfig:
+    return StubConfig(
+        mode=args.mode, fixtures=args.fixtures, strict=args.strict,
+        perplexity_latency=args.perplexity_latency, openai_latency=args.openai_latency,
+        error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate, retry_after=args.retry_after, seed=args.seed
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    config = config_from_args(args)
+    server = start_server(config, args.host, args.port)
+    print(f"Serving {args.mode} on http://{args.host}:{server.server_port}")
+    print(f"  PERPLEXITY_API_URL=http://{args.host}:{server.server_port}/chat/completions")
+    print(f"  OPENAI_BASE_URL=http://{args.host}:{server.server_port}/v1")
+    try:
+        while True:
+            time.sleep(60)
+            print(json.dumps(config.counts), file=sys.stderr)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Summarize a JSONL trace file written by ``tracing.py`` per stage.
+
+For every span name it reports the number of spans, total and percentile
+durations, errors and the summed counters (retries, queue wait, tokens).
+Stages run concurrently, so their totals can add up to more than the wall
+time of the run; the wall time of each selected trace is printed too.
+
+Usage:
+    python benchmarks/trace_summary.py traces.jsonl
+    python benchmarks/trace_summary.py traces.jsonl --trace last
+    python benchmarks/trace_summary.py traces.jsonl --trace 3f2a9c0d1e4b5a6f
+"""
+
+import sys
+import json
+import argparse
+
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from search_scaling import percentile
+
+
+def load_spans(path, trace=None):
+    spans = [json.loads(line) for line in Path(path).read_text(encoding="utf-8").splitlines() if line.strip()]
+    if trace == "last" and spans:
+        # The root span finishes last, so the last line belongs to the most recent trace
+        trace = spans[-1]["trace_id"]
+    return [span for span in spans if trace is None or span["trace_id"] == trace]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path")
+    parser.add_argument("--trace", default=None, help="Trace id to summarize, or 'last'; defaults to every trace in the file")
+    args = parser.parse_args()
+
+    spans = load_spans(args.path, args.trace)
+    if not spans:
+        print("No spans found")
+        return
+
+    roots = [span for span in spans if span["parent_id"] is None]
+    for root in roots[-10:]:
+        print(f"trace {root['trace_id']}: {root['name']} {json.dumps(root['attributes'])} {root['duration_s']:.1f} s ({root['status']})")
+
+    stages = {}
+    for span in spans:
+        stages.setdefault(span["name"], []).append(span)
+
+    print(f"\n{'stage':<22}{'spans':>7}{'total s':>10}{'p50 s':>8}{'p95 s':>8}{'max s':>8}{'errors':>8}  counters")
+    for name, stage_spans in sorted(stages.items(), key=lambda item: -sum(span["duration_s"] for span in item[1])):
+        durations = [span["duration_s"] for span in stage_spans]
+        counters = {}
+        for span in stage_spans:
+            for counter, value in span["counters"].items():
+                counters[counter] = counters.get(counter, 0) + value
+        errors = sum(span["status"] == "error" for span in stage_spans)
+        print(
+            f"{name:<22}{len(stage_spans):>7}{sum(durations):>10.1f}{percentile(durations, 50):>8.2f}{percentile(durations, 95):>8.2f}{max(durations):>8.2f}{errors:>8}  "
+            + ", ".join(f"{counter}={value:.1f}" for counter, value in sorted(counters.items()))
+        )
+
+
+if __name__ == "__main__":
+    main()
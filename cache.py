@@ -0,0 +1,212 @@
+####################
+##### Imports ######
+####################
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+
+from typing import Optional, Any, Dict
+
+logger = logging.getLogger(__name__)
+
+#############################
+##### Search Result Cache ###
+#############################
+
+DEFAULT_CACHE_PATH = os.getenv("SEARCH_CACHE_PATH", "search_cache.db")
+DEFAULT_TTL_SECONDS = int(os.getenv("SEARCH_CACHE_TTL", 7 * 24 * 60 * 60))
+DEFAULT_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", 10000))
+
+
+def make_cache_key(**parts: Any) -> str:
+    """
+    Build a content-addressed cache key from the given request parts.
+
+    The parts are serialized as sorted JSON so that the key only depends on
+    their values, never on argument order.
+    """
+    serialized = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+class SearchCache:
+    def __init__(
+            self,
+            path: str = DEFAULT_CACHE_PATH,
+            ttl_seconds: Optional[float] = DEFAULT_TTL_SECONDS,
+            max_entries: int = DEFAULT_MAX_ENTRIES
+    ):
+        """
+        Disk-backed key/value cache for API results, stored in SQLite.
+
+        Entries expire after ``ttl_seconds`` and the least recently used
+        entries are evicted once the cache holds more than ``max_entries``.
+
+        Args:
+            path (str): Path of the SQLite database file
+            ttl_seconds (float, optional): Time to live of an entry, None disables expiry
+            max_entries (int): Maximum number of entries kept on disk
+        """
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        # WAL lets several app processes read while one writes
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_accessed ON cache (accessed_at)")
+        self._conn.commit()
+
+
+    def _is_expired(self, created_at: float, now: float) -> bool:
+        """Check whether an entry created at ``created_at`` has expired"""
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for ``key`` or None on a miss"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created_at FROM cache WHERE key = ?", (key,)).fetchone()
+
+            if row is None or self._is_expired(row[1], now):
+                if row is not None:
+                    self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+
+            self._conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+
+        return json.loads(row[0])
+
+
+    def set(self, key: str, value: Any):
+        """Store a JSON-serializable ``value`` under ``key`` and evict old entries"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now, now)
+            )
+            self._evict(now)
+            self._conn.commit()
+
+
+    def _evict(self, now: float):
+        """Remove expired entries and trim the cache to ``max_entries`` (LRU)"""
+        if self.ttl_seconds is not None:
+            self._conn.execute("DELETE FROM cache WHERE created_at < ?", (now - self.ttl_seconds,))
+
+        self._conn.execute(
+            """
+            DELETE FROM cache WHERE key IN (
+                SELECT key FROM cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_entries,)
+        )
+
+
+    def clear(self):
+        """Remove every entry from the cache"""
+        with self._lock:
+            self._conn.execute("DELETE FROM cache")
+            self._conn.commit()
+
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and the current number of entries"""
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": size,
+        }
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_search_cache() -> SearchCache:
+    """Return the process-wide search cache, creating it on first use"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = SearchCache()
+            logger.info(f"get_search_cache: Opened search cache at {_default_cache.path}")
+    return _default_cache
+
+
+##############################
+##### Shared Result Store ####
+##############################
+
+DEFAULT_RESULT_STORE_PATH = os.getenv("RESULT_STORE_PATH", "results.db")
+DEFAULT_RESULT_STORE_TTL = int(os.getenv("RESULT_STORE_TTL", DEFAULT_TTL_SECONDS))
+
+
+class ResultStore(SearchCache):
+    def __init__(self, path: str = DEFAULT_RESULT_STORE_PATH, ttl_seconds: Optional[float] = DEFAULT_RESULT_STORE_TTL, max_entries: int = DEFAULT_MAX_ENTRIES):
+        """
+        Store of finished indicator results shared by every session and, through
+        the SQLite file, by every app process on the host.
+
+        Besides hits and misses it counts lookups that were coalesced onto an
+        identical request already in flight, which cost no API call either.
+        """
+        super().__init__(path=path, ttl_seconds=ttl_seconds, max_entries=max_entries)
+        self.coalesced = 0
+
+
+    def record_coalesced(self):
+        with self._lock:
+            self.coalesced += 1
+
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit, miss and coalescing counters; ``hit_rate`` counts coalesced lookups as hits"""
+        stats = super().stats()
+        lookups = self.hits + self.misses + self.coalesced
+        stats["coalesced"] = self.coalesced
+        stats["hit_rate"] = (self.hits + self.coalesced) / lookups if lookups else 0.0
+        return stats
+
+
+_default_result_store = None
+_default_result_store_lock = threading.Lock()
+
+
+def get_result_store() -> ResultStore:
+    """Return the process-wide result store, creating it on first use"""
+    global _default_result_store
+    with _default_result_store_lock:
+        if _default_result_store is None:
+            _default_result_store = ResultStore()
+            logger.info(f"get_result_store: Opened result store at {_default_result_store.path}")
+    return _default_result_store
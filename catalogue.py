@@ -0,0 +1,138 @@
+####################
+##### Imports ######
+####################
+
+import os
+import hashlib
+import logging
+import threading
+
+from pathlib import Path
+from functools import lru_cache
+from typing import Dict, List, Any, TYPE_CHECKING
+
+from tracing import span
+
+# pandas and pyarrow are imported when the catalogue is first loaded
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+##################################
+##### Indicator Catalogue ########
+##################################
+
+WORKBOOK_PATH = './Provisional indicator list.xlsx'
+CATALOGUE_CACHE_DIR = os.getenv("CATALOGUE_CACHE_DIR", ".cache")
+
+# Define the sheet names and the desired columns
+SHEETS = [
+    "Digital Transformation",
+    "Policies and Regulations",
+    "People and Digital Skills",
+    "City Functions",
+    "City",
+    "Data"
+]
+COLUMNS = ["Category", "Indicator", "City Level Source", "National Data Source",
+           "Maturity Assessment (1-5)", "Toolkit Source"]
+
+
+def _file_digest(path: str) -> str:
+    """SHA-256 of the workbook contents"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _read_workbook(path: str) -> "pd.DataFrame":
+    """Parse the indicator sheets of the Excel workbook (slow, openpyxl)"""
+    import pandas as pd
+
+    # Read each sheet into a DataFrame, selecting the desired columns, and concatenate them
+    df_list = []
+    for sheet in SHEETS:
+        try:
+            sheet_df = pd.read_excel(path, sheet_name=sheet, usecols=COLUMNS)
+            df_list.append(sheet_df)
+        except Exception as e:
+            logger.error(f"_read_workbook: Error reading sheet {sheet}: {e}")
+
+    # Combine all the data into a single DataFrame with string columns so it round-trips through Arrow
+    combined_df = pd.concat(df_list, ignore_index=True)
+    return combined_df.astype("string")
+
+
+def _compile_catalogue(path: str, digest: str) -> Path:
+    """Compile the workbook into a Parquet file named after its content hash, if not already compiled"""
+    cache_path = Path(CATALOGUE_CACHE_DIR) / f"indicators-{digest[:16]}.parquet"
+    if cache_path.exists():
+        return cache_path
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    logger.info(f"_compile_catalogue: Compiling {path} into {cache_path}")
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    table = pa.Table.from_pandas(_read_workbook(path), preserve_index=False)
+
+    # Write atomically so concurrent processes never read a partial file
+    tmp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, cache_path)
+    return cache_path
+
+
+class IndicatorCatalogue:
+    def __init__(self, df: "pd.DataFrame"):
+        """
+        Read-only indicator catalogue with pre-built lookups.
+
+        Args:
+            df (pd.DataFrame): Combined indicator sheets
+        """
+        self.df = df
+        self.categories: List[str] = list(df["Category"].dropna().unique())
+        self.by_category: Dict[str, "pd.DataFrame"] = {
+            category: group.reset_index(drop=True) for category, group in df.groupby("Category", sort=False)
+        }
+        self.by_indicator: Dict[str, Dict[str, Any]] = {
+            row["Indicator"]: row for row in df.dropna(subset=["Indicator"]).to_dict("records")
+        }
+
+
+    def indicators(self, category: str) -> "pd.DataFrame":
+        """Indicators of ``category``, empty if the category is unknown"""
+        return self.by_category.get(category, self.df.iloc[0:0])
+
+
+_catalogue_lock = threading.Lock()
+
+
+@lru_cache(maxsize=4)
+def _load_catalogue(path: str, mtime_ns: int, size: int) -> IndicatorCatalogue:
+    """Load the catalogue for one version of the workbook, identified by its mtime and size"""
+    import pyarrow.parquet as pq
+
+    cache_path = _compile_catalogue(path, _file_digest(path))
+    table = pq.read_table(cache_path, memory_map=True)
+    return IndicatorCatalogue(table.to_pandas())
+
+
+def get_indicator_catalogue(path: str = WORKBOOK_PATH) -> IndicatorCatalogue:
+    """
+    Return the indicator catalogue, shared by every session in the process.
+
+    The workbook is parsed only when its content changes; otherwise the
+    compiled Parquet file is memory-mapped, and within a process the loaded
+    catalogue is reused until the workbook's mtime or size changes.
+    """
+    stat = os.stat(path)
+    with _catalogue_lock, span("catalogue.load") as load:
+        hits = _load_catalogue.cache_info().hits
+        catalogue = _load_catalogue(path, stat.st_mtime_ns, stat.st_size)
+        load.set(cached=_load_catalogue.cache_info().hits > hits)
+        return catalogue
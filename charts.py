@@ -0,0 +1,212 @@
+####################
+##### Imports ######
+####################
+
+import io
+import os
+import json
+import math
+import logging
+
+from functools import lru_cache
+from typing import Dict, List, Any, Tuple, Sequence, Mapping
+
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+##########################
+##### Radar Charts #######
+##########################
+
+# 'vega-lite' sends a chart spec for the browser to draw; 'matplotlib' renders a PNG on the server
+RADAR_CHART_RENDERER = os.getenv("RADAR_CHART_RENDERER", "vega-lite")
+RADAR_CHART_CACHE_SIZE = int(os.getenv("RADAR_CHART_CACHE_SIZE", 128))
+
+MAX_SCORE = 5
+# Longest axis label drawn in the Vega-Lite chart; the full indicator is in the tooltip
+LABEL_CHARS = 40
+
+# (indicators, ((city, scores), ...), title), hashable so that rendered charts can be cached by value
+ChartKey = Tuple[Tuple[str, ...], Tuple[Tuple[str, Tuple[float, ...]], ...], str]
+
+
+def _chart_key(indicators: Sequence[str], values_dict: Mapping[str, Sequence[float]], title: str) -> ChartKey:
+    """Immutable copy of the chart inputs; missing scores are drawn as 0"""
+    return (
+        tuple(indicators),
+        tuple((city, tuple(float(score or 0) for score in values)) for city, values in values_dict.items()),
+        title,
+    )
+
+
+def _axis_points(num_vars: int, radius: float) -> List[Tuple[float, float]]:
+    """Cartesian end points of ``num_vars`` axes of length ``radius``, clockwise from the top"""
+    return [(radius * math.sin(2 * math.pi * axis / num_vars), radius * math.cos(2 * math.pi * axis / num_vars)) for axis in range(num_vars)]
+
+
+@lru_cache(maxsize=RADAR_CHART_CACHE_SIZE)
+def _radar_spec_json(key: ChartKey) -> str:
+    indicators, series, title = key
+    num_vars = len(indicators)
+    unit = _axis_points(num_vars, 1.0)
+
+    # Polar coordinates are converted to x/y here, so the chart is plain line, rule and text marks
+    grid = [
+        {"level": level, "order": axis, "x": x * level, "y": y * level}
+        for level in range(1, MAX_SCORE + 1) for axis, (x, y) in enumerate(unit)
+    ]
+    spokes = [{"x": 0.0, "y": 0.0, "x2": x * MAX_SCORE, "y2": y * MAX_SCORE} for x, y in unit]
+    labels = [
+        {
+            "indicator": indicator,
+            "label": indicator if len(indicator) <= LABEL_CHARS else indicator[:LABEL_CHARS - 1] + "…",
+            "x": x * MAX_SCORE * 1.12,
+            "y": y * MAX_SCORE * 1.12,
+            "align": "left" if x > 0.1 else "right" if x < -0.1 else "center",
+        }
+        for indicator, (x, y) in zip(indicators, unit)
+    ]
+    ticks = [{"level": level, "x": 0.0, "y": float(level)} for level in range(1, MAX_SCORE + 1)]
+    points = [
+        {"city": city, "indicator": indicator, "score": score, "order": axis, "x": x * score, "y": y * score}
+        for city, scores in series for axis, (indicator, score, (x, y)) in enumerate(zip(indicators, scores, unit))
+    ]
+
+    # Wider than tall to leave room for the axis labels; the sizes keep one unit equally long on both axes
+    x_extent, y_extent = MAX_SCORE * 1.6, MAX_SCORE * 1.25
+    x = {"field": "x", "type": "quantitative", "scale": {"domain": [-x_extent, x_extent]}, "axis": None}
+    y = {"field": "y", "type": "quantitative", "scale": {"domain": [-y_extent, y_extent]}, "axis": None}
+    spec = {
+        "$schema": "https://vega.github.io/schema/vega-lite/v5.json",
+        "title": title,
+        "width": 640,
+        "height": round(640 * y_extent / x_extent),
+        "config": {"view": {"stroke": None}},
+        "layer": [
+            {
+                "data": {"values": grid},
+                "mark": {"type": "line", "interpolate": "linear-closed", "color": "gray", "strokeDash": [4, 4], "strokeWidth": 0.5},
+                "encoding": {"x": x, "y": y, "detail": {"field": "level"}, "order": {"field": "order"}},
+            },
+            {
+                "data": {"values": spokes},
+                "mark": {"type": "rule", "color": "gray", "strokeWidth": 0.5},
+                "encoding": {"x": x, "y": y, "x2": {"field": "x2"}, "y2": {"field": "y2"}},
+            },
+            {
+                "data": {"values": ticks},
+                "mark": {"type": "text", "color": "gray", "dx": 6, "align": "left", "fontSize": 10},
+                "encoding": {"x": x, "y": y, "text": {"field": "level"}},
+            },
+            # Labels are anchored away from the centre, one layer per text alignment
+            *[
+                {
+                    "data": {"values": [label for label in labels if label["align"] == align]},
+                    "mark": {"type": "text", "fontSize": 11, "align": align},
+                    "encoding": {"x": x, "y": y, "text": {"field": "label"}, "tooltip": [{"field": "indicator"}]},
+                }
+                for align in ("left", "right", "center")
+            ],
+            {
+                "data": {"values": points},
+                "mark": {"type": "line", "interpolate": "linear-closed", "strokeWidth": 2, "point": True},
+                "encoding": {
+                    "x": x, "y": y,
+                    "color": {"field": "city", "type": "nominal", "title": "City"},
+                    "order": {"field": "order"},
+                    "tooltip": [{"field": "city"}, {"field": "indicator"}, {"field": "score", "type": "quantitative"}],
+                },
+            },
+        ],
+    }
+    return json.dumps(spec, ensure_ascii=False)
+
+
+def radar_chart_spec(indicators: Sequence[str], values_dict: Mapping[str, Sequence[float]], title: str) -> Dict[str, Any]:
+    """
+    Vega-Lite spec of an overlapping radar (spider) chart, drawn in the browser.
+
+    The spec is cached by (indicators, scores, title), and every call returns
+    a fresh copy that the caller may modify. The inputs are not modified.
+
+    Args:
+        indicators (List[str]): Indicators, one axis each
+        values_dict (Dict): Maturity scores (0-5) per city, ordered like ``indicators``
+        title (str): Title of the chart
+
+    Returns:
+        Dict: Vega-Lite v5 spec
+    """
+    return json.loads(_radar_spec_json(_chart_key(indicators, values_dict, title)))
+
+
+@lru_cache(maxsize=RADAR_CHART_CACHE_SIZE)
+def _radar_png(key: ChartKey) -> bytes:
+    # Plotting libraries are only needed here, so they are imported on first render
+    from matplotlib.figure import Figure
+
+    indicators, series, title = key
+    # Compute angle for each axis, closing the circle with the first one
+    angles = [2 * math.pi * axis / len(indicators) for axis in range(len(indicators))]
+    closed_angles = angles + angles[:1]
+
+    # A standalone Figure is not registered with pyplot, so it is freed once rendered and safe to draw from any thread
+    fig = Figure(figsize=(8, 8))
+    ax = fig.add_subplot(polar=True)
+    for city, scores in series:
+        closed_scores = list(scores) + list(scores[:1])
+        ax.plot(closed_angles, closed_scores, linewidth=2, linestyle='solid', label=city)
+        ax.fill(closed_angles, closed_scores, alpha=0.25)
+
+    ax.set_xticks(angles)
+    ax.set_xticklabels(indicators, fontsize=12)
+    ax.set_yticks([1, 2, 3, 4, 5])
+    ax.set_yticklabels(["1", "2", "3", "4", "5"], fontsize=10)
+    ax.set_title(title, fontsize=16, pad=20)
+    ax.legend(loc='upper right', bbox_to_anchor=(0, 0), fontsize=10)
+    ax.grid(color='gray', linestyle='--', linewidth=0.5)
+    ax.spines['polar'].set_visible(False)
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", bbox_inches="tight")
+    return buffer.getvalue()
+
+
+def radar_chart_png(indicators: Sequence[str], values_dict: Mapping[str, Sequence[float]], title: str) -> bytes:
+    """PNG of the radar chart rendered with matplotlib, cached by (indicators, scores, title)"""
+    return _radar_png(_chart_key(indicators, values_dict, title))
+
+
+def create_spider_chart(indicators, values_dict, title, renderer: str = RADAR_CHART_RENDERER):
+    """
+    Creates an overlapping radar (spider) chart for multiple cities in Streamlit.
+
+    Parameters:
+    - indicators: List of indicators.
+    - values_dict: Dictionary with city names as keys and list of values as values; not modified.
+    - title: Title of the chart.
+    - renderer: 'vega-lite' (drawn by the browser) or 'matplotlib' (PNG rendered on the server).
+    """
+    import streamlit as st
+
+    key = _chart_key(indicators, values_dict, title)
+    render = _radar_png if renderer == "matplotlib" else _radar_spec_json
+    with span("chart.render", indicators=len(indicators), cities=len(values_dict), renderer=renderer) as render_span:
+        hits = render.cache_info().hits
+        output = render(key)
+        render_span.set(cached=render.cache_info().hits > hits)
+
+    if renderer == "matplotlib":
+        st.image(output)
+    else:
+        st.vega_lite_chart(json.loads(output), use_container_width=False)
+
+
+def chart_stats() -> Dict[str, Any]:
+    """Hits, misses and size of the rendered chart caches"""
+    stats = {}
+    for name, render in (("spec", _radar_spec_json), ("png", _radar_png)):
+        info = render.cache_info()
+        stats.update({f"{name}_hits": info.hits, f"{name}_misses": info.misses, f"{name}_cached": info.currsize})
+    return stats
@@ -0,0 +1,126 @@
+####################
+##### Imports ######
+####################
+
+import os
+import threading
+
+from typing import Dict, Any, Tuple, TYPE_CHECKING
+
+# httpx, openai and langchain_openai are imported on first client construction to keep startup fast
+if TYPE_CHECKING:
+    import httpx
+    import openai
+    from langchain_openai import ChatOpenAI
+
+##################################
+##### Client Registry ############
+##################################
+
+GPT_MODEL = 'gpt-4o'
+
+_clients: Dict[Tuple, Any] = {}
+_clients_lock = threading.RLock()
+
+_metrics = {
+    "clients_created": 0,
+    "clients_reused": 0,
+    "http_requests": 0,
+    "connections_opened": 0,
+}
+_metrics_lock = threading.Lock()
+
+
+def openai_base_url() -> str:
+    """API base URL the OpenAI clients send to; the SDK reads OPENAI_BASE_URL itself, e.g. for the local stub server"""
+    return os.getenv("OPENAI_BASE_URL") or "https://api.openai.com/v1"
+
+
+def _increment(metric: str):
+    with _metrics_lock:
+        _metrics[metric] += 1
+
+
+def _trace_connections(event_name: str, info: Dict):
+    """httpcore trace callback counting newly opened connections"""
+    if event_name == "connection.connect_tcp.complete":
+        _increment("connections_opened")
+
+
+async def _atrace_connections(event_name: str, info: Dict):
+    _trace_connections(event_name, info)
+
+
+def _on_request(request: "httpx.Request"):
+    _increment("http_requests")
+    request.extensions["trace"] = _trace_connections
+
+
+async def _aon_request(request: "httpx.Request"):
+    _increment("http_requests")
+    request.extensions["trace"] = _atrace_connections
+
+
+def _get_or_create(key: Tuple, factory):
+    """Return the registered client for ``key``, creating it with ``factory`` on first use"""
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = factory()
+            _clients[key] = client
+            _increment("clients_created")
+        else:
+            _increment("clients_reused")
+    return client
+
+
+def get_http_client() -> "httpx.Client":
+    """Pooled HTTP client shared by every OpenAI and LangChain client"""
+    import httpx
+    return _get_or_create(("http",), lambda: httpx.Client(
+        timeout=httpx.Timeout(600, connect=10),
+        event_hooks={"request": [_on_request]}
+    ))
+
+
+def get_async_http_client() -> "httpx.AsyncClient":
+    """Pooled async HTTP client shared by every OpenAI and LangChain client"""
+    import httpx
+    return _get_or_create(("async_http",), lambda: httpx.AsyncClient(
+        timeout=httpx.Timeout(600, connect=10),
+        event_hooks={"request": [_aon_request]}
+    ))
+
+
+def get_openai_client() -> "openai.OpenAI":
+    """Shared OpenAI SDK client"""
+    import openai
+    return _get_or_create(("openai",), lambda: openai.OpenAI(
+        api_key=os.getenv("OPENAI_API_KEY"),
+        http_client=get_http_client()
+    ))
+
+
+def get_chat_model(model: str = GPT_MODEL, temperature: float = 0) -> "ChatOpenAI":
+    """Shared LangChain chat model for ``model`` and ``temperature``"""
+    from langchain_openai import ChatOpenAI
+    return _get_or_create(("chat", model, temperature), lambda: ChatOpenAI(
+        model=model,
+        temperature=temperature,
+        http_client=get_http_client(),
+        http_async_client=get_async_http_client()
+    ))
+
+
+def get_structured_llm(schema, model: str = GPT_MODEL, temperature: float = 0):
+    """Shared ``with_structured_output`` runnable for ``schema`` on top of the shared chat model"""
+    return _get_or_create(("structured", model, temperature, schema), lambda: get_chat_model(model, temperature).with_structured_output(schema))
+
+
+def client_registry_stats() -> Dict[str, Any]:
+    """Client construction and connection reuse counters"""
+    with _metrics_lock:
+        stats = dict(_metrics)
+    requests = stats["http_requests"]
+    stats["connection_reuse_rate"] = 1 - stats["connections_opened"] / requests if requests else 0.0
+    return stats
@@ -0,0 +1,182 @@
+####################
+##### Imports ######
+####################
+
+import os
+import re
+import math
+import logging
+import threading
+
+from collections import Counter
+from functools import lru_cache
+from typing import Optional, List, Dict, Any, NamedTuple, Sequence, TYPE_CHECKING
+
+# numpy is only needed for near-duplicate detection
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+#################################
+##### Query Deduplication #######
+#################################
+
+# 'exact' only collapses queries that are identical after normalization. 'tfidf' and 'embedding'
+# also collapse near-duplicates and must be turned on explicitly: near-duplicate indicators can
+# ask for different data ('broadband' vs 'fixed broadband') and would share one answer.
+# 'auto' uses embeddings when a local model is installed, TF-IDF otherwise
+DEDUP_MODE = os.getenv("DEDUP_MODE", "exact")
+DEDUP_EMBEDDING_MODEL = os.getenv("DEDUP_EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+DEDUP_THRESHOLDS = {
+    "tfidf": float(os.getenv("DEDUP_TFIDF_THRESHOLD", 0.85)),
+    "embedding": float(os.getenv("DEDUP_EMBEDDING_THRESHOLD", 0.92)),
+}
+
+NUMBER_PATTERN = re.compile(r"\d+(?:[.,]\d+)*")
+
+_metrics = {"queries": 0, "exact_duplicates": 0, "near_duplicates": 0}
+_metrics_lock = threading.Lock()
+
+
+def normalize_text(text: str) -> str:
+    """Case-, whitespace- and punctuation-insensitive form of a query"""
+    return " ".join(re.sub(r"[^\w\s%]", " ", text.lower()).split())
+
+
+class Deduplication(NamedTuple):
+    """Collapsed queries: one representative per cluster and the cluster of every input query"""
+    unique: List[str]
+    assignment: List[int]
+
+
+    def fan_out(self, results: Sequence[Any]) -> List[Any]:
+        """Map one result per representative back onto every input query"""
+        return [results[cluster] for cluster in self.assignment]
+
+
+    def members(self, cluster: int) -> List[int]:
+        """Positions of the input queries in ``cluster``"""
+        return [position for position, assigned in enumerate(self.assignment) if assigned == cluster]
+
+
+def _trigrams(text: str) -> Counter:
+    """Character trigrams of every word, padded with spaces so word boundaries count"""
+    return Counter(padded[i:i + 3] for word in text.split() for padded in [f" {word} "] for i in range(len(padded) - 2))
+
+
+def _tfidf_vectors(texts: List[str]) -> "np.ndarray":
+    """L2-normalized TF-IDF vectors over character trigrams, robust to small rephrasings"""
+    import numpy as np
+
+    grams = [_trigrams(text) for text in texts]
+    vocabulary = {gram: index for index, gram in enumerate(sorted(set().union(*grams)))}
+    document_frequency = Counter(gram for counts in grams for gram in counts)
+
+    vectors = np.zeros((len(texts), len(vocabulary)))
+    for row, counts in enumerate(grams):
+        for gram, count in counts.items():
+            vectors[row, vocabulary[gram]] = (1 + math.log(count)) * (math.log((1 + len(texts)) / (1 + document_frequency[gram])) + 1)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+@lru_cache(maxsize=1)
+def _embedding_model():
+    """Local sentence embedding model, or None if sentence-transformers is not installed"""
+    try:
+        from sentence_transformers import SentenceTransformer
+    except ImportError:
+        return None
+    try:
+        return SentenceTransformer(DEDUP_EMBEDDING_MODEL)
+    except Exception as e:
+        logger.warning(f"_embedding_model: Could not load {DEDUP_EMBEDDING_MODEL}, falling back to TF-IDF: {e}")
+        return None
+
+
+def _vectors(texts: List[str], mode: str):
+    """Normalized vectors of ``texts`` and the backend actually used"""
+    if mode in ("embedding", "auto"):
+        model = _embedding_model()
+        if model is not None:
+            return model.encode(texts, normalize_embeddings=True), "embedding"
+        if mode == "embedding":
+            logger.warning("_vectors: sentence-transformers is not installed, falling back to TF-IDF")
+    return _tfidf_vectors(texts), "tfidf"
+
+
+def deduplicate_queries(queries: Sequence[str], mode: Optional[str] = None, threshold: Optional[float] = None) -> Deduplication:
+    """
+    Collapse identical and near-identical queries so that each cluster is searched once.
+
+    Queries are first grouped by their normalized text. Near-duplicate
+    detection is off by default ('exact'); when ``mode`` turns it on, the
+    remaining distinct queries are clustered greedily in input order: a query
+    joins the first cluster whose representative has a cosine similarity of
+    at least ``threshold`` with it. Queries mentioning different numbers
+    ('per 1,000' vs 'per 100,000') are never merged.
+
+    Args:
+        queries (Sequence[str]): Queries or indicator names
+        mode (str, optional): 'exact', 'tfidf', 'embedding' or 'auto' (defaults to DEDUP_MODE, 'exact' unless set)
+        threshold (float, optional): Similarity threshold, defaults to the backend's DEDUP_THRESHOLDS entry
+
+    Returns:
+        Deduplication: Representatives (the first query of each cluster) and the cluster of every query
+    """
+    mode = mode or DEDUP_MODE
+    queries = list(queries)
+
+    # Exact stage
+    normalized_clusters: Dict[str, int] = {}
+    distinct: List[str] = []
+    exact_assignment = []
+    for query in queries:
+        key = normalize_text(query)
+        if key not in normalized_clusters:
+            normalized_clusters[key] = len(distinct)
+            distinct.append(query)
+        exact_assignment.append(normalized_clusters[key])
+
+    # Near-duplicate stage
+    near_assignment = list(range(len(distinct)))
+    if mode != "exact" and len(distinct) > 1:
+        vectors, backend = _vectors([normalize_text(query) for query in distinct], mode)
+        threshold = threshold if threshold is not None else DEDUP_THRESHOLDS[backend]
+        similarity = vectors @ vectors.T
+        numbers = [set(NUMBER_PATTERN.findall(query.replace(",", ""))) for query in distinct]
+
+        leaders: List[int] = []
+        for position in range(len(distinct)):
+            for cluster, leader in enumerate(leaders):
+                if similarity[position, leader] >= threshold and numbers[position] == numbers[leader]:
+                    near_assignment[position] = cluster
+                    break
+            else:
+                near_assignment[position] = len(leaders)
+                leaders.append(position)
+        unique = [distinct[leader] for leader in leaders]
+    else:
+        unique = distinct
+
+    assignment = [near_assignment[cluster] for cluster in exact_assignment]
+
+    with _metrics_lock:
+        _metrics["queries"] += len(queries)
+        _metrics["exact_duplicates"] += len(queries) - len(distinct)
+        _metrics["near_duplicates"] += len(distinct) - len(unique)
+    if len(unique) < len(queries):
+        logger.info(f"deduplicate_queries: {len(queries)} queries collapsed into {len(unique)} searches ({len(queries) - len(distinct)} exact, {len(distinct) - len(unique)} near duplicates)")
+
+    return Deduplication(unique=unique, assignment=assignment)
+
+
+def dedup_stats() -> Dict[str, Any]:
+    """Queries seen and searches saved by deduplication since start-up"""
+    with _metrics_lock:
+        stats = dict(_metrics)
+    saved = stats["exact_duplicates"] + stats["near_duplicates"]
+    stats["searches"] = stats["queries"] - saved
+    stats["saved_rate"] = saved / stats["queries"] if stats["queries"] else 0.0
+    return stats
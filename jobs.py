@@ -0,0 +1,470 @@
+####################
+##### Imports ######
+####################
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+
+from typing import Optional, Any, Dict, List, Tuple, Callable
+
+from cache import make_cache_key
+from tracing import span
+from usage import UsageMeter, BudgetExhausted, metered
+
+logger = logging.getLogger(__name__)
+
+##########################
+##### Job Store ##########
+##########################
+
+DEFAULT_JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", "jobs.db")
+
+# Task states; anything but DONE is executed again when the job is resubmitted
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+def make_job_id(kind: str, **parts: Any) -> str:
+    """Deterministic job id, so resubmitting the same job resumes it instead of starting over"""
+    return f"{kind}-{make_cache_key(kind=kind, **parts)[:16]}"
+
+
+class JobStore:
+    def __init__(self, path: str = DEFAULT_JOB_STORE_PATH):
+        """
+        Persistent record of jobs and the state and result of each of their tasks, stored in SQLite.
+
+        A task is one (city, indicator) pair. Its result is written the moment
+        it completes, so a crashed or abandoned run loses at most the tasks
+        that were still in flight.
+
+        Args:
+            path (str): Path of the SQLite database file
+        """
+        self.path = path
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                params TEXT NOT NULL,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS tasks (
+                job_id TEXT NOT NULL,
+                city TEXT NOT NULL,
+                indicator TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                state TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (job_id, city, indicator)
+            );
+            CREATE TABLE IF NOT EXISTS usage (
+                job_id TEXT NOT NULL,
+                city TEXT NOT NULL,
+                indicator TEXT NOT NULL,
+                provider TEXT NOT NULL,
+                model TEXT NOT NULL,
+                requests REAL NOT NULL,
+                prompt_tokens REAL NOT NULL,
+                completion_tokens REAL NOT NULL,
+                cost_usd REAL NOT NULL,
+                PRIMARY KEY (job_id, city, indicator, provider, model)
+            );
+            """
+        )
+        self._conn.commit()
+
+
+    def create_job(self, kind: str, cities: List[str], indicators: List[str], **params: Any) -> str:
+        """
+        Register a job over every (city, indicator) pair, or return the existing job with the same inputs.
+
+        Returns:
+            str: Job id
+        """
+        job_id = make_job_id(kind, cities=cities, indicators=indicators, **params)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO jobs (job_id, kind, params, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(dict(cities=cities, indicators=indicators, **params), ensure_ascii=False), now, now)
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO tasks (job_id, city, indicator, position, state, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                [(job_id, city, indicator, position, PENDING, now) for city in cities for position, indicator in enumerate(indicators)]
+            )
+            self._conn.commit()
+        return job_id
+
+
+    def params(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Parameters the job was created with, or None for an unknown job"""
+        with self._lock:
+            row = self._conn.execute("SELECT params FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+
+    def pending_tasks(self, job_id: str) -> Dict[str, List[Tuple[int, str]]]:
+        """(position, indicator) pairs not yet done, per city"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT city, position, indicator FROM tasks WHERE job_id = ? AND state != ? ORDER BY city, position",
+                (job_id, DONE)
+            ).fetchall()
+        pending: Dict[str, List[Tuple[int, str]]] = {}
+        for city, position, indicator in rows:
+            pending.setdefault(city, []).append((position, indicator))
+        return pending
+
+
+    def set_state(self, job_id: str, city: str, indicators: List[str], state: str, error: Optional[str] = None):
+        """Move the given tasks of ``city`` to ``state``"""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE tasks SET state = ?, error = ?, updated_at = ? WHERE job_id = ? AND city = ? AND indicator = ? AND state != ?",
+                [(state, error, now, job_id, city, indicator, DONE) for indicator in indicators]
+            )
+            self._conn.execute("UPDATE jobs SET updated_at = ? WHERE job_id = ?", (now, job_id))
+            self._conn.commit()
+
+
+    def record_result(self, job_id: str, city: str, indicator: str, result: Dict[str, Any]):
+        """Store the JSON-serializable result of one task and mark it done"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE tasks SET state = ?, result = ?, error = NULL, updated_at = ? WHERE job_id = ? AND city = ? AND indicator = ?",
+                (DONE, json.dumps(result, ensure_ascii=False, default=str), now, job_id, city, indicator)
+            )
+            self._conn.execute("UPDATE jobs SET updated_at = ? WHERE job_id = ?", (now, job_id))
+            self._conn.commit()
+
+
+    def record_error(self, job_id: str, error: Optional[str]):
+        """Store (or clear, with None) the error that stopped the last run of the job"""
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET error = ?, updated_at = ? WHERE job_id = ?", (error, time.time(), job_id))
+            self._conn.commit()
+
+
+    def record_usage(self, job_id: str, rows: List[Dict[str, Any]]):
+        """Add usage rows drained from a ``usage.UsageMeter`` to the job's totals"""
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                """
+                INSERT INTO usage (job_id, city, indicator, provider, model, requests, prompt_tokens, completion_tokens, cost_usd)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (job_id, city, indicator, provider, model) DO UPDATE SET
+                    requests = requests + excluded.requests,
+                    prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+                    completion_tokens = completion_tokens + excluded.completion_tokens,
+                    cost_usd = cost_usd + excluded.cost_usd
+                """,
+                [(job_id, row["city"], row["indicator"], row["provider"], row["model"],
+                  row["requests"], row["prompt_tokens"], row["completion_tokens"], row["cost_usd"]) for row in rows]
+            )
+            self._conn.commit()
+
+
+    def usage(self, job_id: str) -> Dict[str, Any]:
+        """
+        Requests, tokens and cost of a job across all its runs.
+
+        Returns:
+            Dict with the 'total', and the same totals per city ('cities'), per
+            city and indicator ('indicators', as {city: {indicator: totals}})
+            and per model ('models'). Usage not attributed to a city or
+            indicator only counts in the total and per model.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT city, indicator, model, requests, prompt_tokens, completion_tokens, cost_usd FROM usage WHERE job_id = ?",
+                (job_id,)
+            ).fetchall()
+
+        fields = ("requests", "prompt_tokens", "completion_tokens", "cost_usd")
+        new_totals = lambda: dict.fromkeys(fields, 0.0)
+        usage = {"total": new_totals(), "cities": {}, "indicators": {}, "models": {}}
+        for city, indicator, model, *values in rows:
+            targets = [usage["total"], usage["models"].setdefault(model, new_totals())]
+            if city:
+                targets.append(usage["cities"].setdefault(city, new_totals()))
+                if indicator:
+                    targets.append(usage["indicators"].setdefault(city, {}).setdefault(indicator, new_totals()))
+            for totals in targets:
+                for field, value in zip(fields, values):
+                    totals[field] += value
+        return usage
+
+
+    def results(self, job_id: str) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """Results of the completed tasks, as {city: {indicator: result}}"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT city, indicator, result FROM tasks WHERE job_id = ? AND state = ? ORDER BY city, position",
+                (job_id, DONE)
+            ).fetchall()
+        results: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for city, indicator, result in rows:
+            results.setdefault(city, {})[indicator] = json.loads(result)
+        return results
+
+
+    def progress(self, job_id: str) -> Dict[str, Any]:
+        """Number of tasks per state, plus the last run's error"""
+        with self._lock:
+            rows = self._conn.execute("SELECT state, COUNT(*) FROM tasks WHERE job_id = ? GROUP BY state", (job_id,)).fetchall()
+            error = self._conn.execute("SELECT error FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        counts = dict(rows)
+        return {
+            "total": sum(counts.values()),
+            "done": counts.get(DONE, 0),
+            "pending": counts.get(PENDING, 0) + counts.get(RUNNING, 0),
+            "failed": counts.get(FAILED, 0),
+            "error": error[0] if error else None,
+        }
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_job_store() -> JobStore:
+    """Return the process-wide job store"""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = JobStore()
+        return _default_store
+
+
+###############################
+##### Indicator Jobs ##########
+###############################
+
+INDICATOR_JOB = "indicators"
+
+# Default spend limit of an indicator job in USD, across all its runs; unset for no limit
+JOB_BUDGET_USD = float(os.getenv("JOB_BUDGET_USD", 0)) or None
+
+
+def indicator_job_id(cities: List[str], indicators: List[str], maturity_levels: Optional[List[str]] = None) -> str:
+    """Job id of an indicator job, known before the job is created"""
+    return make_job_id(INDICATOR_JOB, cities=list(cities), indicators=list(indicators), maturity_levels=maturity_levels)
+
+
+def result_to_dict(result) -> Dict[str, Any]:
+    """JSON-serializable form of a search ``IndicatorResult``"""
+    return {
+        "perplexity_output": result.perplexity_output,
+        "citations": result.citations,
+        "indicator_value": result.indicator_value,
+        "maturity_score": result.maturity_score,
+        # Whether any data was found for the pair
+        "covered": result.maturity_score > 0,
+    }
+
+
+def run_indicator_job(
+        cities: List[str],
+        indicators: List[str],
+        maturity_levels: Optional[List[str]] = None,
+        batch_extraction: bool = False,
+        group_size: Optional[int] = None,
+        known_results: Optional[Dict[str, Dict[str, Dict[str, Any]]]] = None,
+        store: Optional[JobStore] = None,
+        on_result: Optional[Callable[[str, str, Dict[str, Any]], None]] = None,
+        budget_usd: Optional[float] = JOB_BUDGET_USD
+) -> str:
+    """
+    Search every (city, indicator) pair, persisting each result as soon as it is extracted.
+
+    Resubmitting a job with the same cities and indicators resumes it: only
+    the tasks without a stored result are searched again.
+
+    The tokens and cost of every request are stored per city and indicator
+    (see ``JobStore.usage``). Once the job has spent ``budget_usd`` over all
+    its runs, no new searches or extractions are started (the calls of the
+    tasks in flight finish, bounding the overshoot by their number);
+    the unsearched tasks stay pending and the job returns with partial
+    results, its error set to the budget message.
+
+    Args:
+        cities (List[str]): Cities to search
+        indicators (List[str]): Indicators to search for every city
+        maturity_levels (List[str], optional): Threshold string per indicator, for local scoring
+        batch_extraction (bool): Extract outputs in batched structured calls
+        group_size (int, optional): Indicators per Perplexity request
+        known_results (Dict, optional): Results already available, as {city: {indicator: result}}, stored instead of searched
+        store (JobStore, optional): Job store, defaults to the process-wide store
+        on_result (Callable, optional): Called with (city, indicator, result) after each stored result
+        budget_usd (float, optional): Spend limit in USD, defaults to JOB_BUDGET_USD; None for no limit
+
+    Returns:
+        str: Job id, to read the results back with ``indicator_job_results``
+    """
+    from search import stream_search_cities
+
+    store = store or get_job_store()
+    indicators = list(indicators)
+    levels_by_indicator = dict(zip(indicators, maturity_levels)) if maturity_levels is not None else {}
+    job_id = store.create_job(INDICATOR_JOB, list(cities), indicators, maturity_levels=maturity_levels)
+
+    for city, city_results in (known_results or {}).items():
+        for indicator, result in city_results.items():
+            store.record_result(job_id, city, indicator, result)
+
+    store.record_error(job_id, None)
+    pending = store.pending_tasks(job_id)
+    if not pending:
+        logger.info(f"run_indicator_job: Job {job_id} already complete")
+        return job_id
+
+    # Every city's missing indicators are searched together in one task graph
+    city_indicators = {}
+    for city, tasks in pending.items():
+        pending_indicators = [indicator for _, indicator in tasks]
+        city_indicators[city] = (pending_indicators, [levels_by_indicator.get(indicator) for indicator in pending_indicators] if maturity_levels is not None else None)
+        store.set_state(job_id, city, pending_indicators, RUNNING)
+    logger.info(f"run_indicator_job: Job {job_id}: {sum(len(tasks) for tasks in pending.values())} tasks to search across {len(pending)} cities")
+
+    meter = UsageMeter(budget_usd, spent_usd=store.usage(job_id)["total"]["cost_usd"])
+    try:
+        with span("job.indicators", job_id=job_id, cities=len(pending), tasks=sum(len(tasks) for tasks in pending.values())), metered(meter):
+            for city, result in stream_search_cities(city_indicators, batch_extraction, group_size):
+                result_dict = result_to_dict(result)
+                store.record_result(job_id, city, result.indicator, result_dict)
+                store.record_usage(job_id, meter.drain())
+                if on_result is not None:
+                    on_result(city, result.indicator, result_dict)
+    except BudgetExhausted as e:
+        logger.warning(f"run_indicator_job: Job {job_id} stopped early: {e}")
+        for city, (pending_indicators, _) in city_indicators.items():
+            store.set_state(job_id, city, pending_indicators, PENDING, error=str(e))
+        store.record_error(job_id, str(e))
+    except Exception as e:
+        logger.error(f"run_indicator_job: Job {job_id} failed: {e}")
+        for city, (pending_indicators, _) in city_indicators.items():
+            store.set_state(job_id, city, pending_indicators, FAILED, error=str(e))
+        store.record_error(job_id, str(e))
+        raise
+    finally:
+        # Requests whose results were not stored (in flight at a failure) were paid for too
+        store.record_usage(job_id, meter.drain())
+
+    return job_id
+
+
+def indicator_job_results(job_id: str, store: Optional[JobStore] = None):
+    """
+    Completed results of an indicator job in the ``search_func`` output layout.
+
+    Returns:
+        Dict mapping each city to (perplexity_outputs, citations, indicator_values, maturity_scores),
+        ordered like the job's indicators; missing tasks are None
+    """
+    store = store or get_job_store()
+    params = store.params(job_id)
+    if params is None:
+        return {}
+    results = store.results(job_id)
+
+    by_city = {}
+    for city in params["cities"]:
+        city_results = [results.get(city, {}).get(indicator) for indicator in params["indicators"]]
+        by_city[city] = tuple(
+            [result[field] if result else None for result in city_results]
+            for field in ("perplexity_output", "citations", "indicator_value", "maturity_score")
+        )
+    return by_city
+
+
+def indicator_job_coverage(job_id: str, store: Optional[JobStore] = None) -> Dict[str, Dict[str, bool]]:
+    """Whether data was found for each completed (city, indicator) pair, as {city: {indicator: covered}}"""
+    store = store or get_job_store()
+    return {
+        city: {indicator: result.get("covered", bool(result["maturity_score"])) for indicator, result in city_results.items()}
+        for city, city_results in store.results(job_id).items()
+    }
+
+
+def indicator_job_usage(job_id: str, store: Optional[JobStore] = None) -> Dict[str, Any]:
+    """
+    Usage of an indicator job (``JobStore.usage``) with its cost per result.
+
+    'cost_per_result' divides the job's cost by its completed tasks and
+    'cost_per_insight' by the tasks that found data; both are None before
+    the first such task.
+    """
+    store = store or get_job_store()
+    usage = store.usage(job_id)
+    coverage = indicator_job_coverage(job_id, store)
+    results = sum(len(city_coverage) for city_coverage in coverage.values())
+    covered = sum(sum(city_coverage.values()) for city_coverage in coverage.values())
+    cost = usage["total"]["cost_usd"]
+    usage["cost_per_result"] = cost / results if results else None
+    usage["cost_per_insight"] = cost / covered if covered else None
+    return usage
+
+
+##########################
+##### Screening ##########
+##########################
+
+def screen_indicators(category: str, cities: List[str], store: Optional[JobStore] = None):
+    """
+    Generate the indicators of ``category`` and search them for every city in one indicator job.
+
+    The job's results are stored per (city, indicator), so any later
+    selection of these indicators for these cities reuses them instead of
+    searching again.
+
+    Returns:
+        Tuple of (job_id, DataFrame) where the DataFrame lists the indicators with data for at least one city,
+        their mean maturity score over those cities and their coverage (number of cities with data)
+    """
+    import pandas as pd
+    from search import fetch_indicators_from_web
+
+    indicator_list, maturity_levels_list = fetch_indicators_from_web(category=category)
+    # Indicators are jobs keys, so only the first of repeated indicators is kept
+    unique_levels = {}
+    for indicator, maturity_levels in zip(indicator_list, maturity_levels_list):
+        unique_levels.setdefault(indicator, maturity_levels)
+    indicator_list, maturity_levels_list = list(unique_levels), list(unique_levels.values())
+
+    job_id = run_indicator_job(cities, indicator_list, maturity_levels_list, batch_extraction=True, store=store)
+
+    results = (store or get_job_store()).results(job_id)
+    rows = []
+    for indicator, maturity_levels in zip(indicator_list, maturity_levels_list):
+        scores = [results[city][indicator]["maturity_score"] for city in cities if indicator in results.get(city, {})]
+        covered = [score for score in scores if score > 0]
+        rows.append({
+            "Indicator": indicator,
+            "Category": category,
+            "Maturity Assessment (1-5)": maturity_levels,
+            "Maturity Score": round(sum(covered) / len(covered), 2) if covered else 0,
+            "Coverage": len(covered),
+        })
+
+    screening_df = pd.DataFrame(rows, columns=["Indicator", "Category", "Maturity Assessment (1-5)", "Maturity Score", "Coverage"])
+    return job_id, screening_df[screening_df["Coverage"] > 0].reset_index(drop=True)
@@ -0,0 +1,171 @@
+####################
+##### Imports ######
+####################
+
+import os
+import queue
+import atexit
+import random
+import logging
+import reprlib
+import threading
+
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Optional, Dict, Any
+
+#############################
+##### Logging Pipeline ######
+#############################
+
+LOG_FILE = os.getenv("LOG_FILE", "app.log")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_CONSOLE = os.getenv("LOG_CONSOLE", "").lower() in ("1", "true")
+# Records waiting for the writer thread; beyond this, new records are dropped rather than blocking the caller
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+# Longest message written, in characters
+LOG_MAX_CHARS = int(os.getenv("LOG_MAX_CHARS", 4000))
+# Longest string or other value in ``log_payload`` output, and the share of calls that log the full payload
+LOG_PAYLOAD_CHARS = int(os.getenv("LOG_PAYLOAD_CHARS", 300))
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", 0.01))
+
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(name)s - %(funcName)s - %(message)s"
+
+_metrics = {"records": 0, "dropped": 0, "truncated": 0, "payloads_sampled": 0}
+_metrics_lock = threading.Lock()
+
+
+def _increment(metric: str):
+    with _metrics_lock:
+        _metrics[metric] += 1
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    """Queue handler that truncates long messages and drops records instead of blocking when the queue is full"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = super().prepare(record)
+        if len(record.msg) > LOG_MAX_CHARS:
+            _increment("truncated")
+            record.msg = f"{record.msg[:LOG_MAX_CHARS]}... [truncated {len(record.msg) - LOG_MAX_CHARS} chars]"
+        return record
+
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+            _increment("records")
+        except queue.Full:
+            _increment("dropped")
+
+
+class _RecordQueueHandler(_NonBlockingQueueHandler):
+    """Queue handler that enqueues records unformatted, for writer-side handlers that serialize ``record.msg`` themselves"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+_listener: Optional[QueueListener] = None
+_configure_lock = threading.Lock()
+
+# Logger name -> handler that writes its records on the writer thread, instead of the log handlers
+_routes: Dict[str, logging.Handler] = {}
+
+
+def _unrouted(record: logging.LogRecord) -> bool:
+    return record.name not in _routes
+
+
+def configure_logging():
+    """
+    Route every log record through a bounded queue to a dedicated writer thread.
+
+    Callers only format the message and enqueue it; file I/O happens on the
+    listener thread, so worker threads never serialize on log writes. Safe
+    to call any number of times: the pipeline is set up once per process
+    and replaces handlers installed by earlier ``basicConfig`` calls.
+    """
+    global _listener
+    with _configure_lock:
+        if _listener is not None:
+            return
+
+        formatter = logging.Formatter(LOG_FORMAT)
+        handlers = [RotatingFileHandler(LOG_FILE, maxBytes=5*1024*1024, backupCount=10)]  # 5MB files
+        if LOG_CONSOLE:
+            handlers.append(logging.StreamHandler())
+        for handler in handlers:
+            handler.setFormatter(formatter)
+            handler.addFilter(_unrouted)
+
+        log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(_NonBlockingQueueHandler(log_queue))
+        root.setLevel(LOG_LEVEL)
+
+        _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        # Flush the records still queued when the process exits
+        atexit.register(_listener.stop)
+
+
+def route_to_writer(name: str, handler: logging.Handler) -> logging.Logger:
+    """
+    Write the records of logger ``name`` with ``handler`` on the logging writer thread.
+
+    The records share the bounded queue of the logging pipeline, so callers
+    never block on the write and records are dropped when the queue is full.
+    They are queued unformatted and skip the log file: ``handler`` formats
+    ``record.msg`` itself. Routing a name again replaces its handler.
+
+    Args:
+        name (str): Logger to route, e.g. 'traces'
+        handler (logging.Handler): Handler run on the writer thread for the records of ``name``
+
+    Returns:
+        logging.Logger: The routed logger, logging at INFO and not propagating to the root logger
+    """
+    configure_logging()
+    with _configure_lock:
+        logger = logging.getLogger(name)
+        handler.addFilter(logging.Filter(name))
+        previous = _routes.get(name)
+        _routes[name] = handler
+        _listener.handlers = tuple(other for other in _listener.handlers if other is not previous) + (handler,)
+        if previous is not None:
+            previous.close()
+        else:
+            logger.addHandler(_RecordQueueHandler(_listener.queue))
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+        return logger
+
+
+# Truncates strings before escaping them, so the cost does not grow with the payload size
+_payload_repr = reprlib.Repr()
+_payload_repr.maxstring = _payload_repr.maxother = LOG_PAYLOAD_CHARS
+_payload_repr.maxlist = _payload_repr.maxtuple = _payload_repr.maxdict = _payload_repr.maxset = 20
+
+
+def log_payload(value: Any) -> str:
+    """
+    Size-bounded repr of an argument or return value for log messages.
+
+    Long strings and containers are abbreviated to about LOG_PAYLOAD_CHARS,
+    except for a LOG_PAYLOAD_SAMPLE_RATE share of calls logged in full.
+    """
+    if LOG_PAYLOAD_SAMPLE_RATE and random.random() < LOG_PAYLOAD_SAMPLE_RATE:
+        _increment("payloads_sampled")
+        return repr(value)
+    text = _payload_repr.repr(value)
+    return text if len(text) <= 2 * LOG_PAYLOAD_CHARS else f"{text[:2 * LOG_PAYLOAD_CHARS]}..."
+
+
+def logging_stats() -> Dict[str, Any]:
+    """Records queued, dropped and truncated since start-up, and the current queue depth"""
+    with _metrics_lock:
+        stats = dict(_metrics)
+    stats["queued"] = _listener.queue.qsize() if _listener is not None else 0
+    return stats
@@ -1,8 +1,20 @@
 import streamlit as st
-import matplotlib.pyplot as plt
 import pandas as pd
-import concurrent.futures
-from search import read_indicators_file, search_func, format_maturity_levels, create_spider_chart, fetch_indicators_from_web, fetch_indicator, check_for_data
+from dotenv import load_dotenv
+from logconfig import configure_logging
+
+# Loaded before the job modules read their settings from the environment
+load_dotenv()
+configure_logging()
+
+from catalogue import get_indicator_catalogue
+from charts import create_spider_chart
+from jobs import indicator_job_results, indicator_job_usage, get_job_store
+from workers import get_job_queue, submit_indicator_job, submit_screening_job, DONE, FAILED
+from tracing import span, start_metrics_server
+
+# Prometheus metrics at :METRICS_PORT/metrics, if configured (started once per process)
+start_metrics_server()
 
 # Streamlit UI
 
@@ -49,6 +61,21 @@ if "top_filtered_df" not in st.session_state:
 if "top_indicators_df" not in st.session_state:
     st.session_state.top_indicators_df = None
 
+if "job_indicators" not in st.session_state:
+    st.session_state.job_indicators = []
+
+if "screening_job" not in st.session_state:
+    st.session_state.screening_job = None
+
+if "screening_results_job" not in st.session_state:
+    st.session_state.screening_results_job = None
+
+if "indicator_job" not in st.session_state:
+    st.session_state.indicator_job = None
+
+# Seconds between two status checks of a running background job
+JOB_POLL_SECONDS = 2
+
 
 # Function to add a new city input field
 def add_city_input():
@@ -62,6 +89,67 @@ def remove_city_input():
     if len(st.session_state.city_inputs) > 1:
         st.session_state.city_inputs.pop()
 
+def load_job_outputs(job_id):
+    """Rebuild the combined outputs and radar data from the stored results of an indicator job"""
+    params = get_job_store().params(job_id)
+    if params is None:
+        return False
+
+    st.session_state.combined_outputs = ""
+    st.session_state.radar_data = {}
+    st.session_state.job_indicators = params["indicators"]
+
+    with span("markdown.assemble", job_id=job_id, indicators=len(params["indicators"])):
+        for position, (city, (perplexity_results, citations, indicator_values, maturity_scores)) in enumerate(indicator_job_results(job_id).items()):
+            if position > 0:
+                st.session_state.combined_outputs += "\n\n---\n\n"
+            st.session_state.combined_outputs += f"# {city}: \n\n"
+            for j, indicator in enumerate(params["indicators"]):
+                st.session_state.combined_outputs += f"## {indicator}: \n\n ### Maturity Score: {maturity_scores[j]} \n\n ### Output Text: \n\n {perplexity_results[j]}\n\n\n\n"
+            st.session_state.radar_data[city] = [score or 0 for score in maturity_scores]
+    return True
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def poll_screening_job():
+    """Wait for the screening job without blocking the page, then show its indicators"""
+    job_id = st.session_state.screening_job
+    status = get_job_queue().status(job_id)
+    if status is None or status["state"] not in (DONE, FAILED):
+        st.info(f"Generating the Indicator List ({status['state'] if status else 'queued'}, {status['running_seconds'] if status else 0:.0f}s)")
+        return
+
+    st.session_state.screening_job = None
+    if status["state"] == FAILED:
+        st.error(f"Generating the Indicator List failed: {status['error']}")
+        return
+    st.session_state.screening_results_job, st.session_state.top_filtered_df = get_job_queue().result(job_id)
+    num_cities = len(st.session_state.city_list)
+    st.session_state.total_indicators = "\n\n".join([f"{row['Indicator']} (data for {row['Coverage']}/{num_cities} cities)" for _, row in st.session_state.top_filtered_df.iterrows()])
+    st.rerun()
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def poll_indicator_job():
+    """Show the results of the running indicator job as they arrive, then rerun the page once it finishes"""
+    job_id = st.session_state.indicator_job
+    status = get_job_queue().status(job_id)
+    progress = get_job_store().progress(job_id)
+    load_job_outputs(job_id)
+
+    if status is None or status["state"] not in (DONE, FAILED):
+        cost = get_job_store().usage(job_id)["total"]["cost_usd"]
+        st.progress(progress["done"] / max(progress["total"], 1), 
+                    text=f"Generating Indicator data for city/cities: {', '.join(st.session_state.city_list)} ({progress['done']}/{progress['total']} done, ${cost:.2f} spent)")
+        st.markdown(st.session_state.combined_outputs)
+        return
+
+    st.session_state.indicator_job = None
+    if status["state"] == FAILED:
+        st.session_state.indicator_job_error = status["error"]
+    elif progress["error"]:
+        # The job stopped early without failing, e.g. when its budget was spent
+        st.session_state.indicator_job_error = progress["error"]
+    st.rerun()
+
 def remove_duplicates(input_list):
     unique_items = []
     for item in input_list:
@@ -112,7 +200,7 @@ st.subheader("Generate the list of Indicators")
 with st.expander("Click to expand and view the details of this section"):
     st.markdown(""" 
     **Purpose**:  
-    This section allows users to choose a category and generate indicators for that category using gpt-4o model. This sections generates upto 20 indicators for the category and lists those indicators that have data for the first city.
+    This section allows users to choose a category and generate indicators for that category using gpt-4o model. This sections generates upto 20 indicators for the category, searches them for all the entered cities at once and lists those indicators that have data for at least one city.
                 
     **How to Use**:  
     - Choose a category from the dropdown.
@@ -121,7 +209,7 @@ with st.expander("Click to expand and view the details of this section"):
     """)
 
 # Get the list of indicators and their categories
-combined_df = read_indicators_file()
+catalogue = get_indicator_catalogue()
 
 # Initialize a placeholder for dynamic input box
 input_placeholder = st.empty()
@@ -136,7 +224,7 @@ custom_category_select = st.checkbox("Type custom category")
 if custom_category_select:
     selected_category = input_placeholder.text_input("Category (type the custom category):")
 else:
-    selected_category = input_placeholder.selectbox("Category (select the category from dropdown):", combined_df["Category"].unique(), index=None)
+    selected_category = input_placeholder.selectbox("Category (select the category from dropdown):", catalogue.categories, index=None)
 
 
 # with col_indicators_2:
@@ -155,19 +243,14 @@ indicator_button_clicked = st.button("Get Indicators")
 
 
 # Fetch indicators based on the selected/typed category
-if selected_category and indicator_button_clicked:
+if selected_category and indicator_button_clicked and not st.session_state.city_list:
+    st.warning("Please enter at least one city.")
+elif selected_category and indicator_button_clicked:
     st.session_state.indicator_bool = True
-    with st.spinner("Generating the Indicator List"):
-        indicator_list, maturity_levels_list = fetch_indicators_from_web(category=selected_category)
-        filtered_df = pd.DataFrame({
-            'Indicator': indicator_list,
-            'Category': [selected_category] * len(indicator_list),
-            'Maturity Assessment (1-5)': maturity_levels_list
-        })
-
-        top_filtered_df = check_for_data(filtered_df, st.session_state.city_list[0])
-        st.session_state.top_filtered_df = top_filtered_df
-        st.session_state.total_indicators = "\n\n".join([indicator for indicator in st.session_state.top_filtered_df["Indicator"]])
+    st.session_state.screening_job = submit_screening_job(category=selected_category, cities=st.session_state.city_list)
+
+if st.session_state.screening_job:
+    poll_screening_job()
 
 if st.session_state.total_indicators:
     st.subheader("Indicators:")
@@ -228,51 +311,50 @@ if st.session_state.top_filtered_df is not None and isinstance(st.session_state.
     st.session_state.top_indicators_df = top_indicators_df
 
 
+# Restore the last comparison after a browser refresh, its results are kept in the job store
+if not st.session_state.combined_outputs and "job" in st.query_params:
+    load_job_outputs(st.query_params["job"])
+    restored_status = get_job_queue().status(st.query_params["job"])
+    if restored_status and restored_status["state"] not in (DONE, FAILED):
+        st.session_state.indicator_job = st.query_params["job"]
+
 if st.button("Generate Data"): 
     if st.session_state.city_list and selected_category and st.session_state.indicator_bool:
-        with st.spinner(f"Generating Indicator data for city/cities: {', '.join(st.session_state.city_list)}, please wait..."):
-            st.session_state.combined_outputs = ""
-            st.session_state.radar_data = {}
-
-            st.session_state.combined_outputs += f"# {st.session_state.city_list[0]}: \n\n"
-            
-            for index, row in st.session_state.top_indicators_df.iterrows():
-                st.session_state.combined_outputs += f"""## {row["Indicator"]}: \n\n ### Maturity Score: {row["Maturity Score"]} \n\n ### Output Text: \n\n {row["Perplexity Output"]}\n\n\n\n"""
-
-            # for j, indicator in enumerate(st.session_state.final_indicator_list):
-            #     st.session_state.combined_outputs += f"## {indicator}: \n\n ### Maturity Score: {st.session_state.city0_maturity_scores[j]} \n\n ### Output Text: \n\n {st.session_state.city0_outputs[j]}\n\n\n\n"
-
-            st.session_state.radar_data[st.session_state.city_list[0]] = list(st.session_state.top_indicators_df["Maturity Score"])
-
-            if len(st.session_state.city_list) > 1:
-                with concurrent.futures.ThreadPoolExecutor() as executor:
-                    # Parallelize over cities
-                    futures = [executor.submit(search_func, city=city, indicators=list(st.session_state.top_indicators_df["Indicator"])) for city in st.session_state.city_list[1:]]
-                    results = [f.result() for f in futures]
-
-                # Process results for each city
-                
-                for i, city in enumerate(st.session_state.city_list[1:]):
-                    perplexity_results, citations, indicator_values, maturity_scores = results[i]
-                    st.session_state.combined_outputs += f"\n\n---\n\n # {city}: \n\n"
-                    for j, indicator in enumerate(list(st.session_state.top_indicators_df["Indicator"])):
-                        st.session_state.combined_outputs += f"## {indicator}: \n\n ### Maturity Score: {maturity_scores[j]} \n\n ### Output Text: \n\n {perplexity_results[j]}\n\n\n\n"
-
-                    st.session_state.radar_data[city] = maturity_scores
-
-        
-            # combined_results += "\n\n---\n\n"
-
-            # Render the Markdown content
-        #     st.markdown(combined_results)
-        # st.success("Successfully generated the Data for the Indicators for each City!")
+        indicators = list(st.session_state.top_indicators_df["Indicator"])
+
+        # Every (city, indicator) pair searched during screening is reused, only pairs of newly added cities are searched
+        screening_results = get_job_store().results(st.session_state.screening_results_job) if st.session_state.screening_results_job else {}
+        known_results = {
+            city: {indicator: result for indicator, result in city_results.items() if indicator in indicators}
+            for city, city_results in screening_results.items() if city in st.session_state.city_list
+        }
+
+        # Every result is persisted as it completes, so clicking again after a failure or crash
+        # only searches the (city, indicator) pairs that are still missing
+        st.session_state.indicator_job_error = None
+        st.session_state.indicator_job = submit_indicator_job(cities=st.session_state.city_list, 
+                                                              indicators=indicators, 
+                                                              maturity_levels=list(st.session_state.top_indicators_df["Maturity Assessment (1-5)"]),
+                                                              known_results=known_results)
+        st.query_params["job"] = st.session_state.indicator_job
     else:
         st.warning("Please enter at least one city, select a category and generate the indicators.")
 
+if st.session_state.indicator_job:
+    poll_indicator_job()
+elif st.session_state.get("indicator_job_error"):
+    st.error(f"Generating the data stopped early ({st.session_state.indicator_job_error}). Completed results are saved; click Generate Data again to resume.")
+
 # Show the list of final indicators
-if st.session_state.combined_outputs:
+if st.session_state.combined_outputs and not st.session_state.indicator_job:
     st.markdown(st.session_state.combined_outputs)
-    st.success("Successfully generated the Data for the Indicators for each City!")
+    if not st.session_state.get("indicator_job_error"):
+        st.success("Successfully generated the Data for the Indicators for each City!")
+    if "job" in st.query_params:
+        job_usage = indicator_job_usage(st.query_params["job"])
+        cost_per_insight = job_usage["cost_per_insight"]
+        st.caption(f"API cost: ${job_usage['total']['cost_usd']:.2f} for {job_usage['total']['prompt_tokens'] + job_usage['total']['completion_tokens']:,.0f} tokens"
+                   + (f", ${cost_per_insight:.3f} per indicator with data" if cost_per_insight is not None else ""))
 
 
 # Horizontal line
@@ -293,7 +375,7 @@ if st.button("Radar Graph"):
     if st.session_state.radar_data:
         # Create a spider chart for the indicators
         create_spider_chart(
-            indicators=list(st.session_state.top_indicators_df["Indicator"]),
+            indicators=st.session_state.job_indicators,
             values_dict=st.session_state.radar_data,
             title=f"Comparative Radar Chart for {selected_category} for cities: {', '.join(st.session_state.city_list)}",
         )
@@ -226,6 +226,30 @@ Ensure that the response is specific to the city and country provided, referenci
 """
 
 
+report_search_system_prompt = """ 
+You are a research assistant gathering evidence for a literature review on jobs and growth in {city}, {country}.
+Answer the search query with concise, factual findings from academic literature, policy documents, official statistics and reputable news sources.
+- Prefer recent, city-specific evidence; use regional or national evidence only where city data is unavailable and say so.
+- Include figures, dates and named sources wherever possible.
+- Cite every finding with numbered references such as [1], [2].
+"""
+
+section_synthesis_prompt = """ 
+You are writing the section **{section_number} {section_title}** of a literature review on jobs and growth in **{city}**, **{country}**, structured around the "People, Production, Places" framework.
+
+{section_topics}
+Write the section using only the research findings below. 
+- Synthesize the findings into a coherent narrative instead of listing them query by query.
+- Highlight constraints, opportunities and policy implications specific to {city}.
+- Cite sources inline as markdown links using the URLs listed with each finding.
+- Point out where the evidence is thin or missing.
+- Do not repeat the section heading.
+
+**Research Findings:**
+{findings}
+"""
+
+
 ### Variables
 # city = "Sadat City"
 # country = "Egypt"
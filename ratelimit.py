@@ -0,0 +1,364 @@
+####################
+##### Imports ######
+####################
+
+import os
+import time
+import asyncio
+import logging
+import threading
+
+from contextlib import contextmanager, asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import Optional, Dict, Any
+
+from tracing import record
+
+logger = logging.getLogger(__name__)
+
+##########################
+##### Token Bucket #######
+##########################
+
+class TokenBucket:
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        """
+        Token bucket refilled continuously at ``rate_per_minute``.
+
+        Reservations may drive the balance negative; the caller is told how
+        long to wait until its reservation is covered, which keeps waiting
+        callers in FIFO order without holding a lock while sleeping.
+
+        Args:
+            rate_per_minute (float): Tokens added per minute
+            capacity (float, optional): Maximum burst size, defaults to one minute of tokens
+        """
+        self.rate = rate_per_minute / 60
+        self.capacity = capacity or rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+
+    def reserve(self, amount: float = 1) -> float:
+        """Reserve ``amount`` tokens and return the number of seconds to wait before using them"""
+        amount = min(amount, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+##################################
+##### Adaptive Concurrency #######
+##################################
+
+def _wake(waiter: asyncio.Future):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class AdaptiveConcurrency:
+    def __init__(
+            self,
+            initial: int = 8,
+            minimum: int = 1,
+            maximum: int = 32,
+            latency_tolerance: float = 2.0
+    ):
+        """
+        AIMD concurrency limit driven by rate-limit and latency signals.
+
+        The limit grows by roughly one slot per window of successful calls and
+        is halved on every rate-limit response. Calls slower than
+        ``latency_tolerance`` times the observed baseline latency shrink the
+        limit gently, so the limit backs off before the provider starts
+        rejecting requests.
+
+        Args:
+            initial (int): Starting concurrency limit
+            minimum (int): Lower bound of the limit
+            maximum (int): Upper bound of the limit
+            latency_tolerance (float): Latency multiple of the baseline treated as congestion
+        """
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_tolerance = latency_tolerance
+        self.baseline_latency = None
+        self.in_flight = 0
+        self._cond = threading.Condition()
+        # (loop, future) of coroutines waiting in ``enter_async``, woken with the threads waiting on ``_cond``
+        self._async_waiters = []
+
+
+    def enter(self):
+        """Block until a slot is free and take it"""
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+
+    async def enter_async(self):
+        """Wait without blocking the event loop until a slot is free, and take it"""
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._cond:
+                if self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    return
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+            try:
+                await waiter
+            finally:
+                with self._cond:
+                    if (loop, waiter) in self._async_waiters:
+                        self._async_waiters.remove((loop, waiter))
+
+
+    def _notify_all(self):
+        """Wake every waiting thread and coroutine to re-check the limit; called with ``_cond`` held"""
+        self._cond.notify_all()
+        for loop, waiter in self._async_waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, waiter)
+            except RuntimeError:
+                # The waiter's event loop is closed
+                pass
+        self._async_waiters.clear()
+
+
+    def exit(self):
+        """Release a slot"""
+        with self._cond:
+            self.in_flight -= 1
+            self._notify_all()
+
+
+    def on_success(self, latency: float):
+        """Additive increase, or a gentle decrease if the call was abnormally slow"""
+        with self._cond:
+            if self.baseline_latency is None:
+                self.baseline_latency = latency
+            else:
+                # Track the fast end of the latency distribution
+                weight = 0.3 if latency < self.baseline_latency else 0.02
+                self.baseline_latency += weight * (latency - self.baseline_latency)
+
+            if latency > self.latency_tolerance * self.baseline_latency:
+                self.limit = max(self.minimum, self.limit * 0.9)
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._notify_all()
+
+
+    def on_rate_limited(self):
+        """Multiplicative decrease"""
+        with self._cond:
+            self.limit = max(self.minimum, self.limit / 2)
+
+
+##########################
+##### Rate Limiter #######
+##########################
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Check whether an exception represents an HTTP 429 response"""
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        status_code = getattr(getattr(error, "response", None), "status_code", None)
+    return status_code == 429
+
+
+def parse_retry_after(headers) -> Optional[float]:
+    """Parse a ``Retry-After`` header (seconds or HTTP date) into seconds"""
+    if not headers:
+        return None
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_after_from_error(error: Exception) -> Optional[float]:
+    """Extract the ``Retry-After`` delay from a rate-limit exception, if present"""
+    retry_after = getattr(error, "retry_after", None)
+    if retry_after is not None:
+        return retry_after
+    return parse_retry_after(getattr(getattr(error, "response", None), "headers", None))
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate of a prompt (about four characters per token)"""
+    return len(text) // 4 + 1
+
+
+class RateLimiter:
+    def __init__(
+            self,
+            name: str,
+            requests_per_minute: float,
+            tokens_per_minute: Optional[float] = None,
+            initial_concurrency: int = 8,
+            max_concurrency: int = 32,
+            default_retry_after: float = 5
+    ):
+        """
+        Process-wide rate limiter for one API provider.
+
+        Every call first reserves capacity in the requests/min and tokens/min
+        buckets, then waits out any ``Retry-After`` pause, then takes a slot
+        from the adaptive concurrency limit.
+
+        Args:
+            name (str): Provider name, used in logs and metrics
+            requests_per_minute (float): Request budget per minute
+            tokens_per_minute (float, optional): Token budget per minute, None disables it
+            initial_concurrency (int): Starting adaptive concurrency limit
+            max_concurrency (int): Upper bound of the adaptive concurrency limit
+            default_retry_after (float): Pause in seconds after a 429 without a Retry-After header
+        """
+        self.name = name
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.concurrency = AdaptiveConcurrency(initial=initial_concurrency, maximum=max_concurrency)
+        self.default_retry_after = default_retry_after
+
+        self.blocked_until = 0.0
+        self.requests = 0
+        self.rate_limited = 0
+        self.throttled_seconds = 0.0
+        self._lock = threading.Lock()
+
+
+    def _reserve(self, tokens: int) -> float:
+        """Reserve bucket capacity and return the delay before the call may start"""
+        delay = self.request_bucket.reserve(1)
+        if self.token_bucket and tokens:
+            delay = max(delay, self.token_bucket.reserve(tokens))
+        with self._lock:
+            delay = max(delay, self.blocked_until - time.monotonic())
+            self.requests += 1
+            if delay > 0:
+                self.throttled_seconds += delay
+        return delay
+
+
+    def record_success(self, latency: float):
+        """Feed a successful call's latency into the concurrency limit"""
+        self.concurrency.on_success(latency)
+
+
+    def record_rate_limited(self, retry_after: Optional[float] = None):
+        """Pause all callers for ``retry_after`` seconds and halve the concurrency limit"""
+        pause = retry_after if retry_after is not None else self.default_retry_after
+        with self._lock:
+            self.rate_limited += 1
+            self.blocked_until = max(self.blocked_until, time.monotonic() + pause)
+        self.concurrency.on_rate_limited()
+        logger.warning(f"{self.name}: Rate limited, pausing for {pause:.1f}s, concurrency limit now {int(self.concurrency.limit)}")
+
+
+    def _record_outcome(self, error: Optional[Exception], latency: float):
+        if error is None:
+            self.record_success(latency)
+        elif is_rate_limit_error(error):
+            self.record_rate_limited(retry_after_from_error(error))
+
+
+    @contextmanager
+    def acquire(self, tokens: int = 0):
+        """Block until the call is allowed, then time it and record its outcome"""
+        waited = time.monotonic()
+        delay = self._reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+        self.concurrency.enter()
+        record("queue_wait_seconds", time.monotonic() - waited)
+
+        start = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            self._record_outcome(e, time.monotonic() - start)
+            raise
+        else:
+            self._record_outcome(None, time.monotonic() - start)
+        finally:
+            self.concurrency.exit()
+
+
+    @asynccontextmanager
+    async def acquire_async(self, tokens: int = 0):
+        """Async variant of ``acquire`` that never blocks the event loop"""
+        waited = time.monotonic()
+        delay = self._reserve(tokens)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await self.concurrency.enter_async()
+        record("queue_wait_seconds", time.monotonic() - waited)
+
+        start = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            self._record_outcome(e, time.monotonic() - start)
+            raise
+        else:
+            self._record_outcome(None, time.monotonic() - start)
+        finally:
+            self.concurrency.exit()
+
+
+    def stats(self) -> Dict[str, Any]:
+        """Return request, throttling and concurrency counters"""
+        return {
+            "requests": self.requests,
+            "rate_limited": self.rate_limited,
+            "throttled_seconds": round(self.throttled_seconds, 3),
+            "concurrency_limit": int(self.concurrency.limit),
+            "in_flight": self.concurrency.in_flight,
+        }
+
+
+##########################
+##### Registry ###########
+##########################
+
+def _env_float(name: str, default: Optional[float]) -> Optional[float]:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+RATE_LIMITS = {
+    "perplexity": {
+        "requests_per_minute": _env_float("PERPLEXITY_RPM", 50),
+        "tokens_per_minute": _env_float("PERPLEXITY_TPM", None),
+    },
+    "openai": {
+        "requests_per_minute": _env_float("OPENAI_RPM", 500),
+        "tokens_per_minute": _env_float("OPENAI_TPM", None),
+    },
+}
+
+_rate_limiters: Dict[str, RateLimiter] = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(provider: str) -> RateLimiter:
+    """Return the process-wide rate limiter of ``provider`` ('perplexity' or 'openai')"""
+    with _rate_limiters_lock:
+        if provider not in _rate_limiters:
+            _rate_limiters[provider] = RateLimiter(provider, **RATE_LIMITS[provider])
+        return _rate_limiters[provider]
@@ -0,0 +1,243 @@
+####################
+##### Imports ######
+####################
+
+import os
+import re
+import asyncio
+import logging
+
+from typing import Optional, List, Dict, Tuple, Callable, AsyncIterator
+
+from langchain_core.messages import SystemMessage
+
+from prompts import report_search_system_prompt, section_synthesis_prompt
+from clients import get_chat_model
+from dedup import deduplicate_queries
+from search import async_perplexity_search_func, ainvoke_llm, iterate_async, _get_async_semaphore
+
+logger = logging.getLogger(__name__)
+
+###########################
+##### ToC Parsing #########
+###########################
+
+# "4. Places Analysis", "**4.1. Urban Infrastructure**", "### 4.1 Urban Infrastructure"
+SECTION_PATTERN = re.compile(r"^\s*(#{1,6}\s*)?(\*\*)?\s*(\d+(?:\.\d+)*)\.?\s+(?:\*\*)?\s*(.+?)\s*$")
+# '- "Housing affordability impact on labor mobility in Cairo"'
+QUOTED_QUERY_PATTERN = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s*[\"“](.+?)[\"”]\s*$")
+# "10. **Synthesis**": an un-indented number with a bold title is always a section, even right after a query block
+TOP_SECTION_PATTERN = re.compile(r"^\d+(?:\.\d+)*\.?\s+\*\*")
+BULLET_PATTERN = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s+(.+?)\s*$")
+QUERY_BLOCK_PATTERN = re.compile(r"quer(?:y|ies)\**\s*:?\**\s*$", re.IGNORECASE)
+
+
+class Section:
+    def __init__(self, number: str, title: str):
+        """
+        One numbered section of the table of contents.
+
+        Args:
+            number (str): Section number such as '4.1'
+            title (str): Section title without markup
+        """
+        self.number = number
+        self.title = title
+        self.queries: List[str] = []
+        self.topics: List[str] = []
+        self.children: List["Section"] = []
+
+
+    @property
+    def depth(self) -> int:
+        return self.number.count(".") + 1
+
+
+    def walk(self):
+        """This section followed by all its descendants, in document order"""
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+
+def _clean(text: str) -> str:
+    return text.strip().strip("*#:").strip()
+
+
+def parse_toc(toc: str) -> List[Section]:
+    """
+    Parse the table of contents generated from ``ppp_framework_prompt`` into a section tree.
+
+    Numbered headings become sections, nested under the closest preceding
+    section whose number is a prefix of theirs. Quoted bullets, and any
+    bullet following an 'Example Queries:' line, are search queries of the
+    current section; other bullets are its topics.
+
+    Returns:
+        List[Section]: Top-level sections in document order
+    """
+    roots: List[Section] = []
+    stack: List[Section] = []
+    current: Optional[Section] = None
+    in_queries = False
+
+    for line in toc.splitlines():
+        if not line.strip():
+            continue
+
+        quoted = QUOTED_QUERY_PATTERN.match(line)
+        if quoted and current is not None:
+            current.queries.append(quoted.group(1).strip())
+            continue
+
+        heading = SECTION_PATTERN.match(line)
+        # Inside a query block a plain '1. text' line is a query, not a section
+        if heading and (heading.group(1) or heading.group(2) or "." in heading.group(3) or not in_queries or TOP_SECTION_PATTERN.match(line)):
+            title = _clean(heading.group(4))
+            if title and not title.startswith(("\"", "“")):
+                section = Section(heading.group(3), title)
+                while stack and not section.number.startswith(stack[-1].number + "."):
+                    stack.pop()
+                (stack[-1].children if stack else roots).append(section)
+                stack.append(section)
+                current, in_queries = section, False
+                continue
+
+        if QUERY_BLOCK_PATTERN.search(line):
+            in_queries = True
+            continue
+
+        bullet = BULLET_PATTERN.match(line)
+        if bullet and current is not None:
+            text = _clean(bullet.group(1)).strip("\"“”")
+            (current.queries if in_queries else current.topics).append(text)
+
+    return roots
+
+
+def flatten(sections: List[Section]) -> List[Section]:
+    """Every section of the tree in document order"""
+    return [section for root in sections for section in root.walk()]
+
+
+###########################
+##### Report Engine #######
+###########################
+
+# Searches and section syntheses of one report in flight at once (on top of the global engine limit)
+REPORT_SEARCH_CONCURRENCY = int(os.getenv("REPORT_SEARCH_CONCURRENCY", 8))
+REPORT_SYNTHESIS_CONCURRENCY = int(os.getenv("REPORT_SYNTHESIS_CONCURRENCY", 4))
+
+
+def _section_queries(section: Section, city: str, country: str) -> List[str]:
+    """Queries of a section; a leaf without queries is searched by its title"""
+    if section.queries:
+        return section.queries
+    if not section.children:
+        return [f"{section.title} in {city}, {country}"]
+    return []
+
+
+def _format_findings(results: List[Tuple[str, object]]) -> str:
+    findings = []
+    for position, (query, result) in enumerate(results, start=1):
+        if isinstance(result, Exception):
+            findings.append(f"### Finding {position}: {query}\nNo results (search failed).")
+            continue
+        output, citations = result
+        sources = "\n".join(f"[{index}] {url}" for index, url in enumerate(citations or [], start=1))
+        findings.append(f"### Finding {position}: {query}\n{output}\n\nSources:\n{sources}")
+    return "\n\n".join(findings)
+
+
+async def async_generate_report_sections(sections: List[Section], city: str, country: str) -> AsyncIterator[Tuple[int, str]]:
+    """
+    Search and synthesize every section of ``sections`` (flattened), yielding (position, text) as each section is written.
+
+    All queries of the report are deduplicated up front, so identical and
+    near-identical queries across sections share one search, and the
+    remaining searches run concurrently. Each section is synthesized as soon
+    as its own searches are done, so synthesis overlaps with the searches of
+    other sections.
+    """
+    city_country = dict(city=city, country=country)
+    search_limit = asyncio.Semaphore(REPORT_SEARCH_CONCURRENCY)
+    synthesis_limit = asyncio.Semaphore(REPORT_SYNTHESIS_CONCURRENCY)
+
+    section_queries = [_section_queries(section, city, country) for section in sections]
+    all_queries = [query for queries in section_queries for query in queries]
+    deduplication = deduplicate_queries(all_queries)
+    cluster_of = dict(zip(all_queries, deduplication.assignment))
+    searches: Dict[int, asyncio.Task] = {}
+
+    async def _search(query: str):
+        async with search_limit, _get_async_semaphore():
+            return await async_perplexity_search_func(report_search_system_prompt.format(**city_country), query)
+
+    def _search_task(cluster: int) -> asyncio.Task:
+        if cluster not in searches:
+            searches[cluster] = asyncio.ensure_future(_search(deduplication.unique[cluster]))
+        return searches[cluster]
+
+    async def _synthesize(position: int, section: Section, queries: List[str]) -> Tuple[int, str]:
+        clusters = list(dict.fromkeys(cluster_of[query] for query in queries))
+        results = await asyncio.gather(*[_search_task(cluster) for cluster in clusters], return_exceptions=True)
+        prompt = section_synthesis_prompt.format(
+            section_number=section.number,
+            section_title=section.title,
+            section_topics=f"The section should cover: {', '.join(section.topics)}.\n" if section.topics else "",
+            findings=_format_findings(list(zip([deduplication.unique[cluster] for cluster in clusters], results))),
+            **city_country
+        )
+        async with synthesis_limit, _get_async_semaphore():
+            response = await ainvoke_llm(get_chat_model(), [SystemMessage(content=prompt)])
+        return position, response.content
+
+    section_tasks = [
+        asyncio.ensure_future(_synthesize(position, section, queries))
+        for position, (section, queries) in enumerate(zip(sections, section_queries)) if queries
+    ]
+    logger.info(f"async_generate_report_sections: {len(section_tasks)} sections, {len(all_queries)} queries, {len(deduplication.unique)} searches")
+
+    try:
+        for next_section in asyncio.as_completed(section_tasks):
+            yield await next_section
+    finally:
+        for task in section_tasks + list(searches.values()):
+            task.cancel()
+
+
+def assemble_report(sections: List[Section], bodies: Dict[int, str]) -> str:
+    """Markdown document of the sections in order, with the bodies written so far"""
+    parts = []
+    for position, section in enumerate(sections):
+        parts.append(f"{'#' * min(section.depth + 1, 6)} {section.number}. {section.title}")
+        if position in bodies:
+            parts.append(bodies[position].strip())
+    return "\n\n".join(parts)
+
+
+def generate_report(toc: str, city: str, country: str, on_progress: Optional[Callable[[str], None]] = None) -> str:
+    """
+    Write the full report for a generated table of contents.
+
+    Args:
+        toc (str): Table of contents from ``generate_document_contents``
+        city (str): City of the report
+        country (str): Country of the city
+        on_progress (Callable, optional): Called with the partially assembled report after each section
+
+    Returns:
+        str: Markdown report with the sections in table of contents order
+    """
+    sections = flatten(parse_toc(toc))
+    if not sections:
+        raise ValueError("generate_report: No numbered sections found in the table of contents")
+
+    bodies: Dict[int, str] = {}
+    for position, text in iterate_async(async_generate_report_sections(sections, city, country)):
+        bodies[position] = text
+        if on_progress is not None:
+            on_progress(assemble_report(sections, bodies))
+
+    return assemble_report(sections, bodies)
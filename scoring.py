@@ -0,0 +1,206 @@
+####################
+##### Imports ######
+####################
+
+import re
+import math
+import numpy as np
+
+from functools import lru_cache
+from typing import Optional, List, Sequence, NamedTuple
+
+######################################
+##### Maturity Threshold Parsing #####
+######################################
+
+# Splits "1: <10, 2: 10-25, ..." or "Level 1: <10  Level 2: 10-25 ..." into (level, text) pairs
+LEVEL_PATTERN = re.compile(
+    r"(?:level\s*)?([0-5])\s*[:=]\s*(.*?)(?=[,;\n]?\s*(?:level\s*)?[0-5]\s*[:=]|$)",
+    re.IGNORECASE | re.DOTALL
+)
+NUMBER_PATTERN = re.compile(r"\d+(?:,\d{3})*(?:\.\d+)?|\.\d+")
+# Two numbers joined into a range: '10-25', '10% to 25%', 'between 10 and 25'
+RANGE_PATTERN = re.compile(
+    rf"({NUMBER_PATTERN.pattern})\s*%?\s*(?:-|–|—|to|and)\s*({NUMBER_PATTERN.pattern})",
+    re.IGNORECASE
+)
+# Unit text whose numbers are not thresholds: 'per 100,000 inhabitants', '(per 1000 people)'
+UNIT_PATTERN = re.compile(rf"\([^()]*\)|\bper\s+(?:{NUMBER_PATTERN.pattern})", re.IGNORECASE)
+LESS_PATTERN = re.compile(r"<|≤|less than|fewer than|below|under|up to|at most", re.IGNORECASE)
+MORE_PATTERN = re.compile(r">|≥|\+|more than|greater than|above|over|at least", re.IGNORECASE)
+INCLUSIVE_PATTERN = re.compile(r"<=|>=|≤|≥|\+|up to|at most|at least", re.IGNORECASE)
+
+
+class Band(NamedTuple):
+    """Numeric interval of one maturity level; ``low``/``high`` are None for ordinal labels such as 'Daily'"""
+    level: int
+    low: Optional[float]
+    high: Optional[float]
+    low_inclusive: bool
+    high_inclusive: bool
+    label: str
+
+
+def _parse_band(level: int, text: str) -> Band:
+    """Parse the threshold text of one level into a Band, reading a range or the first number after removing unit text"""
+    label = text.strip().rstrip(",;. ")
+    thresholds = UNIT_PATTERN.sub(" ", label)
+    if not NUMBER_PATTERN.search(thresholds):
+        # The thresholds themselves are in parentheses, e.g. 'Low (10-25%)'
+        thresholds = label
+    inclusive = bool(INCLUSIVE_PATTERN.search(thresholds))
+
+    in_range = RANGE_PATTERN.search(thresholds)
+    if in_range:
+        low, high = sorted(float(number.replace(",", "")) for number in in_range.groups())
+        return Band(level, low, high, True, True, label)
+    first = NUMBER_PATTERN.search(thresholds)
+    if first is None:
+        return Band(level, None, None, True, True, label)
+    number = float(first.group().replace(",", ""))
+    if LESS_PATTERN.search(thresholds):
+        return Band(level, -math.inf, number, False, inclusive, label)
+    if MORE_PATTERN.search(thresholds):
+        return Band(level, number, math.inf, inclusive, False, label)
+    return Band(level, number, number, True, True, label)
+
+
+class MaturityBands:
+    def __init__(self, bands: List[Band]):
+        """
+        Compiled interval table of a maturity scale.
+
+        Bands are ordered by value and separated by cut points. Gaps between
+        bands (e.g. 25 and 26 in '10-25, 26-40') are split at their midpoint,
+        and a value equal to a cut point belongs to whichever neighbouring
+        band includes that boundary.
+
+        Args:
+            bands (List[Band]): Parsed bands, at least two of them numeric
+
+        Raises:
+            ValueError: If the scale cannot be scored numerically, e.g. an ordinal
+                level next to an open-ended or another ordinal level
+        """
+        numeric = sorted((band for band in bands if band.low is not None), key=lambda band: band.level)
+        if len(numeric) < 2:
+            raise ValueError("MaturityBands: At least two numeric levels are required")
+
+        # Higher levels may correspond to higher (e.g. coverage) or lower (e.g. emissions) values
+        self.ascending = self._midpoint(numeric[0]) <= self._midpoint(numeric[-1])
+
+        # Ordinal labels at either end of the scale ('5: Daily') extend beyond the neighbouring numeric band,
+        # processed outwards so that a second ordinal label meets the open band of the first and is rejected
+        ordinal = [band for band in bands if band.low is None]
+        for band in sorted((band for band in ordinal if band.level > numeric[-1].level), key=lambda band: band.level):
+            numeric.append(self._beyond(band, numeric[-1], upward=self.ascending))
+        for band in sorted((band for band in ordinal if band.level < numeric[0].level), key=lambda band: -band.level):
+            numeric.insert(0, self._beyond(band, numeric[0], upward=not self.ascending))
+        if len(numeric) != len(bands):
+            raise ValueError("MaturityBands: Ordinal levels between numeric levels cannot be placed")
+
+        in_value_order = numeric if self.ascending else numeric[::-1]
+        self.bands = in_value_order
+        self.levels = np.array([band.level for band in in_value_order], dtype=int)
+
+        cuts, upper_inclusive = [], []
+        for lower, upper in zip(in_value_order[:-1], in_value_order[1:]):
+            if lower.high < upper.low:
+                cuts.append((lower.high + upper.low) / 2)
+                upper_inclusive.append(True)
+            else:
+                cuts.append(upper.low)
+                upper_inclusive.append(upper.low_inclusive or not lower.high_inclusive)
+        self.cuts = np.maximum.accumulate(np.array(cuts, dtype=float))
+        self.upper_inclusive = np.array(upper_inclusive, dtype=bool)
+
+
+    @staticmethod
+    def _midpoint(band: Band) -> float:
+        if math.isinf(band.low):
+            return band.high
+        if math.isinf(band.high):
+            return band.low
+        return (band.low + band.high) / 2
+
+
+    @staticmethod
+    def _beyond(band: Band, neighbour: Band, upward: bool) -> Band:
+        """Turn an ordinal end-of-scale band into an open interval past its numeric neighbour, which must be a closed interval"""
+        if math.isinf(neighbour.low) or math.isinf(neighbour.high):
+            raise ValueError(f"MaturityBands: Cannot place ordinal level {band.level} beyond the open-ended level {neighbour.level}")
+        if upward:
+            edge = neighbour.high if not math.isinf(neighbour.high) else neighbour.low
+            return Band(band.level, edge, math.inf, not neighbour.high_inclusive, False, band.label)
+        edge = neighbour.low if not math.isinf(neighbour.low) else neighbour.high
+        return Band(band.level, -math.inf, edge, False, not neighbour.low_inclusive, band.label)
+
+
+    def score(self, values) -> np.ndarray:
+        """
+        Map indicator values to maturity levels.
+
+        Args:
+            values: Scalar or array of indicator values; NaN means no data
+
+        Returns:
+            np.ndarray: Integer maturity levels, 0 where the value is NaN
+        """
+        values = np.atleast_1d(np.asarray(values, dtype=float))
+        index = np.searchsorted(self.cuts, values, side="left")
+        clipped = np.minimum(index, len(self.cuts) - 1)
+        on_cut = (index < len(self.cuts)) & (values == self.cuts[clipped]) & self.upper_inclusive[clipped]
+        scores = self.levels[index + on_cut]
+        return np.where(np.isnan(values), 0, scores)
+
+
+@lru_cache(maxsize=1024)
+def parse_maturity_levels(maturity_levels: str) -> Optional[MaturityBands]:
+    """
+    Compile a threshold string such as '1: <10, 2: 10-25, 3: 26-40, 4: 41-55, 5: >55'
+    into a MaturityBands table. Returns None when the scale cannot be scored numerically.
+    """
+    if not isinstance(maturity_levels, str):
+        return None
+    bands = [_parse_band(int(level), text) for level, text in LEVEL_PATTERN.findall(maturity_levels)]
+    try:
+        return MaturityBands(bands)
+    except ValueError:
+        return None
+
+
+def score_values(values, maturity_levels: str) -> Optional[np.ndarray]:
+    """Score an array of values against one maturity scale, or None if the scale is unparseable"""
+    bands = parse_maturity_levels(maturity_levels)
+    return bands.score(values) if bands is not None else None
+
+
+def score_indicators(
+        values: Sequence[float],
+        maturity_levels_list: Sequence[str],
+        fallback_scores: Optional[Sequence[int]] = None
+) -> np.ndarray:
+    """
+    Score one value per indicator, each against its own maturity scale.
+
+    Values sharing a scale are scored in one vectorized call. Indicators whose
+    scale cannot be parsed keep their ``fallback_scores`` entry (0 if none).
+
+    Args:
+        values (Sequence[float]): Indicator values, NaN for no data
+        maturity_levels_list (Sequence[str]): Maturity scale of each indicator
+        fallback_scores (Sequence[int], optional): Scores used where local scoring is impossible
+
+    Returns:
+        np.ndarray: Integer maturity score per indicator
+    """
+    values = np.asarray(values, dtype=float)
+    levels = np.asarray(maturity_levels_list, dtype=object)
+    scores = np.zeros(len(values), dtype=int) if fallback_scores is None else np.asarray(fallback_scores, dtype=int).copy()
+
+    for scale in set(levels.tolist()):
+        mask = levels == scale
+        scale_scores = score_values(values[mask], scale)
+        if scale_scores is not None:
+            scores[mask] = scale_scores
+    return scores
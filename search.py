@@ -3,26 +3,37 @@
 ####################
 
 import pandas as pd
+import re
 import time
 import logging
 import requests
 import json
 import os
-import matplotlib.pyplot as plt
-import numpy as np
-import streamlit as st
-import concurrent.futures
+import threading
+import asyncio
+import httpx
 
 from pydantic import BaseModel, Field
 
 from dotenv import load_dotenv
 
-from typing import Optional, Tuple, List, Union, Dict, Any, Annotated
+from typing import Optional, Tuple, List, Dict, Any, NamedTuple, Iterator, AsyncIterator
 
 from langchain_core.messages import SystemMessage, HumanMessage
-from langchain_openai import ChatOpenAI
+from langchain_core.callbacks import BaseCallbackHandler
 
+from requests.adapters import HTTPAdapter
 from requests.exceptions import ConnectionError, Timeout, RequestException
+from cache import SearchCache, get_search_cache, get_result_store, make_cache_key
+from ratelimit import get_rate_limiter, parse_retry_after, estimate_tokens
+from scoring import parse_maturity_levels
+from catalogue import get_indicator_catalogue
+from clients import GPT_MODEL, get_chat_model, get_structured_llm, openai_base_url
+from dedup import deduplicate_queries, DEDUP_MODE
+from singleflight import get_single_flight
+from tracing import span, record, counted, current_span, within
+from usage import BudgetExhausted, record_usage, usage_scope, check_budget, current_meter, within_meter
+from logconfig import configure_logging
 from tenacity import (
     retry, 
     stop_after_attempt, 
@@ -37,8 +48,6 @@ from tenacity import (
 ##################
 load_dotenv()
 
-llm = ChatOpenAI(model="gpt-4o", temperature=0)
-
 ####################
 ##### Prompts ######
 ####################
@@ -106,6 +115,51 @@ You are an AI assistant tasked with gathering and searching for the most recent
 """
 
 
+grouped_perplexity_system_prompt = """ 
+You are an AI assistant tasked with gathering and searching for the most recent official statistics, reports, or reputable news sources that provide information on each of the following indicators for {city}: {indicators}.
+"""
+
+
+grouped_indicator_prompt = """ 
+**Objective:**  
+Please find the information for each of the below indicators for the given city from reputable and up-to-date online sources, then determine the maturity level of each indicator on a scale from 1 to 5.
+Indicators:
+{indicator_list}
+City: {city}
+
+**Instructions:**  
+1. **Data Extraction:**  
+   - Perform a targeted web search for every indicator using reliable and official sources (such as the city’s official data portal, government websites, recognized statistical agencies, trusted news outlets, or reputable research organizations).  
+   - Identify the most recent and credible data available for each indicator separately.
+
+2. **Validation and Verification:**  
+   - Confirm that the sources are official or reputable. Cross-reference multiple sources if possible.  
+   - Ensure the data pertains specifically to {city} and is not about another location with a similar name.  
+   - If the current data is not available then find out the data that is most recent as far as 5 to 10 years old.
+
+3. **Maturity Assessment Mapping:**  
+   - After obtaining each indicator value, determine the maturity level of that indicator on a scale from 1 to 5.  
+   - If no credible data is found for an indicator after a thorough check, note that no data is available and return the maturity level of 0 for that indicator.
+
+4. **Formatting the Final Answer:**  
+   - Write one section per indicator, in the order given, each starting with a header of the form "## Indicator <number>: <indicator name>".
+   - In each section provide:  
+     - Data Found: the identified value (e.g., the current number or rate found)  
+     - Maturity Level: the assigned maturity level
+     - A short explanation citing numbered sources (e.g., [1], [2])
+   - Never combine several indicators in one section.
+   - After the last section, provide one comprehensive list of all cited sources:
+     ### Sources
+     [1] https://www.example-first.com/path  
+     [2] https://www.example-second.com/path
+
+**Example of Final Output Format:**  
+## Indicator 1: Percentage of population covered by at least a 4G mobile network
+- Data Found: 97 
+- Maturity Level: 5
+"""
+
+
 extraction_prompt = """ 
     You are an assistant with the ability to read structured answers and return them in a standardized format. You have been given a final answer that includes the following data:
     - An indicator name (e.g., “Number of datasets available on city open data portal”)
@@ -123,6 +177,23 @@ extraction_prompt = """
     - If no data can be found, indicate that no valid extraction is possible and return 0 value for both: e.g., {"indicator_value": 0, "maturity_score": 0}
     """
 
+batch_extraction_prompt = """ 
+    You are an assistant with the ability to read structured answers and return them in a standardized format. You have been given several final answers, each one for a different indicator and delimited by a "### Indicator: <name>" header. Each answer includes:
+    - A data value for that indicator (a number)
+    - A maturity level (an integer between 1 and 5) that corresponds to that data value based on predefined thresholds
+
+    Your task, for every indicator:
+    - Return the indicator name exactly as written in its header.
+    - Identify the numeric value of the indicator from its answer. If the answer states something like "Data Found: 47 datasets," then indicator_value = 47.
+    - Identify the integer maturity score assigned to that value. For example, if the answer states "Maturity Level: 4," then maturity_score = 4.
+    - Validate that indicator_value is a float and maturity_score is an integer between 0 and 5.
+
+    Note:
+    - Return exactly one entry per indicator header and never mix values between indicators.
+    - If the given answer does not explicitly include the word "Data Found:" or "Maturity Level:" labels, infer the correct numeric values from the context.
+    - If no data can be found for an indicator, return 0 value for both: e.g., {"indicator_value": 0, "maturity_score": 0}
+    """
+
 find_indicators_prompt = """ 
 You are a smart city assessment expert. Given a category, provide a comprehensive set of indicators and their corresponding maturity assessment levels for evaluating a city's performance in that category.
 
@@ -212,6 +283,20 @@ class PerplexityAPIError(Exception):
     """Custom exception for Perplexity API-specific errors"""    
     pass
 
+class PerplexityRateLimitError(PerplexityAPIError):
+    """Custom exception for Perplexity rate-limit (HTTP 429) responses"""
+    status_code = 429
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def perplexity_api_url() -> str:
+    """Perplexity chat completions endpoint, overridden with PERPLEXITY_API_URL e.g. for the local stub server"""
+    return os.getenv("PERPLEXITY_API_URL", "https://api.perplexity.ai/chat/completions")
+
+
 class PerplexitySearchHandler:
     def __init__(
             self, 
@@ -220,7 +305,12 @@ class PerplexitySearchHandler:
             max_retries: int = 5,
             min_wait: float = 1,
             max_wait: float = 60,
-            temperature: float = 0.2
+            temperature: float = 0.2,
+            cache: Optional[SearchCache] = None,
+            use_cache: bool = True,
+            pool_size: int = 32,
+            connect_timeout: float = 10,
+            read_timeout: float = 120
     ):
         """
         Initialize PerplexitySearchHandler with configuration parameters.
@@ -232,7 +322,16 @@ class PerplexitySearchHandler:
             min_wait (float): Minimum wait time between retries in seconds
             max_wait (float): Maximum wait time between retries in seconds
             temperature (float): Temperature for response generation
+            cache (SearchCache, optional): Result cache, defaults to the process-wide search cache
+            use_cache (bool): Whether search results are read from and written to the cache
+            pool_size (int): Maximum number of keep-alive connections to the API
+            connect_timeout (float): Timeout for establishing a connection in seconds
+            read_timeout (float): Timeout for reading the API response in seconds
         """
+        # Configure logging
+        self.logger = logging.getLogger(__name__)
+        self._setup_logging()
+
         self.api_key = api_key or os.getenv('PERPLEXITY_API')
         if not self.api_key:
             self.logger.error("__init__: Perplexity API key not found")
@@ -247,24 +346,65 @@ class PerplexitySearchHandler:
         self.min_wait = min_wait
         self.max_wait = max_wait 
         self.temperature = temperature
-        self.endpoint_url = "https://api.perplexity.ai/chat/completions"
-
-        # Configure logging
-        self.logger = logging.getLogger(__name__)
-        self._setup_logging()
+        # Overridable to point the app at a local stand-in (see benchmarks/stub_server.py)
+        self.endpoint_url = perplexity_api_url()
+        self.use_cache = use_cache
+        self.cache = (cache or get_search_cache()) if use_cache else None
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.rate_limiter = get_rate_limiter("perplexity")
+
+        # Pooled keep-alive session shared by all threads using this handler
+        self.session = self._create_session()
+
+        # Build the retry policy once and bind it to the request method
+        self._request_with_retry = self._get_retry_decorator(
+            self.logger, 
+            max_retries=self.max_retries, 
+            min_wait=self.min_wait, 
+            max_wait=self.max_wait
+        )(self._send_request)
+        self._arequest_with_retry = self._get_retry_decorator(
+            self.logger, 
+            max_retries=self.max_retries, 
+            min_wait=self.min_wait, 
+            max_wait=self.max_wait
+        )(self._asend_request)
+        self._async_client = None
 
 
     def _setup_logging(self):
-        """Configure logging settings"""
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(name)s - %(funcName)s - Line:%(lineno)d - %(message)s',
-            # Optional: Add file handler to save logs
-            handlers=[
-                logging.FileHandler('perplexity_search.log'),
-                logging.StreamHandler()  # Print to console as well
-            ]
-        )
+        """Configure logging settings (once per process, however many handlers are created)"""
+        configure_logging()
+
+
+    def _create_session(self) -> requests.Session:
+        """Create a requests session with a connection pool sized for concurrent searches"""
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers.update({
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        })
+        return session
+
+
+    def _get_async_client(self) -> httpx.AsyncClient:
+        """
+        Return the pooled async HTTP client, creating it on first use.
+
+        The client is bound to the event loop it is first used on, so async
+        searches should run on the shared engine loop (see ``run_async``).
+        """
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(
+                headers=dict(self.session.headers),
+                limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+                timeout=httpx.Timeout(self.timeout[1], connect=self.timeout[0])
+            )
+        return self._async_client
 
 
     def _create_payload(self, system_prompt: str, user_prompt: str) -> Dict[str, Any]:
@@ -300,6 +440,8 @@ class PerplexitySearchHandler:
             response_dict = response.json()
             response_choice = response_dict.get("choices", [])
             response_citations = response_dict.get("citations", [])
+            usage = response_dict.get("usage") or {}
+            record_usage("perplexity", response_dict.get("model") or self.model, usage.get("prompt_tokens"), usage.get("completion_tokens"))
             
             if not response_choice:
                 self.logger.error("_handle_response: No choices found in response")
@@ -322,51 +464,101 @@ class PerplexitySearchHandler:
         
 
     @classmethod
-    def _get_retry_decorator(cls, logger):
-        """Get a retry decorator with the specified logger"""
+    def _get_retry_decorator(cls, logger, max_retries: int = 5, min_wait: float = 1, max_wait: float = 60):
+        """Get a retry decorator with the specified logger and retry settings"""
         return retry(
-            stop=stop_after_attempt(5),
-            wait=wait_exponential(multiplier=1, min=1, max=60),
+            stop=stop_after_attempt(max_retries),
+            wait=wait_exponential(multiplier=1, min=min_wait, max=max_wait),
             retry=retry_if_exception_type((
                 ConnectionError,
                 Timeout,
                 RequestException,
+                httpx.TransportError,
                 PerplexityAPIError
             )),
-            before_sleep=before_sleep_log(logger, logging.WARNING),
+            before_sleep=counted("retries", before_sleep_log(logger, logging.WARNING)),
             after=after_log(logger, logging.INFO),
             reraise=True
         )
     
-    
-    def _make_request_method(self, system_prompt: str, user_prompt: str) -> str:
-        """Make request to Perplexity API with retry handling using decorator method"""
-        retry_decorator = self._get_retry_decorator(self.logger)
-        
-        @retry_decorator
-        def _make_request_inner():
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-            
-            response = requests.post(
+
+    def _check_rate_limit(self, response) -> None:
+        """Raise PerplexityRateLimitError, carrying the Retry-After delay, for 429 responses"""
+        if response.status_code == 429:
+            retry_after = parse_retry_after(response.headers)
+            self.logger.warning(f"_check_rate_limit: API rate limit hit, Retry-After: {retry_after}")
+            raise PerplexityRateLimitError("_check_rate_limit: API returned status code 429", retry_after=retry_after)
+
+
+    def _send_request(self, system_prompt: str, user_prompt: str) -> str:
+        """Send a single request to the Perplexity API over the pooled session"""
+        with self.rate_limiter.acquire(tokens=estimate_tokens(system_prompt + user_prompt)):
+            response = self.session.post(
                 self.endpoint_url,
                 json=self._create_payload(system_prompt, user_prompt),
-                headers=headers
+                timeout=self.timeout
             )
-            return self._handle_response(response)
-            
-        return _make_request_inner()
+            self._check_rate_limit(response)
+        return self._handle_response(response)
     
 
-    def search(self, system_prompt: str, user_prompt: str) -> str:
+    async def _asend_request(self, system_prompt: str, user_prompt: str) -> str:
+        """Send a single request to the Perplexity API over the pooled async client"""
+        async with self.rate_limiter.acquire_async(tokens=estimate_tokens(system_prompt + user_prompt)):
+            response = await self._get_async_client().post(
+                self.endpoint_url,
+                json=self._create_payload(system_prompt, user_prompt)
+            )
+            self._check_rate_limit(response)
+        return self._handle_response(response)
+
+
+    def _make_request_method(self, system_prompt: str, user_prompt: str) -> str:
+        """Make request to Perplexity API with retry handling using decorator method"""
+        return self._request_with_retry(system_prompt, user_prompt)
+    
+
+    def _cache_key(self, system_prompt: str, user_prompt: str) -> str:
+        """Content-addressed cache key of a search request"""
+        # The endpoint is part of the key so that answers of a stub or proxy never reach runs against the real API
+        return make_cache_key(
+            endpoint=self.endpoint_url,
+            model=self.model,
+            system_prompt=system_prompt,
+            user_prompt=user_prompt,
+            temperature=self.temperature
+        )
+
+
+    def _validate_prompts(self, system_prompt: str, user_prompt: str):
+        """Validate the search prompts"""
+        if not system_prompt or not isinstance(system_prompt, str):
+            self.logger.error("search: System prompt must be a non-empty string")
+            raise ValueError("search: System prompt must be a non-empty string")
+        if not user_prompt or not isinstance(user_prompt, str):
+            self.logger.error("search: User prompt must be a non-empty string")
+            raise ValueError("search: User prompt must be a non-empty string")
+
+
+    def _get_cached(self, cache_key: Optional[str], user_prompt: str) -> Optional[Tuple[str, List]]:
+        """Return the cached search result for ``cache_key``, if any"""
+        if not cache_key:
+            return None
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            self.logger.info(f"search: Cache hit for query: {user_prompt[-100:]}")
+            return cached[0], cached[1]
+        return None
+
+
+    def search(self, system_prompt: str, user_prompt: str, bypass_cache: bool = False) -> str:
         """
         Perform a search query with error handling and retries.
         
         Args:
             system_prompt (str): System prompt for the LLM
             user_prompt (str): User's search query
+            bypass_cache (bool): Skip the cache lookup and refresh the cached result
             
         Returns:
             str: Formatted search results
@@ -376,37 +568,111 @@ class PerplexitySearchHandler:
             ValueError: If inputs are invalid
         """
         # Input validation
-        if not system_prompt or not isinstance(system_prompt, str):
-            self.logger.error("search: System prompt must be a non-empty string")
-            raise ValueError("search: System prompt must be a non-empty string")
-        if not user_prompt or not isinstance(user_prompt, str):
-            self.logger.error("search: User prompt must be a non-empty string")
-            raise ValueError("search: User prompt must be a non-empty string")
+        self._validate_prompts(system_prompt, user_prompt)
+
+        cache_key = self._cache_key(system_prompt, user_prompt) if self.cache else None
+        cached = None if bypass_cache else self._get_cached(cache_key, user_prompt)
+        if cached is not None:
+            return cached
+        # Only requests that cost something count against the job's budget
+        check_budget()
+
+        # Identical searches already in flight in another thread are awaited instead of sent again
+        return get_single_flight("perplexity").do(cache_key or self._cache_key(system_prompt, user_prompt), self._fetch, system_prompt, user_prompt, cache_key)
+
 
+    def _fetch(self, system_prompt: str, user_prompt: str, cache_key: Optional[str]) -> Tuple[str, List]:
+        """Send the search request and cache its result"""
         try:
             self.logger.info(f"search: Executing search query: {user_prompt[-100:]}")
-            return self._make_request_method(system_prompt, user_prompt)
+            with span("perplexity.request", model=self.model):
+                results, citations = self._make_request_method(system_prompt, user_prompt)
             
         except Exception as e:
             self.logger.error(f"search: Search failed: {str(e)}")
             raise PerplexitySearchError(f"search: Search failed: {str(e)}")
+
+        if cache_key:
+            self.cache.set(cache_key, [results, citations])
+        return results, citations
+
+
+    async def asearch(self, system_prompt: str, user_prompt: str, bypass_cache: bool = False) -> str:
+        """
+        Async variant of ``search`` using the pooled async HTTP client.
         
+        Args:
+            system_prompt (str): System prompt for the LLM
+            user_prompt (str): User's search query
+            bypass_cache (bool): Skip the cache lookup and refresh the cached result
+            
+        Returns:
+            str: Formatted search results
+            
+        Raises:
+            PerplexitySearchError: If search operation fails
+            ValueError: If inputs are invalid
+        """
+        # Input validation
+        self._validate_prompts(system_prompt, user_prompt)
+
+        cache_key = self._cache_key(system_prompt, user_prompt) if self.cache else None
+        cached = None if bypass_cache else self._get_cached(cache_key, user_prompt)
+        if cached is not None:
+            return cached
+        check_budget()
+
+        return await get_single_flight("perplexity").ado(cache_key or self._cache_key(system_prompt, user_prompt), self._afetch, system_prompt, user_prompt, cache_key)
+
+
+    async def _afetch(self, system_prompt: str, user_prompt: str, cache_key: Optional[str]) -> Tuple[str, List]:
+        """Async variant of ``_fetch``"""
+        try:
+            self.logger.info(f"asearch: Executing search query: {user_prompt[-100:]}")
+            with span("perplexity.request", model=self.model):
+                results, citations = await self._arequest_with_retry(system_prompt, user_prompt)
+            
+        except Exception as e:
+            self.logger.error(f"asearch: Search failed: {str(e)}")
+            raise PerplexitySearchError(f"asearch: Search failed: {str(e)}")
+
+        if cache_key:
+            self.cache.set(cache_key, [results, citations])
+        return results, citations
+        
+
+
+_search_handler = None
+_search_handler_lock = threading.Lock()
+
+def get_search_handler() -> PerplexitySearchHandler:
+    """Return the long-lived search handler shared by all threads, creating it on first use"""
+    global _search_handler
+    with _search_handler_lock:
+        if _search_handler is None:
+            _search_handler = PerplexitySearchHandler(
+                max_retries=5,
+                min_wait=1,
+                max_wait=60,
+                temperature=0.2,
+                pool_size=int(os.getenv("PERPLEXITY_POOL_SIZE", 32)),
+                use_cache=os.getenv("SEARCH_CACHE_DISABLED", "").lower() not in ("1", "true")
+            )
+    return _search_handler
 
 
 # Example usage
-def perplexity_search_func(system_prompt: str, user_prompt: str):
+def perplexity_search_func(system_prompt: str, user_prompt: str, bypass_cache: bool = False):
+    # Reuse the shared search handler and its connection pool
+    search_handler = get_search_handler()
     try:
-        # Initialize the search handler
-        search_handler = PerplexitySearchHandler(
-            max_retries=5,
-            min_wait=1,
-            max_wait=60,
-            temperature=0.2
-        )
         # Perform search
-        results, citations = search_handler.search(system_prompt, user_prompt)
+        results, citations = search_handler.search(system_prompt, user_prompt, bypass_cache=bypass_cache)
         # print("Search Results:", results)
         return results, citations
+
+    except BudgetExhausted:
+        raise
         
     except ValueError as e:
         search_handler.logger.error(f"perplexity_search_func: Invalid input: {str(e)}")
@@ -422,44 +688,198 @@ def perplexity_search_func(system_prompt: str, user_prompt: str):
     
 
 
+async def async_perplexity_search_func(system_prompt: str, user_prompt: str, bypass_cache: bool = False):
+    # Reuse the shared search handler and its async connection pool
+    search_handler = get_search_handler()
+    try:
+        return await search_handler.asearch(system_prompt, user_prompt, bypass_cache=bypass_cache)
+
+    except BudgetExhausted:
+        raise
+
+    except ValueError as e:
+        search_handler.logger.error(f"async_perplexity_search_func: Invalid input: {str(e)}")
+        raise ValueError(f"async_perplexity_search_func: Invalid input: {str(e)}")
+
+    except PerplexitySearchError as e:
+        search_handler.logger.error(f"async_perplexity_search_func: Search failed: {str(e)}")
+        raise PerplexitySearchError(f"async_perplexity_search_func: Search failed: {str(e)}")
+
+    except Exception as e:
+        search_handler.logger.error(f"async_perplexity_search_func: Unexpected error: {str(e)}")
+        raise PerplexitySearchError(f"async_perplexity_search_func: Unexpected error: {str(e)}")
+
+
+##############################
+##### Async Search Engine ####
+##############################
+
+# Maximum number of API calls in flight across every city, indicator and session
+MAX_CONCURRENCY = int(os.getenv("SEARCH_MAX_CONCURRENCY", 16))
+
+_async_loop = None
+_async_loop_lock = threading.Lock()
+_async_semaphore = None
+
+
+def _get_async_loop() -> asyncio.AbstractEventLoop:
+    """Return the engine event loop, starting it in a daemon thread on first use"""
+    global _async_loop
+    with _async_loop_lock:
+        if _async_loop is None:
+            _async_loop = asyncio.new_event_loop()
+            threading.Thread(target=_async_loop.run_forever, name="search-engine-loop", daemon=True).start()
+    return _async_loop
+
+
+def _get_async_semaphore() -> asyncio.Semaphore:
+    """Return the global concurrency limit, must be called on the engine loop"""
+    global _async_semaphore
+    if _async_semaphore is None:
+        _async_semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+    return _async_semaphore
+
+
+def run_async(coro):
+    """
+    Run a coroutine on the shared engine loop and block until it finishes.
+
+    All async searches run on one long-lived loop so that the pooled async
+    clients and the global concurrency limit are shared by every caller,
+    including concurrent Streamlit sessions.
+    """
+    # The caller's trace span becomes the parent of the spans started on the engine loop, and its job's usage meter carries over
+    return asyncio.run_coroutine_threadsafe(within(current_span(), within_meter(current_meter(), coro)), _get_async_loop()).result()
+
+
+def iterate_async(async_iterator: AsyncIterator) -> Iterator:
+    """
+    Consume an async iterator running on the engine loop from a synchronous caller.
+
+    Items are yielded as soon as they are produced. Closing the generator
+    early closes the async iterator on the engine loop as well.
+    """
+    loop = _get_async_loop()
+    parent, meter = current_span(), current_meter()
+    try:
+        while True:
+            try:
+                yield asyncio.run_coroutine_threadsafe(within(parent, within_meter(meter, async_iterator.__anext__())), loop).result()
+            except StopAsyncIteration:
+                break
+    finally:
+        asyncio.run_coroutine_threadsafe(async_iterator.aclose(), loop).result()
+
+
+
+
 
 ##########################################
 ##### Read the indicator Excel file ######
 ##########################################
 
 def read_indicators_file():
-    # Load the Excel file
-    file_path = './Provisional indicator list.xlsx'
-
-    # Define the sheet names and the desired columns
-    sheets = [
-        "Digital Transformation",
-        "Policies and Regulations",
-        "People and Digital Skills",
-        "City Functions",
-        "City",
-        "Data"
-    ]
-    columns = ["Category", "Indicator", "City Level Source", "National Data Source", 
-            "Maturity Assessment (1-5)", "Toolkit Source"]
-
-    # Read each sheet into a DataFrame, selecting the desired columns, and concatenate them
-    df_list = []
-    for sheet in sheets:
-        try:
-            sheet_df = pd.read_excel(file_path, sheet_name=sheet, usecols=columns)
-            # print(f"For sheet - {sheet}, the number of indicators are: {len(sheet_df)}")
-            df_list.append(sheet_df)
-        except Exception as e:
-            print(f"Error reading sheet {sheet}: {e}")
-
-    # Combine all the data into a single DataFrame
-    combined_df = pd.concat(df_list, ignore_index=True)
+    # Served from the compiled, process-wide catalogue instead of re-parsing the workbook
+    combined_df = get_indicator_catalogue().df.copy()
 
     # Return the combined DataFrame to the user
     return combined_df
 
 
+################################
+##### Rate-limited LLM calls ###
+################################
+
+def _estimate_message_tokens(messages: List) -> int:
+    """Rough token estimate of a list of LangChain messages or strings"""
+    return estimate_tokens("".join(str(getattr(message, "content", message)) for message in messages))
+
+
+def _llm_request_key(runnable, messages: List) -> str:
+    # The runnable is identified by object: it is alive, so its id is not reused, while the call is in flight
+    return make_cache_key(runnable=id(runnable), messages=[(getattr(message, "type", None), str(getattr(message, "content", message))) for message in messages])
+
+
+class _UsageCallback(BaseCallbackHandler):
+    """
+    Collects the token usage of the chat model calls inside a LangChain runnable.
+
+    Structured-output runnables return only the parsed object, so usage is
+    taken from the callbacks and recorded by the caller afterwards, in the
+    caller's own context (span and job meter).
+    """
+    run_inline = True
+
+    def __init__(self):
+        self.usages = []
+
+
+    def on_llm_end(self, response, **kwargs):
+        llm_output = response.llm_output or {}
+        usage = llm_output.get("token_usage")
+        model = llm_output.get("model_name")
+        if not usage:
+            # Newer langchain-openai versions report usage on the message instead
+            for generations in response.generations:
+                for generation in generations:
+                    message = getattr(generation, "message", None)
+                    metadata = getattr(message, "usage_metadata", None)
+                    if metadata:
+                        usage = {"prompt_tokens": metadata.get("input_tokens"), "completion_tokens": metadata.get("output_tokens")}
+                        model = model or (message.response_metadata or {}).get("model_name")
+        if usage:
+            self.usages.append((model or GPT_MODEL, usage.get("prompt_tokens"), usage.get("completion_tokens")))
+
+
+    def record(self):
+        for model, prompt_tokens, completion_tokens in self.usages:
+            record_usage("openai", model, prompt_tokens, completion_tokens)
+
+
+def _invoke_llm(runnable, messages: List):
+    tokens = _estimate_message_tokens(messages)
+    callback = _UsageCallback()
+    with span("llm.request"):
+        record("estimated_prompt_tokens", tokens)
+        try:
+            with get_rate_limiter("openai").acquire(tokens=tokens):
+                return runnable.invoke(messages, config={"callbacks": [callback]})
+        finally:
+            # Also when parsing the structured output failed, the tokens were spent
+            callback.record()
+
+
+async def _ainvoke_llm(runnable, messages: List):
+    tokens = _estimate_message_tokens(messages)
+    callback = _UsageCallback()
+    with span("llm.request"):
+        record("estimated_prompt_tokens", tokens)
+        try:
+            async with get_rate_limiter("openai").acquire_async(tokens=tokens):
+                return await runnable.ainvoke(messages, config={"callbacks": [callback]})
+        finally:
+            callback.record()
+
+
+def invoke_llm(runnable, messages: List):
+    """
+    Invoke a LangChain chat model or structured runnable under the shared OpenAI rate limiter.
+
+    Identical invocations already in flight (same runnable and messages) are
+    awaited instead of sent again, see ``singleflight.SingleFlight``.
+    Raises ``usage.BudgetExhausted`` instead of calling once the current
+    job's budget is spent.
+    """
+    check_budget()
+    return get_single_flight("llm").do(_llm_request_key(runnable, messages), _invoke_llm, runnable, messages)
+
+
+async def ainvoke_llm(runnable, messages: List):
+    """Async variant of ``invoke_llm``"""
+    check_budget()
+    return await get_single_flight("llm").ado(_llm_request_key(runnable, messages), _ainvoke_llm, runnable, messages)
+
+
 #######################################
 ##### Format the Maturity Levels ######
 #######################################
@@ -488,7 +908,7 @@ def format_maturity_levels(maturity_scale: str):
     system_prompt = SystemMessage(content=maturity_format_prompt.format(maturity_scale=maturity_scale))
 
     # Invoke the LLM to generate query
-    level_list = llm.invoke([system_prompt])
+    level_list = invoke_llm(get_chat_model(), [system_prompt])
 
     return level_list.content
 
@@ -525,6 +945,20 @@ class MaturityScore(BaseModel):
     )
 
 
+class IndicatorMaturityScore(MaturityScore):
+    indicator: str = Field(
+        ...,
+        description="The indicator name exactly as written in the '### Indicator: <name>' header of its answer."
+    )
+
+
+class MaturityScoreBatch(BaseModel):
+    scores: List[IndicatorMaturityScore] = Field(
+        ...,
+        description="One extracted indicator value and maturity score for every indicator answer provided."
+    )
+
+
 # def search_func(city: str, indicator: str):
     # perplexity_result, citations = perplexity_search_func(system_prompt=perplexity_system_prompt.format(indicator=indicator, city=city), user_prompt=indicator_prompt.format(indicator=indicator, city=city))
 
@@ -536,14 +970,7 @@ class MaturityScore(BaseModel):
 
 #     return perplexity_result, citations, maturity_value.indicator_value, maturity_value.maturity_score
 
-def extract_info(result_output: str):
-    # Structured LLM
-    structured_llm = llm.with_structured_output(MaturityScore)
-
-    # Invoke the LLM to get maturity score and indicator value
-    maturity_value = structured_llm.invoke([SystemMessage(content=extraction_prompt)] + [HumanMessage(content=f"Extract the indicator value and maturity score from the output: \n {result_output}")])
-
-    recheck_prompt_template = """
+recheck_prompt = """
     Your task is to check that the indicator value (delimited by ###) and maturity value (delimited by $$$) is properly extracted from the search response based on the perplexity search (delimited by @@@). If yes, just output the indicator value and maturity score (without the delimiters). If no, then make the extraction from the search result again.
 
     Search Response: @@@ {result_output} @@@
@@ -552,99 +979,723 @@ def extract_info(result_output: str):
     Maturity Value: $$$ {maturity_score} $$$
     """
 
+def _score_locally(maturity_value: MaturityScore, maturity_levels: Optional[str]) -> Optional[MaturityScore]:
+    """
+    Score the extracted indicator value against the indicator's thresholds.
+
+    Returns None when the thresholds cannot be parsed, in which case the
+    LLM-assigned score is used instead.
+    """
+    bands = parse_maturity_levels(maturity_levels) if maturity_levels else None
+    if bands is None:
+        return None
+
+    # The extraction prompt returns 0 for both fields when no data was found
+    if maturity_value.maturity_score == 0 and maturity_value.indicator_value == 0:
+        return maturity_value
+
+    return MaturityScore(
+        indicator_value=maturity_value.indicator_value,
+        maturity_score=int(bands.score(maturity_value.indicator_value)[0])
+    )
+
+
+def extract_info(result_output: str, maturity_levels: Optional[str] = None):
+    # Structured LLM
+    structured_llm = get_structured_llm(MaturityScore)
+
+    # Invoke the LLM to get maturity score and indicator value
+    with span("extraction"):
+        maturity_value = invoke_llm(structured_llm, [SystemMessage(content=extraction_prompt)] + [HumanMessage(content=f"Extract the indicator value and maturity score from the output: \n {result_output}")])
+
+    # Deterministic scoring against the thresholds makes the LLM recheck unnecessary
+    local_value = _score_locally(maturity_value, maturity_levels)
+    if local_value is not None:
+        return local_value
+
     if maturity_value.maturity_score == 0:
-        maturity_value = structured_llm.invoke([SystemMessage(content=extraction_prompt)] + [HumanMessage(content=recheck_prompt_template.format(result_output=result_output, indicator_value=maturity_value.indicator_value, maturity_score=maturity_value.maturity_score))])
+        with span("recheck"):
+            maturity_value = invoke_llm(structured_llm, [SystemMessage(content=extraction_prompt)] + [HumanMessage(content=recheck_prompt.format(result_output=result_output, indicator_value=maturity_value.indicator_value, maturity_score=maturity_value.maturity_score))])
 
     return maturity_value
 
 
-def search_func(city: str, indicators: List):
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        # Parallelize over indicators
-        futures_perplexity = [executor.submit(perplexity_search_func, system_prompt=perplexity_system_prompt.format(indicator=indicator, city=city), user_prompt=indicator_prompt.format(indicator=indicator, city=city)) for indicator in indicators]
-        results_perplexity = [f.result() for f in futures_perplexity]
+async def async_extract_info(result_output: str, maturity_levels: Optional[str] = None):
+    # Structured LLM
+    structured_llm = get_structured_llm(MaturityScore)
+
+    # Invoke the LLM to get maturity score and indicator value
+    with span("extraction"):
+        maturity_value = await ainvoke_llm(structured_llm, [SystemMessage(content=extraction_prompt)] + [HumanMessage(content=f"Extract the indicator value and maturity score from the output: \n {result_output}")])
+
+    # Deterministic scoring against the thresholds makes the LLM recheck unnecessary
+    local_value = _score_locally(maturity_value, maturity_levels)
+    if local_value is not None:
+        return local_value
+
+    if maturity_value.maturity_score == 0:
+        with span("recheck"):
+            maturity_value = await ainvoke_llm(structured_llm, [SystemMessage(content=extraction_prompt)] + [HumanMessage(content=recheck_prompt.format(result_output=result_output, indicator_value=maturity_value.indicator_value, maturity_score=maturity_value.maturity_score))])
+
+    return maturity_value
+
+
+# Token budget and maximum number of answers packed into one batched extraction call
+EXTRACTION_BATCH_TOKENS = int(os.getenv("EXTRACTION_BATCH_TOKENS", 12000))
+EXTRACTION_BATCH_SIZE = int(os.getenv("EXTRACTION_BATCH_SIZE", 10))
+# Seconds the batched extraction stage waits for more search results before extracting
+EXTRACTION_BATCH_LINGER = float(os.getenv("EXTRACTION_BATCH_LINGER", 1.0))
+
+
+def _chunk_outputs(result_outputs: List[str]) -> List[List[int]]:
+    """Split output positions into chunks that fit the extraction token budget"""
+    chunks, chunk, chunk_tokens = [], [], 0
+    for position, output in enumerate(result_outputs):
+        tokens = estimate_tokens(output)
+        if chunk and (chunk_tokens + tokens > EXTRACTION_BATCH_TOKENS or len(chunk) >= EXTRACTION_BATCH_SIZE):
+            chunks.append(chunk)
+            chunk, chunk_tokens = [], 0
+        chunk.append(position)
+        chunk_tokens += tokens
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def _batch_messages(indicators: List[str], result_outputs: List[str], chunk: List[int]) -> List:
+    """Build the batched extraction messages for the outputs in ``chunk``"""
+    sections = "\n\n".join(f"### Indicator: {indicators[position]}\n{result_outputs[position]}" for position in chunk)
+    return [SystemMessage(content=batch_extraction_prompt)] + [HumanMessage(content=f"Extract the indicator value and maturity score for each indicator from the outputs: \n {sections}")]
+
+
+def _match_batch(indicators: List[str], chunk: List[int], batch: Optional[MaturityScoreBatch]) -> Dict[int, MaturityScore]:
+    """Map validated batch entries back to output positions; invalid or missing entries are left out"""
+    by_name = {}
+    for score in (batch.scores if batch else []):
+        if 0 <= score.maturity_score <= 5:
+            by_name.setdefault(score.indicator.strip().casefold(), score)
+
+    matched = {}
+    for position in chunk:
+        score = by_name.get(str(indicators[position]).strip().casefold())
+        if score is not None:
+            matched[position] = MaturityScore(indicator_value=score.indicator_value, maturity_score=score.maturity_score)
+    return matched
+
+
+def extract_info_batch(indicators: List[str], result_outputs: List[str], maturity_levels: Optional[List[str]] = None) -> List[MaturityScore]:
+    """
+    Extract indicator values and maturity scores for many outputs with one structured call per chunk.
+
+    Outputs are packed into chunks by token budget. Entries that are missing
+    from the batch response or fail validation fall back to ``extract_info``.
+
+    Args:
+        indicators (List[str]): Indicator name of each output, used as the batch key
+        result_outputs (List[str]): Perplexity output of each indicator
+        maturity_levels (List[str], optional): Threshold string of each indicator for local scoring
+
+    Returns:
+        List[MaturityScore]: One result per output, in input order
+    """
+    maturity_levels = list(maturity_levels) if maturity_levels is not None else [None] * len(result_outputs)
+    structured_llm = get_structured_llm(MaturityScoreBatch)
+
+    results = {}
+    for chunk in _chunk_outputs(result_outputs):
+        try:
+            with span("extraction.batch", indicators=len(chunk)):
+                batch = invoke_llm(structured_llm, _batch_messages(indicators, result_outputs, chunk))
+        except BudgetExhausted:
+            raise
+        except Exception as e:
+            logging.getLogger(__name__).warning(f"extract_info_batch: Batch extraction failed, falling back to single extraction: {str(e)}")
+            batch = None
+
+        matched = _match_batch(indicators, chunk, batch)
+        for position in chunk:
+            if position in matched:
+                results[position] = _score_locally(matched[position], maturity_levels[position]) or matched[position]
+            else:
+                results[position] = extract_info(result_outputs[position], maturity_levels[position])
+
+    return [results[position] for position in range(len(result_outputs))]
+
+
+async def async_extract_info_batch(indicators: List[str], result_outputs: List[str], maturity_levels: Optional[List[str]] = None) -> List[MaturityScore]:
+    """Async variant of ``extract_info_batch``; chunks are extracted concurrently"""
+    maturity_levels = list(maturity_levels) if maturity_levels is not None else [None] * len(result_outputs)
+    structured_llm = get_structured_llm(MaturityScoreBatch)
+
+    async def _extract_chunk(chunk: List[int]) -> Dict[int, MaturityScore]:
+        try:
+            with span("extraction.batch", indicators=len(chunk)):
+                batch = await ainvoke_llm(structured_llm, _batch_messages(indicators, result_outputs, chunk))
+        except BudgetExhausted:
+            raise
+        except Exception as e:
+            logging.getLogger(__name__).warning(f"async_extract_info_batch: Batch extraction failed, falling back to single extraction: {str(e)}")
+            batch = None
+
+        matched = _match_batch(indicators, chunk, batch)
+        results = {}
+        for position in chunk:
+            if position in matched:
+                results[position] = _score_locally(matched[position], maturity_levels[position]) or matched[position]
+            else:
+                results[position] = await async_extract_info(result_outputs[position], maturity_levels[position])
+        return results
+
+    results = {}
+    for chunk_results in await asyncio.gather(*[_extract_chunk(chunk) for chunk in _chunk_outputs(result_outputs)]):
+        results.update(chunk_results)
+
+    return [results[position] for position in range(len(result_outputs))]
+
+
+class IndicatorResult(NamedTuple):
+    """Search and extraction result for one indicator of a city"""
+    index: int
+    indicator: str
+    perplexity_output: str
+    citations: List
+    indicator_value: float
+    maturity_score: int
+
+
+# Number of indicators asked about in one Perplexity request (1 disables grouped queries)
+PERPLEXITY_GROUP_SIZE = int(os.getenv("PERPLEXITY_GROUP_SIZE", 1))
+
+GROUP_SECTION_PATTERN = re.compile(r"^#{1,4}\s*Indicator\s+(\d+)\s*[:.\-–]\s*(.*)$", re.IGNORECASE | re.MULTILINE)
+SOURCES_HEADER_PATTERN = re.compile(r"^#{1,4}\s*Sources\b", re.IGNORECASE | re.MULTILINE)
+
+
+def split_grouped_output(output: str, citations: List, num_indicators: int) -> List[Optional[Tuple[str, List]]]:
+    """
+    Split a grouped search answer into one (output, citations) pair per indicator.
+
+    Sections are matched by their "## Indicator <n>:" header. Each section
+    keeps only the citations it references, listed under its own Sources
+    heading so the text reads like a single-indicator answer. Indicators
+    without a section are returned as None.
+    """
+    matches = list(GROUP_SECTION_PATTERN.finditer(output))
+    sections = [None] * num_indicators
+
+    for position, match in enumerate(matches):
+        number = int(match.group(1))
+        if not 1 <= number <= num_indicators or sections[number - 1] is not None:
+            continue
+
+        end = matches[position + 1].start() if position + 1 < len(matches) else len(output)
+        text = SOURCES_HEADER_PATTERN.split(output[match.start():end])[0].strip()
+
+        references = sorted({int(reference) for reference in re.findall(r"\[(\d+)\]", text) if 1 <= int(reference) <= len(citations)})
+        section_citations = [citations[reference - 1] for reference in references]
+        if references:
+            text += "\n\n### Sources\n" + "\n".join(f"[{reference}] {citations[reference - 1]}" for reference in references)
+
+        sections[number - 1] = (text, section_citations)
+    return sections
+
+
+async def _async_search_single(city: str, indicator: str) -> Tuple[str, List]:
+    """Single-indicator Perplexity search"""
+    return await async_perplexity_search_func(
+        system_prompt=perplexity_system_prompt.format(indicator=indicator, city=city), 
+        user_prompt=indicator_prompt.format(indicator=indicator, city=city)
+    )
+
+
+async def async_group_search_func(city: str, indicators: List[str]) -> List[Tuple[str, List]]:
+    """
+    Search several indicators of one city with a single Perplexity request.
+
+    Returns:
+        List of (perplexity_output, citations) per indicator, in the shape of
+        single-indicator searches. Indicators missing from the grouped answer
+        are searched individually.
+    """
+    indicator_list = "\n".join(f"{number}. {indicator}" for number, indicator in enumerate(indicators, start=1))
+    async with _get_async_semaphore():
+        with usage_scope(city=city, indicators=indicators):
+            output, citations = await async_perplexity_search_func(
+                system_prompt=grouped_perplexity_system_prompt.format(indicators="; ".join(indicators), city=city),
+                user_prompt=grouped_indicator_prompt.format(indicator_list=indicator_list, city=city)
+            )
+
+    sections = split_grouped_output(output, citations, len(indicators))
+    missing = [position for position, section in enumerate(sections) if section is None]
+    if missing:
+        logging.getLogger(__name__).warning(f"async_group_search_func: {len(missing)} of {len(indicators)} indicators missing from grouped answer, searching them individually")
+
+        async def _search_missing(position: int):
+            async with _get_async_semaphore():
+                with usage_scope(city=city, indicator=indicators[position]):
+                    sections[position] = await _async_search_single(city, indicators[position])
+
+        await asyncio.gather(*[_search_missing(position) for position in missing])
+    return sections
+
+
+def _start_grouped_searches(city: str, indicators: List, group_size: int) -> Tuple[List[asyncio.Task], List[Optional[Any]]]:
+    """
+    Start one grouped search task per ``group_size`` indicators.
+
+    Returns the group tasks and, per indicator, an awaitable resolving to its
+    (perplexity_output, citations), or None everywhere when grouping is off.
+    """
+    if group_size <= 1:
+        return [], [None] * len(indicators)
+
+    async def _pick(task: asyncio.Task, offset: int):
+        return (await asyncio.shield(task))[offset]
+
+    group_tasks, searches = [], []
+    for start in range(0, len(indicators), group_size):
+        task = asyncio.ensure_future(async_group_search_func(city, list(indicators[start:start + group_size])))
+        picks = [asyncio.ensure_future(_pick(task, offset)) for offset in range(len(indicators[start:start + group_size]))]
+        group_tasks.extend([task] + picks)
+        searches.extend(picks)
+    return group_tasks, searches
+
+
+def _start_deduplicated_searches(city: str, indicators: List, group_size: int) -> Tuple[List[asyncio.Task], List[Optional[Any]]]:
+    """
+    Like ``_start_grouped_searches``, but identical indicators share one search, and so do
+    near-identical ones when DEDUP_MODE turns on near-duplicate detection.
+
+    Each cluster of duplicates is searched (or grouped) once under the
+    phrasing of its first member, and every member awaits that search.
+    """
+    deduplication = deduplicate_queries(indicators)
+    if len(deduplication.unique) == len(indicators):
+        return _start_grouped_searches(city, indicators, group_size)
+
+    tasks, unique_searches = _start_grouped_searches(city, deduplication.unique, group_size)
+
+    async def _search_shared(indicator: str):
+        async with _get_async_semaphore():
+            with usage_scope(city=city, indicator=indicator):
+                return await _async_search_single(city, indicator)
+
+    async def _share(task: asyncio.Task):
+        return await asyncio.shield(task)
+
+    shared = []
+    for indicator, search in zip(deduplication.unique, unique_searches):
+        if search is None:
+            search = asyncio.ensure_future(_search_shared(indicator))
+            tasks.append(search)
+        shared.append(search)
+
+    searches = [asyncio.ensure_future(_share(shared[cluster])) for cluster in deduplication.assignment]
+    return tasks + searches, searches
+
+
+async def _async_search_indicator(index: int, city: str, indicator: str, maturity_levels: Optional[str] = None, grouped_search=None) -> IndicatorResult:
+    """
+    Search and extract a single indicator.
+
+    The global concurrency slot is held from the search through the
+    extraction, so extraction starts the moment its search result arrives
+    instead of queueing behind searches for other indicators. With
+    ``grouped_search`` the search result comes from a shared grouped request,
+    which holds its own slot, and only the extraction takes one here.
+    """
+    with span("indicator", city=city, indicator=indicator, grouped=grouped_search is not None), usage_scope(city=city, indicator=indicator):
+        if grouped_search is None:
+            waited = time.perf_counter()
+            async with _get_async_semaphore():
+                record("queue_wait_seconds", time.perf_counter() - waited)
+                with span("search", city=city, indicator=indicator):
+                    perplexity_result, citations = await _async_search_single(city, indicator)
+                maturity_value = await async_extract_info(perplexity_result, maturity_levels=maturity_levels)
+        else:
+            with span("search", city=city, indicator=indicator, grouped=True):
+                perplexity_result, citations = await grouped_search
+            waited = time.perf_counter()
+            async with _get_async_semaphore():
+                record("queue_wait_seconds", time.perf_counter() - waited)
+                maturity_value = await async_extract_info(perplexity_result, maturity_levels=maturity_levels)
+
+    return IndicatorResult(
+        index=index,
+        indicator=indicator,
+        perplexity_output=perplexity_result,
+        citations=citations,
+        indicator_value=maturity_value.indicator_value,
+        maturity_score=maturity_value.maturity_score
+    )
+
 
-        # futures_llm = [executor.submit(llm.invoke, [SystemMessage(content=perplexity_system_prompt.format(indicator=indicator, city=city))] + [HumanMessage(content=indicator_prompt.format(indicator=indicator, city=city))]) for indicator in indicators]
-        # results_llm = [f.result() for f in futures_llm]
+async def _async_stream_batched(city: str, indicators: List, maturity_levels: List[Optional[str]], grouped_searches: List) -> AsyncIterator[IndicatorResult]:
+    """
+    Pipelined search -> batched extraction.
+
+    Searches run concurrently and feed a queue. Whenever the extraction stage
+    is free it lingers briefly, then takes every search result that has
+    arrived so far and extracts them with ``async_extract_info_batch``, so
+    batches grow naturally while slower searches are still in flight.
+    """
+    queue = asyncio.Queue()
+
+    async def _search_stage(index: int, indicator: str, grouped_search):
+        try:
+            with span("search", city=city, indicator=indicator, grouped=grouped_search is not None), usage_scope(city=city, indicator=indicator):
+                if grouped_search is None:
+                    waited = time.perf_counter()
+                    async with _get_async_semaphore():
+                        record("queue_wait_seconds", time.perf_counter() - waited)
+                        perplexity_result, citations = await _async_search_single(city, indicator)
+                else:
+                    perplexity_result, citations = await grouped_search
+            await queue.put((index, indicator, perplexity_result, citations))
+        except Exception as e:
+            await queue.put(e)
 
-    # Extract perplexity_result and citations from results
-    perplexity_outputs = [result[0] for result in results_perplexity]
-    citations = [result[1] for result in results_perplexity]
-    # llm_outputs = [result.content for result in results_llm]
-    # final_outputs = [f"#### Perplexity Result: \n {output1} \n\n---\n\n #### GPT Result: \n {output2}" for output1, output2 in zip(perplexity_outputs, llm_outputs)]
+    tasks = [asyncio.ensure_future(_search_stage(index, indicator, grouped_search)) for index, (indicator, grouped_search) in enumerate(zip(indicators, grouped_searches))]
+    exhausted = None
+    try:
+        remaining = len(indicators)
+        while remaining:
+            items = [await queue.get()]
+            if remaining > 1:
+                await asyncio.sleep(EXTRACTION_BATCH_LINGER)
+            while not queue.empty():
+                items.append(queue.get_nowait())
+            for item in items:
+                if isinstance(item, BudgetExhausted):
+                    exhausted = item
+                elif isinstance(item, Exception):
+                    raise item
+            remaining -= len(items)
+            # Searches skipped for the budget are not extracted, the outputs already paid for still are
+            items = [item for item in items if not isinstance(item, BudgetExhausted)]
+            if not items:
+                continue
+
+            async with _get_async_semaphore():
+                with usage_scope(city=city, indicators=[item[1] for item in items]):
+                    maturity_values = await async_extract_info_batch(
+                        indicators=[item[1] for item in items],
+                        result_outputs=[item[2] for item in items],
+                        maturity_levels=[maturity_levels[item[0]] for item in items]
+                    )
+
+            for (index, indicator, perplexity_result, citations), maturity_value in zip(items, maturity_values):
+                yield IndicatorResult(
+                    index=index,
+                    indicator=indicator,
+                    perplexity_output=perplexity_result,
+                    citations=citations,
+                    indicator_value=maturity_value.indicator_value,
+                    maturity_score=maturity_value.maturity_score
+                )
+    finally:
+        for task in tasks:
+            task.cancel()
+    if exhausted is not None:
+        raise exhausted
+
+
+async def _async_stream_search_pipeline(
+        city: str, 
+        indicators: List, 
+        maturity_levels: List[Optional[str]], 
+        batch_extraction: bool = False,
+        group_size: Optional[int] = None
+) -> AsyncIterator[IndicatorResult]:
+    """Search and extraction stages of ``async_stream_search_func``, without the shared result store"""
+    group_tasks, grouped_searches = _start_deduplicated_searches(city, indicators, group_size or PERPLEXITY_GROUP_SIZE)
+
+    try:
+        if batch_extraction:
+            async for result in _async_stream_batched(city, indicators, maturity_levels, grouped_searches):
+                yield result
+            return
+
+        tasks = [asyncio.ensure_future(_async_search_indicator(index, city, indicator, levels, grouped_search)) for index, (indicator, levels, grouped_search) in enumerate(zip(indicators, maturity_levels, grouped_searches))]
+        exhausted = None
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                try:
+                    result = await next_result
+                except BudgetExhausted as e:
+                    # Indicators still in flight finish, so the spend already committed is not wasted
+                    exhausted = e
+                    continue
+                yield result
+        finally:
+            for task in tasks:
+                task.cancel()
+        if exhausted is not None:
+            raise exhausted
+    finally:
+        for task in group_tasks:
+            task.cancel()
+
+
+# Disables the shared result store, e.g. for benchmarks that must hit the APIs
+RESULT_STORE_DISABLED = os.getenv("RESULT_STORE_DISABLED", "").lower() in ("1", "true")
+
+# Changes whenever a search or extraction prompt changes, so results of older prompts are not reused
+RESULT_VERSION = make_cache_key(prompts=[indicator_prompt, perplexity_system_prompt, extraction_prompt, batch_extraction_prompt, recheck_prompt])[:12]
+
+# Result futures of the (city, indicator) pairs being computed, on the engine loop
+_inflight_results: Dict[str, asyncio.Future] = {}
+
+
+def _result_key(city: str, indicator: str, maturity_levels: Optional[str]) -> str:
+    return make_cache_key(
+        kind="indicator_result",
+        city=" ".join(city.lower().split()),
+        indicator=indicator,
+        maturity_levels=maturity_levels,
+        search_model=os.getenv("MODEL"),
+        extraction_model=GPT_MODEL,
+        # Results computed against a stub server (see benchmarks/stub_server.py) are kept apart from real ones
+        search_endpoint=perplexity_api_url(),
+        extraction_endpoint=openai_base_url(),
+        # With near-duplicate detection on, a result may come from another indicator's search
+        dedup_mode=DEDUP_MODE,
+        version=RESULT_VERSION
+    )
 
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        # Parallelize over structured LLM calls
-        # futures = [executor.submit(llm.with_structured_output(MaturityScore).invoke, [SystemMessage(content=extraction_prompt)] + [HumanMessage(content=f"Extract the indicator value and maturity score from the output of perplexity search:\n {perplexity_result}")]) for perplexity_result in perplexity_results]
-        futures_extract = [executor.submit(extract_info, output) for output in perplexity_outputs]
-        maturity_values = [f.result() for f in futures_extract]
 
-    # Extract indicator_value and maturity_score from maturity_values
-    indicator_values = [maturity_value.indicator_value for maturity_value in maturity_values]
-    maturity_scores = [maturity_value.maturity_score for maturity_value in maturity_values]
+def _result_value(result: IndicatorResult) -> Dict[str, Any]:
+    return {
+        "perplexity_output": result.perplexity_output,
+        "citations": result.citations,
+        "indicator_value": result.indicator_value,
+        "maturity_score": result.maturity_score,
+    }
+
+
+async def async_stream_search_func(
+        city: str, 
+        indicators: List, 
+        maturity_levels: Optional[List[str]] = None, 
+        batch_extraction: bool = False,
+        group_size: Optional[int] = None
+) -> AsyncIterator[IndicatorResult]:
+    """
+    Pipelined search -> extraction over ``indicators``, yielding each result as soon as it is ready.
+
+    Results arrive in completion order; use ``IndicatorResult.index`` to map
+    them back to ``indicators``. Pending work is cancelled if the consumer
+    stops iterating early. When ``maturity_levels`` (one threshold string per
+    indicator) is given, maturity scores are computed locally from them. With
+    ``batch_extraction`` the extraction stage packs all outputs that are
+    ready into one structured call instead of one call per indicator. A
+    ``group_size`` above 1 asks Perplexity about that many indicators per
+    request (defaults to PERPLEXITY_GROUP_SIZE). Duplicate indicators share
+    one search, as do near-duplicates if DEDUP_MODE enables them (see
+    ``dedup.deduplicate_queries``).
+
+    Finished results are kept in the shared result store, keyed by city,
+    indicator, maturity scale, models and prompt version, so any session or
+    process asking for the same pair again gets the stored result. A pair
+    already being computed by another caller in this process is awaited
+    instead of searched again (single-flight).
+
+    Usage is attributed to the city and indicator of each request. When the
+    current job's ``usage.UsageMeter`` has spent its budget, no new search or
+    extraction call is started: the results already in flight are still
+    yielded, then ``usage.BudgetExhausted`` is raised.
+    """
+    indicators = list(indicators)
+    maturity_levels = list(maturity_levels) if maturity_levels is not None else [None] * len(indicators)
+    if RESULT_STORE_DISABLED:
+        async for result in _async_stream_search_pipeline(city, indicators, maturity_levels, batch_extraction, group_size):
+            yield result
+        return
+
+    store = get_result_store()
+    loop = asyncio.get_running_loop()
+    keys = [_result_key(city, indicator, levels) for indicator, levels in zip(indicators, maturity_levels)]
+
+    stored, waiting, owned, owned_futures = [], [], [], {}
+    for index, key in enumerate(keys):
+        if key in _inflight_results:
+            store.record_coalesced()
+            waiting.append((index, _inflight_results[key]))
+            continue
+        value = store.get(key)
+        if value is not None:
+            stored.append(IndicatorResult(index=index, indicator=indicators[index], **value))
+            continue
+        future = loop.create_future()
+        # Retrieve errors of futures nobody ends up waiting on
+        future.add_done_callback(lambda done: done.cancelled() or done.exception())
+        _inflight_results[key] = owned_futures[key] = future
+        owned.append(index)
+
+    queue = asyncio.Queue()
+
+    async def _run_owned():
+        async for result in _async_stream_search_pipeline(city, [indicators[index] for index in owned], [maturity_levels[index] for index in owned], batch_extraction, group_size):
+            index = owned[result.index]
+            value = _result_value(result)
+            store.set(keys[index], value)
+            owned_futures[keys[index]].set_result(value)
+            await queue.put(result._replace(index=index))
+
+    async def _run_waiting(index: int, future: asyncio.Future):
+        try:
+            value = await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if not future.cancelled():
+                raise
+            # The caller computing this pair went away, compute it here instead
+            async for result in _async_stream_search_pipeline(city, [indicators[index]], [maturity_levels[index]], batch_extraction):
+                value = _result_value(result)
+                store.set(keys[index], value)
+        await queue.put(IndicatorResult(index=index, indicator=indicators[index], **value))
+
+    done = object()
+
+    async def _produce(coro):
+        try:
+            await coro
+        except Exception as e:
+            await queue.put(e)
+        await queue.put(done)
+
+    producers = [asyncio.ensure_future(_produce(_run_waiting(index, future))) for index, future in waiting]
+    if owned:
+        producers.append(asyncio.ensure_future(_produce(_run_owned())))
+
+    exhausted = None
+    try:
+        for result in stored:
+            yield result
+        remaining = len(producers)
+        while remaining:
+            item = await queue.get()
+            if item is done:
+                remaining -= 1
+            elif isinstance(item, BudgetExhausted):
+                # Keep yielding the results still in flight, then report the budget stop
+                exhausted = item
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                yield item
+        if exhausted is not None:
+            raise exhausted
+    finally:
+        for producer in producers:
+            producer.cancel()
+        for key, future in owned_futures.items():
+            if not future.done():
+                future.cancel()
+            if _inflight_results.get(key) is future:
+                del _inflight_results[key]
+
+
+def _collect_results(results: List[IndicatorResult]):
+    """Order streamed results by indicator and split them into the ``search_func`` output lists"""
+    results = sorted(results, key=lambda result: result.index)
+
+    perplexity_outputs = [result.perplexity_output for result in results]
+    citations = [result.citations for result in results]
+    indicator_values = [result.indicator_value for result in results]
+    maturity_scores = [result.maturity_score for result in results]
 
     return perplexity_outputs, citations, indicator_values, maturity_scores
 
 
+async def async_search_func(city: str, indicators: List, maturity_levels: Optional[List[str]] = None, batch_extraction: bool = False, group_size: Optional[int] = None):
+    """
+    Async variant of ``search_func``, meant to run on the engine loop via ``run_async``.
 
+    Returns:
+        Tuple of (perplexity_outputs, citations, indicator_values, maturity_scores), ordered like ``indicators``
+    """
+    return _collect_results([result async for result in async_stream_search_func(city, indicators, maturity_levels, batch_extraction, group_size)])
 
-# Generate the spider diagram
-def create_spider_chart(indicators, values_dict, title):
+
+async def async_search_cities(cities: List[str], indicators: List, maturity_levels: Optional[List[str]] = None, batch_extraction: bool = False, group_size: Optional[int] = None):
     """
-    Creates an overlapping radar (spider) chart for multiple cities.
+    Run ``async_search_func`` for every city under the global concurrency limit.
 
-    Parameters:
-    - indicators: List of indicators.
-    - values_dict: Dictionary with city names as keys and list of values as values.
-    - title: Title of the chart.
+    Returns:
+        Dict mapping each city to its ``async_search_func`` result tuple
     """
-    import numpy as np
-    import matplotlib.pyplot as plt
+    results = await asyncio.gather(*[async_search_func(city, indicators, maturity_levels, batch_extraction, group_size) for city in cities])
+    return dict(zip(cities, results))
 
-    # Number of variables
-    num_vars = len(indicators)
-    
-    # Compute angle for each axis
-    angles = np.linspace(0, 2 * np.pi, num_vars, endpoint=False).tolist()
-    angles += angles[:1]  # Complete the circle
 
-    # Initialize the radar chart
-    fig, ax = plt.subplots(figsize=(8, 8), subplot_kw=dict(polar=True))
-    
-    # Plot data for each city
-    for city, values in values_dict.items():
-        # Complete the circle for each city
-        values += values[:1]
-        ax.plot(angles, values, linewidth=2, linestyle='solid', label=city)
-        ax.fill(angles, values, alpha=0.25)
-
-    # Add labels to the chart
-    ax.set_xticks(angles[:-1])
-    ax.set_xticklabels(indicators, fontsize=12)
-    ax.set_yticks([1, 2, 3, 4, 5])
-    ax.set_yticklabels(["1", "2", "3", "4", "5"], fontsize=10)
-    
-    # Add title
-    ax.set_title(title, fontsize=16, pad=20)
-    
-    # Add legend
-    ax.legend(loc='upper right', bbox_to_anchor=(0, 0), fontsize=10)
-    
-    # Add grid lines and make it visually appealing
-    ax.grid(color='gray', linestyle='--', linewidth=0.5)
-    ax.spines['polar'].set_visible(False)
+async def async_stream_search_cities(
+        city_indicators: Dict[str, Tuple[List, Optional[List[str]]]],
+        batch_extraction: bool = False,
+        group_size: Optional[int] = None
+) -> AsyncIterator[Tuple[str, IndicatorResult]]:
+    """
+    Run ``async_stream_search_func`` for several cities as one task graph, yielding (city, result) in completion order.
 
-    # Display the radar chart in Streamlit
-    st.pyplot(fig)
+    Every city's pipeline starts at once and shares the global concurrency
+    limit, so one slow city does not hold back the others. An error in any
+    city stops all of them, except ``usage.BudgetExhausted``: once the job's
+    budget is spent every city stops starting searches, the results still in
+    flight are yielded and BudgetExhausted is raised at the end.
 
+    Args:
+        city_indicators (Dict): Maps each city to its (indicators, maturity_levels)
+    """
+    queue = asyncio.Queue()
+    done = object()
 
-# indicators = ["Connectivity", "Sustainability", "Economy", "Healthcare", "Safety"]
-# values_dict = {
-#     "New York": [4, 3, 5, 4, 4],
-#     "Los Angeles": [3, 4, 4, 5, 3]
-# }
+    async def _run_city(city: str, indicators: List, maturity_levels: Optional[List[str]]):
+        try:
+            async for result in async_stream_search_func(city, indicators, maturity_levels, batch_extraction, group_size):
+                await queue.put((city, result))
+            await queue.put(done)
+        except Exception as e:
+            await queue.put(e)
+
+    tasks = [asyncio.ensure_future(_run_city(city, list(indicators), maturity_levels)) for city, (indicators, maturity_levels) in city_indicators.items()]
+    exhausted = None
+    try:
+        remaining = len(tasks)
+        while remaining:
+            item = await queue.get()
+            if item is done:
+                remaining -= 1
+            elif isinstance(item, BudgetExhausted):
+                exhausted = item
+                remaining -= 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                yield item
+    finally:
+        for task in tasks:
+            task.cancel()
+    if exhausted is not None:
+        raise exhausted
+
+
+def stream_search_cities(city_indicators: Dict[str, Tuple[List, Optional[List[str]]]], batch_extraction: bool = False, group_size: Optional[int] = None) -> Iterator[Tuple[str, IndicatorResult]]:
+    """Synchronous generator over ``async_stream_search_cities``"""
+    return iterate_async(async_stream_search_cities(city_indicators, batch_extraction, group_size))
+
+
+def search_cities(cities: List[str], indicators: List, maturity_levels: Optional[List[str]] = None, batch_extraction: bool = False, group_size: Optional[int] = None):
+    """Synchronous wrapper of ``async_search_cities`` for the Streamlit script thread"""
+    return run_async(async_search_cities(cities, list(indicators), maturity_levels, batch_extraction, group_size))
+
+
+def stream_search_func(city: str, indicators: List, maturity_levels: Optional[List[str]] = None, batch_extraction: bool = False, group_size: Optional[int] = None) -> Iterator[IndicatorResult]:
+    """Synchronous generator yielding an ``IndicatorResult`` per indicator as soon as it is extracted"""
+    return iterate_async(async_stream_search_func(city, list(indicators), maturity_levels, batch_extraction, group_size))
+
+
+def search_func(city: str, indicators: List, maturity_levels: Optional[List[str]] = None, batch_extraction: bool = False, group_size: Optional[int] = None):
+    # Run on the async engine instead of spawning a thread per indicator
+    return _collect_results(list(stream_search_func(city, indicators, maturity_levels, batch_extraction, group_size)))
 
-# create_spider_chart(indicators, values_dict, title="Comparative Radar Chart for Cities")
 
 #######################################
 ##### Web Indicators Class ############
@@ -689,33 +1740,143 @@ class Indicator(BaseModel):
     )
 
 
-def fetch_indicators_from_web(category: str):
+##################################
+##### Indicator List Cache #######
+##################################
+
+INDICATOR_LIST_MODEL = os.getenv("INDICATOR_LIST_MODEL", "gpt-4o")
+INDICATOR_LIST_SINGLE_CALL = os.getenv("INDICATOR_LIST_SINGLE_CALL", "true").lower() in ("1", "true")
+INDICATOR_PINS_PATH = os.getenv("INDICATOR_PINS_PATH", "indicator_pins.json")
+
+# Changes whenever the generation prompt or output schema changes, so stale lists are never served
+INDICATOR_LIST_VERSION = make_cache_key(prompt=find_indicators_prompt, schema=WebIndicators.model_json_schema())[:12]
+
+_pins_lock = threading.Lock()
+
+
+def normalize_category(category: str) -> str:
+    """Case- and whitespace-insensitive form of a category name"""
+    return " ".join(category.lower().split())
+
+
+def _indicator_list_cache_key(category: str, model: str) -> str:
+    return make_cache_key(kind="indicator_list", category=normalize_category(category), model=model, endpoint=openai_base_url(), version=INDICATOR_LIST_VERSION)
+
+
+def _load_pins() -> Dict[str, Dict[str, List[str]]]:
+    try:
+        with open(INDICATOR_PINS_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        logging.getLogger(__name__).warning(f"_load_pins: {INDICATOR_PINS_PATH} is corrupt, ignoring the pins: {e}")
+        return {}
+
+
+def _save_pins(pins: Dict[str, Dict[str, List[str]]]):
+    """Write the pins file atomically, so concurrent readers never see a partial file; called with ``_pins_lock`` held"""
+    tmp_path = f"{INDICATOR_PINS_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(pins, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, INDICATOR_PINS_PATH)
+
+
+def pin_indicator_list(category: str, indicator_list: Optional[List[str]] = None, maturity_levels_list: Optional[List[str]] = None):
+    """
+    Pin the indicator list of ``category`` so every later call returns exactly this list.
+
+    Without explicit lists, the currently generated (or cached) list is pinned.
+    Pins are stored in INDICATOR_PINS_PATH and never expire.
+    """
+    if indicator_list is None:
+        indicator_list, maturity_levels_list = fetch_indicators_from_web(category)
+    with _pins_lock:
+        pins = _load_pins()
+        pins[normalize_category(category)] = {"indicator_list": list(indicator_list), "maturity_levels_list": list(maturity_levels_list)}
+        _save_pins(pins)
+
+
+def unpin_indicator_list(category: str):
+    """Remove the pin of ``category``, if any"""
+    with _pins_lock:
+        pins = _load_pins()
+        if pins.pop(normalize_category(category), None) is not None:
+            _save_pins(pins)
+
+
+def _generate_indicator_list(category: str, model: str, single_call: bool) -> WebIndicators:
+    """Ask the LLM for the indicators of ``category``, in one structured call or as text followed by extraction"""
+    structured_llm = get_structured_llm(WebIndicators, model=model)
+
+    if single_call:
+        return invoke_llm(structured_llm, [HumanMessage(content=find_indicators_prompt.format(category=category) + "\nReturn the indicators and, in the same order, one maturity scale per indicator.")])
+
     user_prompt = find_indicators_prompt.format(category=category)
 
     # Invoke the LLM to generate query
-    indicator_list = llm.invoke([user_prompt])
-
-    # Structured LLM
-    structured_llm = llm.with_structured_output(WebIndicators)
+    indicator_list = invoke_llm(get_chat_model(model), [user_prompt])
 
     # Invoke the LLM to get the list of economic levers
-    web_indicators = structured_llm.invoke([HumanMessage(content=f"Extract the list of indicators and the list of their maturity scores from the output:\n {indicator_list.content}")])
+    return invoke_llm(structured_llm, [HumanMessage(content=f"Extract the list of indicators and the list of their maturity scores from the output:\n {indicator_list.content}")])
 
-    return web_indicators.indicator_list, web_indicators.maturity_levels_list
+
+def fetch_indicators_from_web(category: str, use_cache: bool = True, single_call: Optional[bool] = None, model: str = INDICATOR_LIST_MODEL):
+    """
+    Indicators of ``category`` and their maturity scales.
+
+    Pinned lists are returned as is. Otherwise generated lists are cached per
+    normalized category, model and prompt version in the search cache, so
+    repeated clicks for the same category cost no LLM call. On a miss the
+    list is generated with a single structured call unless ``single_call``
+    is False (defaults to INDICATOR_LIST_SINGLE_CALL).
+
+    Returns:
+        Tuple of (indicator_list, maturity_levels_list)
+    """
+    with span("indicators.generate", category=category) as generation:
+        pinned = _load_pins().get(normalize_category(category))
+        if pinned is not None:
+            generation.set(source="pinned")
+            return pinned["indicator_list"], pinned["maturity_levels_list"]
+
+        cache = get_search_cache() if use_cache else None
+        cache_key = _indicator_list_cache_key(category, model)
+        if cache is not None:
+            cached = cache.get(cache_key)
+            if cached is not None:
+                generation.set(source="cache")
+                return cached["indicator_list"], cached["maturity_levels_list"]
+
+        generation.set(source="generated")
+        web_indicators = _generate_indicator_list(category, model, INDICATOR_LIST_SINGLE_CALL if single_call is None else single_call)
+
+        # A scale is required per indicator for local scoring; drop unmatched tails
+        count = min(len(web_indicators.indicator_list), len(web_indicators.maturity_levels_list))
+        indicator_list, maturity_levels_list = web_indicators.indicator_list[:count], web_indicators.maturity_levels_list[:count]
+
+        if cache is not None and count:
+            cache.set(cache_key, {"indicator_list": indicator_list, "maturity_levels_list": maturity_levels_list})
+        return indicator_list, maturity_levels_list
 
 
 def fetch_indicator(category: str):
     # Structured LLM
-    structured_llm = llm.with_structured_output(Indicator)
+    structured_llm = get_structured_llm(Indicator)
 
     # Invoke the LLM to get the list of economic levers
-    indicator = structured_llm.invoke([SystemMessage(find_indicator_prompt.format(category=category))])
+    indicator = invoke_llm(structured_llm, [SystemMessage(find_indicator_prompt.format(category=category))])
 
     return indicator.indicator, indicator.maturity_level
 
 
 def check_for_data(df: pd.DataFrame, city: str):
-    perplexity_results, citations, indicator_values, maturity_scores = search_func(city, df["Indicator"].unique())
+    # Score locally against each indicator's thresholds when the catalogue provides them
+    df = df.drop_duplicates(subset="Indicator").copy()
+    maturity_levels = list(df["Maturity Assessment (1-5)"]) if "Maturity Assessment (1-5)" in df.columns else None
+
+    # Screening covers the whole indicator list, so pack the extractions into batched calls
+    perplexity_results, citations, indicator_values, maturity_scores = search_func(city, list(df["Indicator"]), maturity_levels, batch_extraction=True)
     df["Maturity Score"] = maturity_scores
     df["Perplexity Output"] = perplexity_results
     df["Indicator Values"] = indicator_values
@@ -727,5 +1888,3 @@ def check_for_data(df: pd.DataFrame, city: str):
     # top_indicators_df = filtered_df.sort_values(by='Maturity Score', ascending=ascending).head(5)
 
     return top_filtered_df
-
-
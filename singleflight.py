@@ -0,0 +1,166 @@
+####################
+##### Imports ######
+####################
+
+import os
+import asyncio
+import logging
+import threading
+
+from concurrent.futures import Future
+from typing import Dict, Any, Callable, Awaitable, Tuple
+
+logger = logging.getLogger(__name__)
+
+###########################
+##### Single Flight #######
+###########################
+
+SINGLEFLIGHT_DISABLED = os.getenv("SINGLEFLIGHT_DISABLED", "").lower() in ("1", "true")
+
+
+class _Abandoned(Exception):
+    """The caller executing a call went away before it finished"""
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        """
+        In-process request coalescing for one kind of API call.
+
+        While a call for a key is in flight, every other caller asking for the
+        same key waits for its result instead of sending the request again.
+        Sync and async callers share the same in-flight calls. Callers receive
+        the same result object, so it must not be mutated.
+
+        If the executing caller is cancelled (or interrupted) before the call
+        finishes, the waiting callers are not failed: one of them takes over
+        and executes the call itself. Errors of a finished call are raised in
+        every caller.
+
+        Args:
+            name (str): Name of the call kind, used in logs and metrics
+        """
+        self.name = name
+        self._calls: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+        self.calls = 0
+        self.executed = 0
+        self.coalesced = 0
+        self.abandoned = 0
+
+
+    def _join(self, key: str) -> Tuple[Future, bool]:
+        """Future of the call in flight for ``key`` and whether this caller must execute it"""
+        with self._lock:
+            self.calls += 1
+            future = self._calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = self._calls[key] = Future()
+            self.executed += 1
+            return future, True
+
+
+    def _settle(self, key: str, future: Future, result: Any = None, error: BaseException = None):
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+            if isinstance(error, _Abandoned):
+                self.abandoned += 1
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+
+    def do(self, key: str, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Return ``fn(*args, **kwargs)``, sharing the call with concurrent callers of the same key.
+
+        Args:
+            key (str): Request key, e.g. from ``cache.make_cache_key``
+            fn (Callable): Function executing the request
+        """
+        if SINGLEFLIGHT_DISABLED:
+            return fn(*args, **kwargs)
+        while True:
+            future, leader = self._join(key)
+            if leader:
+                try:
+                    result = fn(*args, **kwargs)
+                except Exception as e:
+                    self._settle(key, future, error=e)
+                    raise
+                except BaseException:
+                    self._settle(key, future, error=_Abandoned())
+                    raise
+                self._settle(key, future, result=result)
+                return result
+            try:
+                return future.result()
+            except _Abandoned:
+                logger.info(f"SingleFlight: {self.name} call abandoned by its caller, retrying")
+
+
+    async def ado(self, key: str, fn: Callable[..., Awaitable], *args, **kwargs) -> Any:
+        """Async variant of ``do`` for a coroutine function ``fn``"""
+        if SINGLEFLIGHT_DISABLED:
+            return await fn(*args, **kwargs)
+        while True:
+            future, leader = self._join(key)
+            if leader:
+                try:
+                    result = await fn(*args, **kwargs)
+                except Exception as e:
+                    self._settle(key, future, error=e)
+                    raise
+                except BaseException:
+                    self._settle(key, future, error=_Abandoned())
+                    raise
+                self._settle(key, future, result=result)
+                return result
+            try:
+                # Shielded so that cancelling this caller does not cancel the shared call
+                return await asyncio.shield(asyncio.wrap_future(future))
+            except _Abandoned:
+                logger.info(f"SingleFlight: {self.name} call abandoned by its caller, retrying")
+
+
+    def stats(self) -> Dict[str, Any]:
+        """Return call, execution and coalescing counters"""
+        with self._lock:
+            stats = {
+                "calls": self.calls,
+                "executed": self.executed,
+                "coalesced": self.coalesced,
+                "abandoned": self.abandoned,
+                "in_flight": len(self._calls),
+            }
+        stats["coalesced_rate"] = stats["coalesced"] / stats["calls"] if stats["calls"] else 0.0
+        return stats
+
+
+##########################
+##### Registry ###########
+##########################
+
+_flights: Dict[str, SingleFlight] = {}
+_flights_lock = threading.Lock()
+
+
+def get_single_flight(name: str) -> SingleFlight:
+    """Return the process-wide single-flight group of ``name`` ('perplexity', 'openai' or 'llm')"""
+    with _flights_lock:
+        if name not in _flights:
+            _flights[name] = SingleFlight(name)
+        return _flights[name]
+
+
+def singleflight_stats() -> Dict[str, Dict[str, Any]]:
+    """Counters of every single-flight group created so far"""
+    with _flights_lock:
+        flights = list(_flights.values())
+    return {flight.name: flight.stats() for flight in flights}
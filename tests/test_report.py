@@ -0,0 +1,27 @@
+from report import parse_toc, flatten
+
+
+def test_bold_section_after_query_block_starts_a_section():
+    toc = (
+        "9. **Governance**\n"
+        "9.1 Institutions\n"
+        "Example Queries:\n"
+        " 1. Who runs the city's digital agency?\n"
+        "10. **Synthesis**\n"
+        " 10.1 Key Findings\n"
+        " - Overall maturity\n"
+    )
+    roots = parse_toc(toc)
+
+    assert [(section.number, section.title) for section in roots] == [("9", "Governance"), ("10", "Synthesis")]
+    assert [child.number for child in roots[1].children] == ["10.1"]
+    institutions = roots[0].children[0]
+    assert institutions.queries == ["Who runs the city's digital agency?"]
+    assert all("Synthesis" not in query for section in flatten(roots) for query in section.queries)
+
+
+def test_plain_numbered_lines_in_query_block_are_queries():
+    roots = parse_toc("1. **Economy**\nExample Queries:\n1. GDP per capita of Cairo\n2. Unemployment rate of Cairo\n")
+
+    assert len(roots) == 1
+    assert roots[0].queries == ["GDP per capita of Cairo", "Unemployment rate of Cairo"]
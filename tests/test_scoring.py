@@ -0,0 +1,30 @@
+import math
+
+from scoring import _parse_band, parse_maturity_levels, score_values
+
+
+def test_per_unit_numbers_are_not_thresholds():
+    scale = "1: <10 per 100,000 inhabitants, 2: 10-20, 3: 21-30, 4: 31-40, 5: >40"
+    bands = parse_maturity_levels(scale)
+
+    assert bands is not None and bands.ascending
+    assert (bands.bands[0].low, bands.bands[0].high) == (-math.inf, 10)
+    assert score_values([5, 15, 50], scale).tolist() == [1, 2, 5]
+
+
+def test_parenthesised_unit_text_is_ignored():
+    scale = "1: <5 (per 1000 people), 2: 5-10, 3: 11-20, 4: 21-30, 5: >30 (per 1000 people)"
+
+    assert score_values([2, 7, 40], scale).tolist() == [1, 2, 5]
+
+
+def test_thresholds_in_parentheses_are_kept():
+    band = _parse_band(2, "Low (10-25%)")
+
+    assert (band.low, band.high) == (10, 25)
+
+
+def test_descending_scale_and_missing_values():
+    scale = "1: >55, 2: 41-55, 3: 26-40, 4: 10-25, 5: <10"
+
+    assert score_values([60, 30, 5, float("nan")], scale).tolist() == [1, 3, 5, 0]
@@ -0,0 +1,362 @@
+####################
+##### Imports ######
+####################
+
+import os
+import sys
+import json
+import time
+import uuid
+import asyncio
+import logging
+import threading
+import contextvars
+
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Dict, Any, List, Callable, Iterator, Awaitable
+
+from logconfig import route_to_writer
+
+logger = logging.getLogger(__name__)
+
+##########################
+##### Spans ##############
+##########################
+
+TRACING_DISABLED = os.getenv("TRACING_DISABLED", "").lower() in ("1", "true")
+TRACE_PATH = os.getenv("TRACE_PATH", "traces.jsonl")
+# Logger whose records carry finished spans to the trace file
+TRACE_LOGGER = "traces"
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0)) or None
+
+# Upper bounds of the span duration histogram buckets, in seconds
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    def __init__(self, name: str, parent: Optional["Span"] = None, attributes: Optional[Dict[str, Any]] = None):
+        """
+        One timed stage of the pipeline.
+
+        Spans nest through a context variable, so a span started inside
+        another (in the same thread or in an asyncio task created under it)
+        becomes its child and shares its trace id.
+
+        Args:
+            name (str): Stage name such as 'search' or 'extraction'
+            parent (Span, optional): Enclosing span
+            attributes (dict, optional): Static attributes such as city and indicator
+        """
+        self.name = name
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex[:16]
+        self.span_id = uuid.uuid4().hex[:16]
+        self.attributes = dict(attributes or {})
+        self.counters: Dict[str, float] = {}
+        self.status = "ok"
+        self.error = None
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.duration = None
+
+
+    def set(self, **attributes):
+        """Set attributes discovered while the span runs"""
+        self.attributes.update(attributes)
+
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent.span_id if self.parent else None,
+            "name": self.name,
+            "start": self.started_at,
+            "duration_s": round(self.duration, 6) if self.duration is not None else None,
+            "status": self.status,
+            "error": self.error,
+            "attributes": dict(self.attributes),
+            "counters": {name: round(value, 6) for name, value in self.counters.items()},
+        }
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def record(name: str, amount: float = 1):
+    """
+    Add ``amount`` to counter ``name`` of the current span and all its ancestors.
+
+    Counters are retries, queue wait seconds and tokens; summing them up the
+    tree makes e.g. a (city, indicator) span carry the totals of its requests.
+    """
+    span_ = _current_span.get()
+    while span_ is not None:
+        span_.counters[name] = span_.counters.get(name, 0) + amount
+        span_ = span_.parent
+
+
+def counted(name: str, callback: Callable) -> Callable:
+    """Wrap ``callback`` so that every call also records 1 in counter ``name``, e.g. tenacity's ``before_sleep`` for retries"""
+    @wraps(callback)
+    def wrapper(*args, **kwargs):
+        record(name)
+        return callback(*args, **kwargs)
+    return wrapper
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Optional[Span]]:
+    """Time the enclosed block as span ``name`` and yield the span"""
+    if TRACING_DISABLED:
+        # A detached span that is neither current nor exported
+        yield Span(name, None, attributes)
+        return
+
+    span_ = Span(name, _current_span.get(), attributes)
+    token = _current_span.set(span_)
+    try:
+        yield span_
+    except asyncio.CancelledError:
+        span_.status = "cancelled"
+        raise
+    except BaseException as e:
+        span_.status = "error"
+        span_.error = f"{type(e).__name__}: {e}"[:500]
+        raise
+    finally:
+        span_.duration = time.perf_counter() - span_._start
+        _current_span.reset(token)
+        get_exporter().export(span_)
+
+
+def traced(name: Optional[str] = None, **attributes):
+    """Decorator recording every call of a sync or async function as a span"""
+    def decorator(func):
+        span_name = name or func.__name__
+        if asyncio.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name, **attributes):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name, **attributes):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+async def within(parent: Optional[Span], awaitable: Awaitable):
+    """Await ``awaitable`` with ``parent`` as the current span, to carry a trace onto another thread's event loop"""
+    token = _current_span.set(parent)
+    try:
+        return await awaitable
+    finally:
+        _current_span.reset(token)
+
+
+##########################
+##### Export #############
+##########################
+
+class _SpanFormatter(logging.Formatter):
+    """Serializes the span dict carried by a trace record as one JSON line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps(record.msg, default=str)
+
+
+class SpanExporter:
+    def __init__(self, path: Optional[str] = TRACE_PATH):
+        """
+        Writes finished spans to a JSONL trace file and aggregates them for ``prometheus_text``.
+
+        Spans reach the file through the bounded queue and writer thread of the
+        logging pipeline (``logconfig.route_to_writer``), so ``export`` only
+        updates the aggregates and enqueues the span. Spans are dropped from
+        the file, but not from the aggregates, when the queue is full.
+
+        Args:
+            path (str, optional): Trace file, appended to; None keeps only the aggregates
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._trace_logger = None
+        if path:
+            handler = logging.FileHandler(path, encoding="utf-8", delay=True)
+            handler.setFormatter(_SpanFormatter())
+            self._trace_logger = route_to_writer(TRACE_LOGGER, handler)
+
+        # Per span name: count, errors, duration sum, bucket counts and counter sums
+        self.aggregates: Dict[str, Dict[str, Any]] = {}
+
+
+    def export(self, span_: Span):
+        with self._lock:
+            aggregate = self.aggregates.setdefault(span_.name, {
+                "count": 0, "errors": 0, "sum": 0.0, "buckets": [0] * len(DURATION_BUCKETS), "counters": {}
+            })
+            aggregate["count"] += 1
+            aggregate["errors"] += span_.status == "error"
+            aggregate["sum"] += span_.duration
+            for position, bound in enumerate(DURATION_BUCKETS):
+                if span_.duration <= bound:
+                    aggregate["buckets"][position] += 1
+            for name, value in span_.counters.items():
+                aggregate["counters"][name] = aggregate["counters"].get(name, 0) + value
+
+        if self._trace_logger is not None:
+            # Serialized to JSON on the writer thread
+            self._trace_logger.info(span_.to_dict())
+
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return json.loads(json.dumps(self.aggregates))
+
+
+_exporter = None
+_exporter_lock = threading.Lock()
+
+
+def get_exporter() -> SpanExporter:
+    """Return the process-wide span exporter"""
+    global _exporter
+    with _exporter_lock:
+        if _exporter is None:
+            _exporter = SpanExporter()
+        return _exporter
+
+
+##########################
+##### Prometheus #########
+##########################
+
+METRIC_PREFIX = "smartcity"
+
+
+def _label(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", " ")
+
+
+def _gauges(lines: List[str], name: str, stats: Dict[str, Any], labels: str = ""):
+    """Append every numeric entry of ``stats`` as a gauge ``<prefix>_<name>_<key>``"""
+    for key, value in stats.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        lines.append(f"{METRIC_PREFIX}_{name}_{key}{{{labels}}} {value}" if labels else f"{METRIC_PREFIX}_{name}_{key} {value}")
+
+
+def _component_stats(lines: List[str]):
+    """Counters of the caches, rate limiters, clients, queues and API usage, for the modules already loaded"""
+    modules = sys.modules
+    if "ratelimit" in modules:
+        for provider, limiter in list(modules["ratelimit"]._rate_limiters.items()):
+            _gauges(lines, "rate_limiter", limiter.stats(), f'provider="{_label(provider)}"')
+    if "cache" in modules:
+        cache = modules["cache"]
+        for store_name, store in (("search_cache", cache._default_cache), ("result_store", cache._default_result_store)):
+            if store is not None:
+                _gauges(lines, store_name, store.stats())
+    if "singleflight" in modules:
+        for group, stats in modules["singleflight"].singleflight_stats().items():
+            _gauges(lines, "singleflight", stats, f'group="{_label(group)}"')
+    if "dedup" in modules:
+        _gauges(lines, "dedup", modules["dedup"].dedup_stats())
+    if "clients" in modules:
+        _gauges(lines, "clients", modules["clients"].client_registry_stats())
+    if "utils" in modules:
+        _gauges(lines, "streaming", modules["utils"].streaming_stats())
+    if "logconfig" in modules:
+        _gauges(lines, "logging", modules["logconfig"].logging_stats())
+    if "charts" in modules:
+        _gauges(lines, "charts", modules["charts"].chart_stats())
+    if "usage" in modules:
+        for provider, stats in modules["usage"].usage_stats().items():
+            _gauges(lines, "usage", stats, f'provider="{_label(provider)}"')
+    if "workers" in modules and modules["workers"]._default_queue is not None:
+        for state, number in modules["workers"]._default_queue.stats().items():
+            lines.append(f'{METRIC_PREFIX}_jobs{{state="{state}"}} {number}')
+
+
+def prometheus_text() -> str:
+    """Span histograms and component counters in the Prometheus text exposition format"""
+    lines = [
+        f"# HELP {METRIC_PREFIX}_span_duration_seconds Duration of pipeline stages",
+        f"# TYPE {METRIC_PREFIX}_span_duration_seconds histogram",
+    ]
+    aggregates = get_exporter().snapshot()
+    for name, aggregate in sorted(aggregates.items()):
+        labels = f'span="{_label(name)}"'
+        for bound, number in zip(DURATION_BUCKETS, aggregate["buckets"]):
+            lines.append(f'{METRIC_PREFIX}_span_duration_seconds_bucket{{{labels},le="{bound}"}} {number}')
+        lines.append(f'{METRIC_PREFIX}_span_duration_seconds_bucket{{{labels},le="+Inf"}} {aggregate["count"]}')
+        lines.append(f"{METRIC_PREFIX}_span_duration_seconds_sum{{{labels}}} {aggregate['sum']}")
+        lines.append(f"{METRIC_PREFIX}_span_duration_seconds_count{{{labels}}} {aggregate['count']}")
+
+    lines.append(f"# TYPE {METRIC_PREFIX}_span_errors_total counter")
+    for name, aggregate in sorted(aggregates.items()):
+        lines.append(f'{METRIC_PREFIX}_span_errors_total{{span="{_label(name)}"}} {aggregate["errors"]}')
+
+    lines.append(f"# TYPE {METRIC_PREFIX}_span_counter_total counter")
+    for name, aggregate in sorted(aggregates.items()):
+        for counter, value in sorted(aggregate["counters"].items()):
+            lines.append(f'{METRIC_PREFIX}_span_counter_total{{span="{_label(name)}",counter="{_label(counter)}"}} {value}')
+
+    _component_stats(lines)
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        payload = prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+_metrics_server = None
+_metrics_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: Optional[int] = METRICS_PORT) -> Optional[int]:
+    """
+    Serve ``prometheus_text`` at http://0.0.0.0:<port>/metrics on a daemon thread.
+
+    Safe to call on every Streamlit rerun: the server is started once per
+    process. Does nothing when no port is configured (METRICS_PORT).
+
+    Returns:
+        int: Port the server listens on, or None
+    """
+    global _metrics_server
+    if not port:
+        return None
+    with _metrics_server_lock:
+        if _metrics_server is None:
+            try:
+                _metrics_server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+            except OSError as e:
+                logger.warning(f"start_metrics_server: Could not listen on port {port}: {e}")
+                return None
+            _metrics_server.daemon_threads = True
+            threading.Thread(target=_metrics_server.serve_forever, name="metrics-server", daemon=True).start()
+            logger.info(f"start_metrics_server: Serving metrics on port {_metrics_server.server_port}")
+        return _metrics_server.server_port
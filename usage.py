@@ -0,0 +1,222 @@
+####################
+##### Imports ######
+####################
+
+import os
+import json
+import logging
+import threading
+import contextvars
+
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, List, Tuple, Iterator, Awaitable
+
+from tracing import record
+
+logger = logging.getLogger(__name__)
+
+##########################
+##### Prices #############
+##########################
+
+# USD per million prompt and completion tokens, plus a flat fee per request (Perplexity's search fee).
+# Overridden or extended with MODEL_PRICES, a JSON object {model: [prompt, completion, request]}
+MODEL_PRICES: Dict[str, Tuple[float, float, float]] = {
+    "o1-mini": (1.10, 4.40, 0.0),
+    "o3-mini": (1.10, 4.40, 0.0),
+    "o1": (15.00, 60.00, 0.0),
+    "gpt-4o-mini": (0.15, 0.60, 0.0),
+    "gpt-4o": (2.50, 10.00, 0.0),
+    "gpt-4.1-mini": (0.40, 1.60, 0.0),
+    "gpt-4.1": (2.00, 8.00, 0.0),
+    "sonar-reasoning-pro": (2.00, 8.00, 0.006),
+    "sonar-reasoning": (1.00, 5.00, 0.005),
+    "sonar-pro": (3.00, 15.00, 0.006),
+    "sonar": (1.00, 1.00, 0.005),
+}
+MODEL_PRICES.update({model: tuple(prices) for model, prices in json.loads(os.getenv("MODEL_PRICES", "{}")).items()})
+
+_unpriced_models = set()
+
+
+def cost_of(model: Optional[str], prompt_tokens: float, completion_tokens: float, requests: int = 1) -> float:
+    """
+    Cost in USD of a request, priced by the longest model name in MODEL_PRICES that ``model`` starts with.
+
+    Dated model names such as 'gpt-4o-2024-08-06' use the price of their
+    base model. Unknown models cost 0 and are logged once.
+    """
+    model = model or ""
+    matches = [name for name in MODEL_PRICES if model.startswith(name)]
+    if not matches:
+        if model not in _unpriced_models:
+            _unpriced_models.add(model)
+            logger.warning(f"cost_of: No price for model '{model}', counting its tokens at no cost")
+        return 0.0
+    prompt_price, completion_price, request_price = MODEL_PRICES[max(matches, key=len)]
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1e6 + requests * request_price
+
+
+##########################
+##### Usage Meters #######
+##########################
+
+class BudgetExhausted(Exception):
+    """The cost budget of the current job is spent, so no new searches or extractions are started"""
+
+
+class UsageMeter:
+    def __init__(self, budget_usd: Optional[float] = None, spent_usd: float = 0.0):
+        """
+        Token and cost totals of one job, per (city, indicator) and model.
+
+        A request covering several indicators (a grouped search or a batched
+        extraction) is split evenly across them. Once the spend reaches
+        ``budget_usd`` the meter is exhausted and ``check_budget`` stops new
+        searches and extraction calls; requests already in flight still
+        finish and are counted. Their cost is only known when they return, so
+        a job can overshoot its budget by the calls in flight at that moment,
+        at most one per concurrency slot (SEARCH_MAX_CONCURRENCY).
+
+        Args:
+            budget_usd (float, optional): Spend limit in USD, None for no limit
+            spent_usd (float): Spend carried over from earlier runs of the same job
+        """
+        self.budget_usd = budget_usd
+        self.spent_usd = spent_usd
+        self._lock = threading.Lock()
+
+        # (city, indicator, provider, model) -> [requests, prompt_tokens, completion_tokens, cost_usd], since the last drain
+        self._pending: Dict[Tuple[str, str, str, str], List[float]] = {}
+
+
+    @property
+    def exhausted(self) -> bool:
+        return self.budget_usd is not None and self.spent_usd >= self.budget_usd
+
+
+    def add(self, city: Optional[str], indicators: Tuple[str, ...], provider: str, model: str, prompt_tokens: float, completion_tokens: float, cost: float):
+        shares = indicators or ("",)
+        with self._lock:
+            self.spent_usd += cost
+            for indicator in shares:
+                totals = self._pending.setdefault((city or "", indicator, provider, model), [0.0, 0.0, 0.0, 0.0])
+                for position, amount in enumerate((1, prompt_tokens, completion_tokens, cost)):
+                    totals[position] += amount / len(shares)
+
+
+    def drain(self) -> List[Dict[str, Any]]:
+        """Usage recorded since the last drain, as rows for ``JobStore.record_usage``"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return [
+            {"city": city, "indicator": indicator, "provider": provider, "model": model,
+             "requests": requests, "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "cost_usd": cost}
+            for (city, indicator, provider, model), (requests, prompt_tokens, completion_tokens, cost) in pending.items()
+        ]
+
+
+class _Scope:
+    """Meter and (city, indicators) labels that requests are attributed to"""
+
+    def __init__(self, meter: Optional[UsageMeter] = None, city: Optional[str] = None, indicators: Tuple[str, ...] = ()):
+        self.meter = meter
+        self.city = city
+        self.indicators = indicators
+
+
+_current_scope = contextvars.ContextVar("usage_scope", default=_Scope())
+
+
+@contextmanager
+def metered(meter: Optional[UsageMeter]) -> Iterator[Optional[UsageMeter]]:
+    """Attribute the usage of the enclosed block to ``meter``"""
+    token = _current_scope.set(_Scope(meter))
+    try:
+        yield meter
+    finally:
+        _current_scope.reset(token)
+
+
+@contextmanager
+def usage_scope(city: Optional[str] = None, indicator: Optional[str] = None, indicators: Optional[List[str]] = None):
+    """Attribute the usage of the enclosed block to ``city`` and one or several indicators, within the current meter"""
+    parent = _current_scope.get()
+    labels = (indicator,) if indicator is not None else tuple(indicators or parent.indicators)
+    token = _current_scope.set(_Scope(parent.meter, city or parent.city, labels))
+    try:
+        yield
+    finally:
+        _current_scope.reset(token)
+
+
+def current_meter() -> Optional[UsageMeter]:
+    return _current_scope.get().meter
+
+
+async def within_meter(meter: Optional[UsageMeter], awaitable: Awaitable):
+    """Await ``awaitable`` under ``meter``, to carry a job's meter onto the engine loop (like ``tracing.within``)"""
+    with metered(meter):
+        return await awaitable
+
+
+def check_budget():
+    """
+    Raise BudgetExhausted if the meter of the current job has spent its budget.
+
+    Called before every search and extraction call. Calls that passed the
+    check before the budget ran out still complete, so a job can overshoot
+    its budget by the cost of the calls of its tasks in flight.
+    """
+    meter = _current_scope.get().meter
+    if meter is not None and meter.exhausted:
+        raise BudgetExhausted(f"Budget of ${meter.budget_usd:.2f} exhausted (${meter.spent_usd:.2f} spent)")
+
+
+##########################
+##### Recording ##########
+##########################
+
+_totals: Dict[str, Dict[str, float]] = {}
+_totals_lock = threading.Lock()
+
+
+def record_usage(provider: str, model: Optional[str], prompt_tokens: Optional[float], completion_tokens: Optional[float]) -> float:
+    """
+    Record the token usage of one API response and return its cost in USD.
+
+    The usage is added to the process totals (``usage_stats``), to the
+    counters of the current trace span and to the current job's meter,
+    under the current city and indicators.
+
+    Args:
+        provider (str): 'perplexity' or 'openai'
+        model (str): Model name reported by the response
+        prompt_tokens (float): Prompt tokens reported by the response
+        completion_tokens (float): Completion tokens reported by the response
+    """
+    prompt_tokens, completion_tokens = prompt_tokens or 0, completion_tokens or 0
+    model = model or ""
+    cost = cost_of(model, prompt_tokens, completion_tokens)
+
+    record("prompt_tokens", prompt_tokens)
+    record("completion_tokens", completion_tokens)
+    record("cost_usd", cost)
+
+    with _totals_lock:
+        totals = _totals.setdefault(provider, {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0})
+        totals["requests"] += 1
+        totals["prompt_tokens"] += prompt_tokens
+        totals["completion_tokens"] += completion_tokens
+        totals["cost_usd"] += cost
+
+    scope = _current_scope.get()
+    if scope.meter is not None:
+        scope.meter.add(scope.city, scope.indicators, provider, model, prompt_tokens, completion_tokens, cost)
+    return cost
+
+
+def usage_stats() -> Dict[str, Dict[str, float]]:
+    """Requests, tokens and cost per provider since start-up"""
+    with _totals_lock:
+        return {provider: dict(totals) for provider, totals in _totals.items()}
@@ -2,14 +2,12 @@
 ### Import Packages
 ##################################
 import os
-import json
+import time
 import logging
-import requests
-import openai
+import threading
 
-from logging.handlers import RotatingFileHandler
 from functools import wraps
-from bs4 import BeautifulSoup
+from collections import deque
 
 
 from tenacity import (
@@ -20,24 +18,18 @@ from tenacity import (
     before_sleep_log,
     after_log
 )
-from typing import Optional, Dict, Any, Tuple, List
+from typing import Optional, Dict, Any, Tuple, List, Iterator
 from requests.exceptions import ConnectionError, Timeout, RequestException
 
-
-from selenium.common.exceptions import WebDriverException 
-from pathlib import Path
-from llama_parse import LlamaParse
-from urllib.parse import urlparse, unquote
-from urllib3.exceptions import ReadTimeoutError
-
-
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import SystemMessage, HumanMessage
-
-import nest_asyncio
-nest_asyncio.apply()
-
+# Heavy SDKs (openai, langchain) are imported lazily by the client registry on first use
 from prompts import ppp_framework_prompt, stakeholder_prompt
+from ratelimit import get_rate_limiter, estimate_tokens
+from clients import get_openai_client
+from cache import make_cache_key
+from singleflight import get_single_flight
+from tracing import span, counted
+from usage import record_usage
+from logconfig import configure_logging, log_payload
 
 from dotenv import load_dotenv
 load_dotenv()
@@ -52,29 +44,23 @@ load_dotenv()
 ### Logging Configuration
 ##################################
 
-# Configure logging
-log_file = "app.log"
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(name)s - %(funcName)s - %(message)s",
-    handlers=[
-        # logging.StreamHandler(),
-        RotatingFileHandler(log_file, maxBytes=5*1024*1024, backupCount=10)  # 5MB files
-    ]
-)
+# Configure logging: records go through a queue to a writer thread writing app.log (see logconfig.py)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 # Decorator to log function inputs and outputs
 def log_function_call(func):
     @wraps(func)
     def wrapper(*args, **kwargs):
-        # Log input arguments
-        logger.info(f"Calling function: {func.__name__}, args: {args}, kwargs: {kwargs}")
+        # Log input arguments, size-bounded so multi-KB prompts are not written in full
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(f"Calling function: {func.__name__}, args: {log_payload(args)}, kwargs: {log_payload(kwargs)}")
         try:
             # Call the function
             result = func(*args, **kwargs)
             # Log the result
-            logger.info(f"Function {func.__name__} returned: {result}")
+            if logger.isEnabledFor(logging.INFO):
+                logger.info(f"Function {func.__name__} returned: {log_payload(result)}")
             return result
         except Exception as e:
             # Log exceptions
@@ -100,7 +86,7 @@ my_retry_decorator = retry(
     retry=retry_if_exception_type(
         (ConnectionError, Timeout, RequestException)
     ),
-    before_sleep=before_sleep_log(logger, logging.WARNING),
+    before_sleep=counted("retries", before_sleep_log(logger, logging.WARNING)),
     after=after_log(logger, logging.INFO),
     reraise=True
 )
@@ -110,11 +96,11 @@ my_retry_decorator = retry(
 ##################################
 
 @my_retry_decorator
-def get_openai_response(model, messages, response_format=None):
-    logger.info("function - get_openai_response")
-    client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-    logger.info(f"{client}")
-    try:
+def _request_openai_response(model, messages, response_format=None):
+    # Shared client, reused across calls and threads
+    client = get_openai_client()
+    # Share the process-wide OpenAI rate limit with the LangChain calls in search.py
+    with span("openai.request", model=model), get_rate_limiter("openai").acquire(tokens=estimate_tokens("".join(str(message["content"]) for message in messages))):
         if response_format:
             response = client.chat.completions.create(
                 model=model,
@@ -126,14 +112,108 @@ def get_openai_response(model, messages, response_format=None):
                 model=model,
                 messages=messages
             )
-        return response.choices[0].message.content
+        if response.usage is not None:
+            record_usage("openai", response.model or model, response.usage.prompt_tokens, response.usage.completion_tokens)
+    return response.choices[0].message.content
+
+
+def get_openai_response(model, messages, response_format=None):
+    logger.info("function - get_openai_response")
+    try:
+        # Identical requests already in flight in another thread or session are awaited instead of sent again
+        request_key = make_cache_key(model=model, messages=messages, response_format=response_format)
+        return get_single_flight("openai").do(request_key, _request_openai_response, model, messages, response_format)
     except Exception as e:
-        print(f"An error occurred: {e}")
+        # Raised in every coalesced caller, so the job error paths see the failure instead of a None result
+        logger.error(f"get_openai_response: {model} request failed: {e}", exc_info=True)
+        raise
+
+##################################
+### Streaming Open AI API call
+##################################
+
+# Latency of the most recent streamed completions, in seconds
+_stream_latencies = deque(maxlen=int(os.getenv("STREAM_METRICS_WINDOW", 200)))
+_stream_latencies_lock = threading.Lock()
+
+
+@my_retry_decorator
+def _create_stream(client, model, messages):
+    # Only opening the stream is retried; once chunks have been yielded a retry would duplicate them
+    # The last chunk then carries the token usage of the whole completion
+    return client.chat.completions.create(model=model, messages=messages, stream=True, stream_options={"include_usage": True})
+
+
+def stream_openai_response(model, messages) -> Iterator[str]:
+    """
+    Streaming variant of ``get_openai_response`` yielding the completion text chunk by chunk.
+
+    Time to first token and total latency of every call are logged and kept
+    for ``streaming_stats``.
+    """
+    logger.info("function - stream_openai_response")
+    client = get_openai_client()
+
+    with get_rate_limiter("openai").acquire(tokens=estimate_tokens("".join(str(message["content"]) for message in messages))):
+        start = time.perf_counter()
+        first_token = None
+        for chunk in _create_stream(client, model, messages):
+            if chunk.usage is not None:
+                record_usage("openai", chunk.model or model, chunk.usage.prompt_tokens, chunk.usage.completion_tokens)
+            if not chunk.choices:
+                continue
+            content = chunk.choices[0].delta.content
+            if content:
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+                yield content
+        total = time.perf_counter() - start
+
+    logger.info(f"stream_openai_response: {model} time to first token {first_token if first_token is not None else float('nan'):.2f}s, total {total:.2f}s")
+    with _stream_latencies_lock:
+        _stream_latencies.append((first_token, total))
+
+
+def _percentile(values: List[float], percentile: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(percentile / 100 * len(values)))], 3)
+
+
+def streaming_stats() -> Dict[str, Any]:
+    """Time to first token and total latency percentiles of the recent streamed completions"""
+    with _stream_latencies_lock:
+        latencies = list(_stream_latencies)
+    first_tokens = [first_token for first_token, _ in latencies if first_token is not None]
+    totals = [total for _, total in latencies]
+    return {
+        "streams": len(latencies),
+        "ttft_p50": _percentile(first_tokens, 50),
+        "ttft_p95": _percentile(first_tokens, 95),
+        "total_p50": _percentile(totals, 50),
+        "total_p95": _percentile(totals, 95),
+    }
 
 ##################################
 ### Generate Document
 ##################################
 
+def _document_contents_message(city: str, 
+                               country: str, 
+                               policy_levers: str, 
+                               stakeholders: str,
+                               report_structure: str, 
+                               max_num_queries: int=3):
+    
+    return ppp_framework_prompt.format(city=city, 
+                                       country=country, 
+                                       policy_levers=policy_levers, 
+                                       stakeholders=stakeholders, 
+                                       report_structure=report_structure,
+                                       max_num_queries=max_num_queries)
+
+
 def generate_document_contents(city: str, 
                                country: str, 
                                policy_levers: str, 
@@ -143,12 +223,12 @@ def generate_document_contents(city: str,
     
     logger.info("function - generate_document_contents")
     
-    user_message = ppp_framework_prompt.format(city=city, 
-                                               country=country, 
-                                               policy_levers=policy_levers, 
-                                               stakeholders=stakeholders, 
-                                               report_structure=report_structure,
-                                               max_num_queries=max_num_queries)
+    user_message = _document_contents_message(city=city, 
+                                              country=country, 
+                                              policy_levers=policy_levers, 
+                                              stakeholders=stakeholders, 
+                                              report_structure=report_structure,
+                                              max_num_queries=max_num_queries)
 
 
     # Generate question 
@@ -176,4 +256,38 @@ def generate_stakeholders(city: str,
         messages=[{"role":"user", "content": stakeholders_message}]
     )
 
-    return stakeholder_contents
\ No newline at end of file
+    return stakeholder_contents
+
+
+def stream_document_contents(city: str, 
+                             country: str, 
+                             policy_levers: str, 
+                             stakeholders: str,
+                             report_structure: str, 
+                             max_num_queries: int=3) -> Iterator[str]:
+    """Streaming variant of ``generate_document_contents``"""
+    logger.info("function - stream_document_contents")
+
+    user_message = _document_contents_message(city=city, 
+                                              country=country, 
+                                              policy_levers=policy_levers, 
+                                              stakeholders=stakeholders, 
+                                              report_structure=report_structure,
+                                              max_num_queries=max_num_queries)
+
+    return stream_openai_response(
+        model=O1_MODEL,
+        messages=[{"role":"user", "content": user_message}]
+    )
+
+
+def stream_stakeholders(city: str, 
+                        country: str) -> Iterator[str]:
+    """Streaming variant of ``generate_stakeholders``"""
+    stakeholders_message = stakeholder_prompt.format(city=city,
+                                                     country=country)
+
+    return stream_openai_response(
+        model=O1_MODEL,
+        messages=[{"role":"user", "content": stakeholders_message}]
+    )
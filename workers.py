@@ -0,0 +1,223 @@
+####################
+##### Imports ######
+####################
+
+import os
+import time
+import logging
+import threading
+import contextvars
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Any, Dict, List, Callable
+
+from jobs import make_job_id, indicator_job_id, run_indicator_job, screen_indicators, JOB_BUDGET_USD
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+############################
+##### Background Jobs ######
+############################
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 4))
+MAX_FINISHED_JOBS = int(os.getenv("MAX_FINISHED_JOBS", 256))
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+_current_job = contextvars.ContextVar("current_job", default=None)
+
+
+class _Job:
+    def __init__(self, job_id: str, kind: str):
+        self.job_id = job_id
+        self.kind = kind
+        self.state = QUEUED
+        self.partial = None
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+
+def report_progress(partial: Any):
+    """Publish a partial result of the job running in the current worker (no-op outside a job)"""
+    job = _current_job.get()
+    if job is not None:
+        job.partial = partial
+
+
+class JobQueue:
+    def __init__(self, max_workers: int = JOB_WORKERS):
+        """
+        Local job queue executing long-running work on a pool of worker threads.
+
+        The Streamlit script submits a job, stores its id and polls ``status``
+        on later reruns instead of blocking a server thread until the work is
+        done. A job already queued or running under the same id is not
+        submitted twice, so repeated clicks and reruns attach to the running
+        job. The work is I/O bound and shares the process-wide clients,
+        caches and async engine, so threads are used rather than processes.
+
+        Args:
+            max_workers (int): Number of jobs executed concurrently
+        """
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job-worker")
+        self._jobs: Dict[str, _Job] = {}
+        self._lock = threading.Lock()
+
+
+    def submit(self, job_id: str, kind: str, fn: Callable, *args, **kwargs) -> str:
+        """
+        Queue ``fn(*args, **kwargs)`` under ``job_id``.
+
+        Returns:
+            str: Job id to poll
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job.state in (QUEUED, RUNNING):
+                return job_id
+            job = _Job(job_id, kind)
+            self._jobs[job_id] = job
+            self._prune()
+
+        logger.info(f"JobQueue: Submitted {kind} job {job_id}")
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job_id
+
+
+    def _run(self, job: _Job, fn: Callable, args, kwargs):
+        job.state = RUNNING
+        job.started_at = time.time()
+        _current_job.set(job)
+        try:
+            with span("job", kind=job.kind, job_id=job.job_id, queued_seconds=round(job.started_at - job.submitted_at, 3)):
+                job.result = fn(*args, **kwargs)
+            job.state = DONE
+        except Exception as e:
+            logger.error(f"JobQueue: {job.kind} job {job.job_id} failed: {e}", exc_info=True)
+            job.error = str(e)
+            job.state = FAILED
+        finally:
+            job.finished_at = time.time()
+            _current_job.set(None)
+
+
+    def _prune(self):
+        """Forget the oldest finished jobs beyond MAX_FINISHED_JOBS"""
+        finished = sorted((job for job in self._jobs.values() if job.state in (DONE, FAILED)), key=lambda job: job.finished_at)
+        for job in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job.job_id]
+
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """State, timings, partial result and error of a job, or None if this process does not know it"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        end = job.finished_at or time.time()
+        return {
+            "job_id": job.job_id,
+            "kind": job.kind,
+            "state": job.state,
+            "partial": job.partial,
+            "error": job.error,
+            "queued_seconds": round((job.started_at or end) - job.submitted_at, 3),
+            "running_seconds": round(end - job.started_at, 3) if job.started_at else 0.0,
+        }
+
+
+    def result(self, job_id: str) -> Any:
+        """Return value of a finished job, None while it is queued or running"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        return job.result if job is not None and job.state == DONE else None
+
+
+    def stats(self) -> Dict[str, int]:
+        """Number of known jobs per state"""
+        with self._lock:
+            states = [job.state for job in self._jobs.values()]
+        return {state: states.count(state) for state in (QUEUED, RUNNING, DONE, FAILED)}
+
+
+_default_queue = None
+_default_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """Return the process-wide job queue, shared by every Streamlit session"""
+    global _default_queue
+    with _default_queue_lock:
+        if _default_queue is None:
+            _default_queue = JobQueue()
+        return _default_queue
+
+
+##############################
+##### Job Submission #########
+##############################
+
+def submit_indicator_job(
+        cities: List[str],
+        indicators: List[str],
+        maturity_levels: Optional[List[str]] = None,
+        known_results: Optional[Dict[str, Dict[str, Dict[str, Any]]]] = None,
+        budget_usd: Optional[float] = JOB_BUDGET_USD
+) -> str:
+    """
+    Run ``run_indicator_job`` in the background.
+
+    Results are persisted per (city, indicator) as they complete; read them
+    while the job runs with ``indicator_job_results``, its counts with
+    ``JobStore.progress`` and its spend with ``indicator_job_usage``.
+    """
+    job_id = indicator_job_id(cities, indicators, maturity_levels)
+    return get_job_queue().submit(job_id, "indicators", run_indicator_job,
+                                  cities=cities, indicators=indicators, maturity_levels=maturity_levels, known_results=known_results, budget_usd=budget_usd)
+
+
+def submit_screening_job(category: str, cities: List[str]) -> str:
+    """Screen the indicators of ``category`` for every city in the background; the job result is the (job_id, DataFrame) returned by ``screen_indicators``"""
+    job_id = make_job_id("screening", category=category, cities=list(cities))
+    return get_job_queue().submit(job_id, "screening", screen_indicators, category, list(cities))
+
+
+def _stream_to_job(stream_fn: Callable, **kwargs) -> str:
+    """Run a streaming generator, publishing the text received so far as the job's partial result"""
+    text = ""
+    for chunk in stream_fn(**kwargs):
+        text += chunk
+        report_progress(text)
+    return text
+
+
+def submit_document_job(**kwargs) -> str:
+    """Stream ``generate_document_contents`` in the background; the partial result is the text so far, the job result the table of contents"""
+    from utils import stream_document_contents
+
+    job_id = make_job_id("document", **kwargs)
+    return get_job_queue().submit(job_id, "document", _stream_to_job, stream_document_contents, **kwargs)
+
+
+def submit_stakeholders_job(city: str, country: str) -> str:
+    """Stream ``generate_stakeholders`` in the background; the partial result is the text so far, the job result the stakeholder list"""
+    from utils import stream_stakeholders
+
+    job_id = make_job_id("stakeholders", city=city, country=country)
+    return get_job_queue().submit(job_id, "stakeholders", _stream_to_job, stream_stakeholders, city=city, country=country)
+
+
+def submit_report_job(toc: str, city: str, country: str) -> str:
+    """Write the report for ``toc`` in the background; the partial result is the report assembled so far"""
+    from report import generate_report
+
+    job_id = make_job_id("report", toc=toc, city=city, country=country)
+    return get_job_queue().submit(job_id, "report", generate_report, toc, city, country, on_progress=report_progress)